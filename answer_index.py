@@ -0,0 +1,177 @@
+import hashlib
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Constants
+INDEX_FILE = os.path.join(os.path.dirname(__file__), 'data', 'answer_index.sqlite3')
+DEFAULT_THRESHOLD = float(os.getenv("ANSWER_REUSE_THRESHOLD", "0.9"))
+DEFAULT_MIN_MATCHES = int(os.getenv("ANSWER_REUSE_MIN_MATCHES", "2"))
+MAX_CANDIDATES = 50
+
+# Stands in for the chain name in indexed answers, so forks compare equal
+CHAIN_TOKEN = "⟨chain⟩"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+# A prior answer offered instead of a fresh call: the text, the chains it came from and their mean similarity
+Draft = namedtuple('Draft', ['text', 'sources', 'similarity'])
+
+def normalize_framework(framework):
+    """Canonical form of a declared framework name, or None."""
+    framework = re.sub(r'\s+', ' ', (framework or '').strip().lower())
+    return framework or None
+
+def prompt_hash(risk_prompt):
+    """Short hash of a risk prompt; answers to an older prompt are never reused."""
+    return hashlib.sha256(risk_prompt.encode('utf-8')).hexdigest()[:16]
+
+def tfidf_vectors(documents):
+    """L2-normalized TF-IDF vectors (as dicts) for a small set of documents."""
+    counts = [Counter(TOKEN_PATTERN.findall(document.lower())) for document in documents]
+    document_frequency = Counter(term for count in counts for term in count)
+    total = len(documents)
+    vectors = []
+    for count in counts:
+        vector = {
+            term: (1 + math.log(frequency)) * (math.log((1 + total) / (1 + document_frequency[term])) + 1)
+            for term, frequency in count.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        vectors.append({term: weight / norm for term, weight in vector.items()})
+    return vectors
+
+def cosine(a, b):
+    """Cosine similarity of two normalized sparse vectors."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(term, 0.0) for term, weight in a.items())
+
+def draft_response(draft):
+    """The stored answer for a reused draft, labelled so reviewers know to check it."""
+    note = (
+        f"> Draft reused from the answers for {', '.join(draft.sources)} "
+        f"(similarity {draft.similarity:.2f}). Regenerate for a fresh analysis."
+    )
+    return f"{note}\n\n{draft.text}"
+
+class AnswerIndex:
+    """Local similarity index of past answers, keyed by risk and the chain's declared framework.
+
+    When enough chains built on the same framework got near-identical
+    answers to a risk, the most representative one is offered as a draft
+    for the next chain instead of a fresh CB-GPT call.
+    """
+
+    def __init__(self, path=INDEX_FILE, threshold=DEFAULT_THRESHOLD, min_matches=DEFAULT_MIN_MATCHES):
+        """Open (or create) the index database."""
+        self.path = path
+        self.threshold = threshold
+        self.min_matches = min_matches
+        self._lock = threading.Lock()
+        self._stats = {}
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                risk_name TEXT NOT NULL,
+                framework TEXT NOT NULL,
+                chain TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (risk_name, framework, chain)
+            )
+        """)
+
+    def add(self, risk, framework, chain, response):
+        """Index a fresh answer; answers without a declared framework are not indexed."""
+        framework = normalize_framework(framework)
+        if not framework or not response:
+            return
+        answer = re.sub(rf'\b{re.escape(chain)}\b', CHAIN_TOKEN, response, flags=re.IGNORECASE)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (risk_name, framework, chain, prompt_hash, answer, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (risk['name'], framework, chain, prompt_hash(risk['prompt']), answer, time.time())
+            )
+
+    def find_draft(self, risk, framework, chain, threshold=None):
+        """Return a Draft for a risk on a chain, or None when too few similar chains agree."""
+        threshold = self.threshold if threshold is None else threshold
+        framework = normalize_framework(framework)
+        if not framework:
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chain, answer FROM answers "
+                "WHERE risk_name = ? AND framework = ? AND prompt_hash = ? AND chain != ? "
+                "ORDER BY updated_at DESC LIMIT ?",
+                (risk['name'], framework, prompt_hash(risk['prompt']), chain, MAX_CANDIDATES)
+            ).fetchall()
+
+        draft = None
+        if len(rows) >= self.min_matches:
+            vectors = tfidf_vectors([answer for _, answer in rows])
+            best = None
+            for i, vector in enumerate(vectors):
+                similar = [(j, cosine(vector, other)) for j, other in enumerate(vectors) if j != i]
+                similar = [(j, score) for j, score in similar if score >= threshold]
+                # The answer most others agree with is the most representative one
+                if best is None or len(similar) > len(best[1]):
+                    best = (i, similar)
+            i, similar = best
+            if len(similar) + 1 >= self.min_matches:
+                draft = Draft(
+                    text=rows[i][1].replace(CHAIN_TOKEN, chain),
+                    sources=[rows[i][0]] + [rows[j][0] for j, _ in similar],
+                    similarity=sum(score for _, score in similar) / len(similar) if similar else 1.0
+                )
+        self._count(risk['name'], draft is not None)
+        return draft
+
+    def _count(self, risk_name, hit):
+        """Record a lookup outcome for the hit rate statistics."""
+        with self._lock:
+            stats = self._stats.setdefault(risk_name, {"lookups": 0, "hits": 0})
+            stats["lookups"] += 1
+            stats["hits"] += int(hit)
+
+    def stats(self):
+        """Lookup and hit counts since start, overall and per risk."""
+        with self._lock:
+            by_risk = {risk_name: dict(stats) for risk_name, stats in self._stats.items()}
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        lookups = sum(stats["lookups"] for stats in by_risk.values())
+        hits = sum(stats["hits"] for stats in by_risk.values())
+        return {
+            "entries": entries,
+            "lookups": lookups,
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "by_risk": by_risk,
+        }
+
+    def split_drafts(self, risks, framework, chain, threshold=None):
+        """Find drafts for a list of risks, returning (drafted answers keyed by risk name, risks still to ask)."""
+        drafts = {}
+        remaining = []
+        for risk in risks:
+            draft = self.find_draft(risk, framework, chain, threshold)
+            if draft:
+                drafts[risk['name']] = draft_response(draft)
+            else:
+                remaining.append(risk)
+        return drafts, remaining
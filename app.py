@@ -1,39 +1,31 @@
 import streamlit as st
 import json
 import os
-from cb_gpt_client import CbGptClient
-from docx import Document
-from docx.shared import Inches, Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.opc import constants
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from io import BytesIO
-import base64
+from cb_gpt_client import GenerationSettings, get_shared_client, invalidate_shared_client
+from reports import generate_docx, generate_pdf, report_digest
 import logging
+import time
+import uuid
+from response_store import get_response_store
+from fact_sheet import FileFactSheetProvider
+from job_queue import JobQueue, JobWorkerPool, POLL_INTERVAL_SECONDS
+from answer_index import AnswerIndex, DEFAULT_THRESHOLD
+from results_index import ResultsIndex
+from watchlist import REFRESH_WORKERS, WATCHLIST_MAX_AGE_SECONDS, WATCHLIST_SESSION, Watchlist, WatchlistRefresher, format_age
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Constants
-EDITED_RESPONSES_FILE = os.path.join(os.path.dirname(__file__), 'data', 'edited_responses.json')
 RISKS_FILE = os.path.join(os.path.dirname(__file__), 'risks.json')
 
-# Configure page settings
-st.set_page_config(
-    page_title="Blockchain Security Analysis Framework",
-    page_icon="🛡️",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+# Streamlit 1.33+ reruns a risk section on its own when one of its widgets changes;
+# older versions fall back to rerunning the whole page
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
 
 # Custom CSS
-st.markdown("""
+PAGE_CSS = """
     <style>
     .main { padding: 2rem; }
     .main-header {
@@ -49,16 +41,17 @@ st.markdown("""
         margin: 1rem 0;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
 
-def get_download_link(buffer, filename, display_text):
-    """Generate a download link for a file."""
-    try:
-        b64 = base64.b64encode(buffer.getvalue()).decode()
-        return f'<a href="data:application/octet-stream;base64,{b64}" download="{filename}">{display_text}</a>'
-    except Exception as e:
-        logger.error(f"Error generating download link: {str(e)}")
-        return None
+def configure_page():
+    """Apply the page settings and custom CSS; must run before any other Streamlit call."""
+    st.set_page_config(
+        page_title="Blockchain Security Analysis Framework",
+        page_icon="🛡️",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
 
 def load_json_file(filepath):
     """Load and parse a JSON file."""
@@ -87,20 +80,86 @@ def load_risks():
     """Load risks from JSON file."""
     return load_json_file(RISKS_FILE)
 
+@st.cache_resource
+def get_store():
+    """Return the process-wide response store."""
+    return get_response_store()
+
+@st.cache_resource
+def get_job_pool():
+    """Return the process-wide pool of background analysis workers; watchlist refreshes have a pool of their own."""
+    return JobWorkerPool(
+        JobQueue(), get_store(), answer_index=AnswerIndex(), results_index=get_results_index(),
+        exclude_session_id=WATCHLIST_SESSION
+    ).start()
+
+@st.cache_resource
+def get_refresh_pool():
+    """Return the process-wide pool running watchlist refreshes, kept apart from the sessions' workers."""
+    return JobWorkerPool(
+        get_job_pool().jobs, get_store(), workers=REFRESH_WORKERS, results_index=get_results_index(),
+        session_id=WATCHLIST_SESSION
+    ).start()
+
+@st.cache_resource
+def get_results_index():
+    """Return the process-wide index of completed answers across chains."""
+    return ResultsIndex()
+
+@st.cache_resource
+def get_refresher():
+    """Return the process-wide refresher of watched chains; its jobs run on the refresh pool."""
+    return WatchlistRefresher(Watchlist(), get_store(), get_refresh_pool().jobs)
+
+def get_session_id():
+    """Return the id namespacing this browser session's stored responses.
+
+    The id is kept in the URL so a reloaded or reopened tab reconnects to
+    the analysis jobs it started.
+    """
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = st.query_params.get('session') or uuid.uuid4().hex
+        st.query_params['session'] = st.session_state.session_id
+    return st.session_state.session_id
+
+def submit_analysis_job(risks, bypass_cache=False):
+    """Queue a background job answering the given risks for the current chain.
+
+    Regenerating (bypass_cache) always asks CB-GPT rather than reusing a draft.
+    """
+    return get_job_pool().jobs.submit(
+        st.session_state.blockchain_name,
+        get_session_id(),
+        risks,
+        st.session_state.get('blockchain_website') or None,
+        stream=st.session_state.get('stream_responses', True),
+        group_related=st.session_state.get('group_related_risks', False),
+        fact_sheet=st.session_state.get('use_fact_sheet', False),
+        framework=st.session_state.get('blockchain_framework') or None,
+        reuse_similar=st.session_state.get('reuse_similar_answers', False) and not bypass_cache,
+        similarity_threshold=st.session_state.get('similarity_threshold', DEFAULT_THRESHOLD),
+        bypass_cache=bypass_cache
+    )
+
 def load_edited_responses():
-    """Load previously edited responses from file."""
-    if not os.path.exists(EDITED_RESPONSES_FILE):
-        # Create empty file if it doesn't exist
-        save_json_file(EDITED_RESPONSES_FILE, {})
-    return load_json_file(EDITED_RESPONSES_FILE)
-
-def save_edited_response(risk_name, response):
-    """Save an edited response to file and session state."""
+    """Load the stored responses for the current chain and session."""
+    return get_store().load(st.session_state.blockchain_name, get_session_id())
+
+def current_fingerprint(risk):
+    """Fingerprint of the prompt a risk is currently answered with."""
+    block_explorer_url = st.session_state.get('blockchain_website') or None
+    return get_shared_client().risk_fingerprint(risk['prompt'], block_explorer_url, GenerationSettings.for_risk(risk))
+
+def downgraded_fingerprint(risk):
+    """Fingerprint a risk's answer is stored under when it was given with a reduced budget under load."""
+    block_explorer_url = st.session_state.get('blockchain_website') or None
+    return get_shared_client().downgraded_fingerprint(risk['prompt'], block_explorer_url, GenerationSettings.for_risk(risk))
+
+def save_edited_response(risk_name, response, fingerprint=None):
+    """Save an edited response to the store and session state."""
     try:
-        # Save to file
-        responses = load_edited_responses()
-        responses[risk_name] = response
-        save_json_file(EDITED_RESPONSES_FILE, responses)
+        # Upsert just this record
+        get_store().upsert(st.session_state.blockchain_name, get_session_id(), risk_name, response, fingerprint)
         
         # Update session state
         response_key = f"response_{risk_name}"
@@ -109,320 +168,45 @@ def save_edited_response(risk_name, response):
         logger.error(f"Error saving edited response: {str(e)}")
         st.error("Failed to save changes. Please try again.")
 
-def process_markdown(text, for_pdf=True):
-    """Process markdown formatting for PDF or DOCX."""
-    if not text:
-        return text if for_pdf else (text, [], [])
-    
-    # Remove code block markers
-    text = text.replace('```', '')
-    
-    if for_pdf:
-        # Process inline formatting for PDF
-        text = text.replace('`', '<font face="Courier" color="#333333">', 1)
-        text = text.replace('`', '</font>', 1) if '`' in text else text
-        
-        # Process bold and italic
-        text = text.replace('**', '<b>', 1)
-        text = text.replace('**', '</b>', 1) if '**' in text else text
-        text = text.replace('*', '<i>', 1)
-        text = text.replace('*', '</i>', 1) if '*' in text else text
-        
-        # Process links
-        import re
-        text = re.sub(r'\[(.*?)\]\((.*?)\)', r'<link href="\2" color="blue"><u>\1</u></link>', text)
-        
-        return text
-    else:
-        # Process for DOCX
-        formats = []
-        links = []
-        
-        # Process inline code
-        while '`' in text:
-            start_idx = text.find('`')
-            text = text.replace('`', '', 1)
-            if '`' in text:
-                end_idx = text.find('`')
-                text = text.replace('`', '', 1)
-                formats.append(('code', start_idx, end_idx))
-        
-        # Process bold
-        while '**' in text:
-            start_idx = text.find('**')
-            text = text.replace('**', '', 1)
-            if '**' in text:
-                end_idx = text.find('**')
-                text = text.replace('**', '', 1)
-                formats.append(('bold', start_idx, end_idx))
-        
-        # Process italic
-        while '*' in text:
-            start_idx = text.find('*')
-            text = text.replace('*', '', 1)
-            if '*' in text:
-                end_idx = text.find('*')
-                text = text.replace('*', '', 1)
-                formats.append(('italic', start_idx, end_idx))
-        
-        # Process links
-        import re
-        for match in re.finditer(r'\[(.*?)\]\((.*?)\)', text):
-            links.append((match.group(1), match.group(2), match.start(), match.end()))
-        
-        # Replace link syntax with just the text
-        text = re.sub(r'\[(.*?)\]\((.*?)\)', r'\1', text)
-        
-        return text, formats, links
+@st.cache_data(max_entries=16, show_spinner=False)
+def build_exports(digest, _blockchain_name, _blockchain_symbol, _blockchain_website, _critical_risks, _non_critical_risks, _edited_responses):
+    """Build the DOCX and PDF reports, memoized on the digest of their content."""
+    docx_buffer = generate_docx(_blockchain_name, _blockchain_symbol, _blockchain_website, _critical_risks, _non_critical_risks, _edited_responses)
+    pdf_buffer = generate_pdf(_blockchain_name, _blockchain_symbol, _blockchain_website, _critical_risks, _non_critical_risks, _edited_responses)
+    return {
+        "docx": docx_buffer.getvalue(),
+        "pdf": pdf_buffer.getvalue() if pdf_buffer else None,
+    }
 
-def add_hyperlink(paragraph, text, url):
-    """Add a hyperlink to a paragraph."""
-    part = paragraph.part
-    r_id = part.relate_to(url, constants.RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
-    
-    hyperlink = OxmlElement('w:hyperlink')
-    hyperlink.set(qn('r:id'), r_id)
-    
-    new_run = OxmlElement('w:r')
-    rPr = OxmlElement('w:rPr')
-    
-    c = OxmlElement('w:color')
-    c.set(qn('w:val'), '0000FF')
-    rPr.append(c)
-    
-    u = OxmlElement('w:u')
-    u.set(qn('w:val'), 'single')
-    rPr.append(u)
-    
-    new_run.append(rPr)
-    
-    t = OxmlElement('w:t')
-    t.text = text
-    new_run.append(t)
-    
-    hyperlink.append(new_run)
-    paragraph._p.append(hyperlink)
-    
-    return hyperlink
+def start_edit(risk_name):
+    """Button callback: open the editor of a risk section."""
+    st.session_state[f"show_edit_{risk_name}"] = True
 
-def add_formatted_paragraph(doc, text, style=None):
-    """Add a paragraph with proper markdown formatting."""
-    if not text.strip():
-        return
-    
-    processed_text, formats, links = process_markdown(text, for_pdf=False)
-    
-    # Create paragraph
-    paragraph = doc.add_paragraph()
-    if style:
-        paragraph.style = style
-    
-    # Handle code blocks
-    if text.startswith('    ') or text.startswith('```'):
-        run = paragraph.add_run(processed_text)
-        run.font.name = 'Courier New'
-        run.font.size = Pt(10)
-        return
-    
-    # Add formatted text
-    current_pos = 0
-    all_formats = [(start, end, 'format', fmt) for fmt, start, end in formats]
-    all_formats.extend([(start, end, 'link', (text, url)) for text, url, start, end in links])
-    all_formats.sort(key=lambda x: x[0])
-    
-    for start, end, type_, format_info in all_formats:
-        # Add text before format
-        if start > current_pos:
-            paragraph.add_run(processed_text[current_pos:start])
-        
-        # Add formatted text
-        if type_ == 'format':
-            run = paragraph.add_run(processed_text[start:end])
-            if format_info == 'bold':
-                run.bold = True
-            elif format_info == 'italic':
-                run.italic = True
-            elif format_info == 'code':
-                run.font.name = 'Courier New'
-                run.font.size = Pt(10)
-        elif type_ == 'link':
-            text, url = format_info
-            add_hyperlink(paragraph, text, url)
-        
-        current_pos = end
-    
-    # Add remaining text
-    if current_pos < len(processed_text):
-        paragraph.add_run(processed_text[current_pos:])
+def cancel_edit(risk_name):
+    """Button callback: close the editor of a risk section without saving."""
+    st.session_state[f"show_edit_{risk_name}"] = False
 
-def generate_docx(blockchain_name, blockchain_symbol, blockchain_website, critical_risks, non_critical_risks, edited_responses):
-    """Generate a DOCX report of the security analysis."""
-    doc = Document()
-    
-    # Add title
-    title = doc.add_heading(f'Security Analysis Report: {blockchain_name} ({blockchain_symbol})', 0)
-    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    
-    # Add website
-    if blockchain_website:
-        paragraph = doc.add_paragraph()
-        paragraph.add_run("Block Explorer: ")
-        add_hyperlink(paragraph, blockchain_website, blockchain_website)
-    doc.add_paragraph()  # Add spacing
-    
-    # Add critical risks section
-    doc.add_heading('Critical Security Risks', 1)
-    for risk in critical_risks:
-        doc.add_heading(risk['name'], 2)
-        content = edited_responses.get(risk['name'], 'No analysis available')
-        if content and content.strip():
-            # Split the analysis into paragraphs
-            paragraphs = content.split('\n')
-            for para in paragraphs:
-                if para.strip():
-                    add_formatted_paragraph(doc, para.strip())
-        else:
-            doc.add_paragraph("No analysis available")
-        doc.add_paragraph()  # Add spacing
-    
-    # Add non-critical risks section
-    doc.add_heading('Other Security Considerations', 1)
-    for risk in non_critical_risks:
-        doc.add_heading(risk['name'], 2)
-        content = edited_responses.get(risk['name'], 'No analysis available')
-        if content and content.strip():
-            # Split the analysis into paragraphs
-            paragraphs = content.split('\n')
-            for para in paragraphs:
-                if para.strip():
-                    add_formatted_paragraph(doc, para.strip())
-        else:
-            doc.add_paragraph("No analysis available")
-        doc.add_paragraph()  # Add spacing
-    
-    # Save to BytesIO
-    docx_buffer = BytesIO()
-    doc.save(docx_buffer)
-    docx_buffer.seek(0)
-    return docx_buffer
-
-def generate_pdf(blockchain_name, blockchain_symbol, blockchain_website, critical_risks, non_critical_risks, edited_responses):
-    """Generate a PDF report of the security analysis."""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
-    
-    # Define styles
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=1,  # Center alignment
-        textColor=colors.HexColor('#1E3D59')
-    )
-    
-    heading1_style = ParagraphStyle(
-        'CustomHeading1',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=12,
-        spaceBefore=24,
-        textColor=colors.HexColor('#2E5575')
-    )
-    
-    heading2_style = ParagraphStyle(
-        'CustomHeading2',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=8,
-        spaceBefore=16,
-        textColor=colors.HexColor('#2E5575')
-    )
-    
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=12,
-        leading=14
-    )
-    
-    code_style = ParagraphStyle(
-        'CodeStyle',
-        parent=styles['Code'],
-        fontSize=10,
-        fontName='Courier',
-        spaceAfter=12,
-        leading=14,
-        backColor=colors.HexColor('#f5f5f5')
-    )
-    
-    # Build the document content
-    content = []
-    
-    # Add title
-    content.append(Paragraph(f"Security Analysis Report:<br/>{blockchain_name} ({blockchain_symbol})", title_style))
-    
-    # Add website if provided
-    if blockchain_website:
-        content.append(Paragraph(f'Block Explorer: <link href="{blockchain_website}" color="blue"><u>{blockchain_website}</u></link>', normal_style))
-    
-    content.append(Spacer(1, 20))
-    
-    # Add critical risks section
-    content.append(Paragraph("Critical Security Risks", heading1_style))
-    
-    for risk in critical_risks:
-        content.append(Paragraph(risk['name'], heading2_style))
-        analysis = edited_responses.get(risk['name'])
-        if analysis and analysis.strip():
-            # Split the analysis into paragraphs and process markdown in each
-            paragraphs = analysis.split('\n')
-            for para in paragraphs:
-                if para.strip():
-                    # Check if this is a code block (indented or between backticks)
-                    if para.startswith('    ') or para.startswith('```'):
-                        content.append(Paragraph(process_markdown(para.strip(), for_pdf=True), code_style))
-                    else:
-                        content.append(Paragraph(process_markdown(para.strip(), for_pdf=True), normal_style))
-        else:
-            content.append(Paragraph("No analysis available", normal_style))
-        content.append(Spacer(1, 12))
-    
-    # Add non-critical risks section
-    content.append(Paragraph("Other Security Considerations", heading1_style))
-    
-    for risk in non_critical_risks:
-        content.append(Paragraph(risk['name'], heading2_style))
-        analysis = edited_responses.get(risk['name'])
-        if analysis and analysis.strip():
-            # Split the analysis into paragraphs and process markdown in each
-            paragraphs = analysis.split('\n')
-            for para in paragraphs:
-                if para.strip():
-                    # Check if this is a code block (indented or between backticks)
-                    if para.startswith('    ') or para.startswith('```'):
-                        content.append(Paragraph(process_markdown(para.strip(), for_pdf=True), code_style))
-                    else:
-                        content.append(Paragraph(process_markdown(para.strip(), for_pdf=True), normal_style))
-        else:
-            content.append(Paragraph("No analysis available", normal_style))
-        content.append(Spacer(1, 12))
-    
-    try:
-        # Build the PDF
-        doc.build(content)
-        buffer.seek(0)
-        return buffer
-    except Exception as e:
-        st.error(f"Error generating PDF: {str(e)}")
-        return None
+def save_edit(risk):
+    """Button callback: save the editor contents of a risk section."""
+    edited_response = st.session_state.get(f"edit_{risk['name']}", "")
+    save_edited_response(risk['name'], edited_response, current_fingerprint(risk))
+    get_results_index().record(st.session_state.blockchain_name, risk, edited_response, source='edit')
+    st.session_state[f"show_edit_{risk['name']}"] = False
+    st.session_state[f"saved_{risk['name']}"] = True
+    st.session_state.setdefault('answers_updated_at', {})[risk['name']] = time.time()
+    # Prepared downloads elsewhere on the page would still hold the old answer
+    if 'export_digest' in st.session_state:
+        st.session_state.refresh_page = True
 
+@fragment
 def display_risk_analysis(risk, response):
-    """Display risk analysis with edit functionality."""
+    """Display risk analysis with edit functionality.
+
+    Runs as a fragment: Edit, Save and Cancel only rerun this section.
+    Their state changes happen in button callbacks, so no extra rerun is needed.
+    """
+    if st.session_state.pop('refresh_page', False):
+        st.experimental_rerun()
     st.markdown(f"### {risk['name']}")
     
     # Initialize session state keys
@@ -440,21 +224,26 @@ def display_risk_analysis(risk, response):
         # Show current analysis
         if st.session_state[response_key]:
             st.markdown(st.session_state[response_key])
+            updated_at = st.session_state.get('answers_updated_at', {}).get(risk['name'])
+            if updated_at:
+                age = time.time() - updated_at
+                stale = " — stale, a refresh is due" if age > WATCHLIST_MAX_AGE_SECONDS else ""
+                st.caption(f"🕒 Answered {format_age(age)}{stale}")
         else:
             st.info("No analysis available yet.")
+        if st.session_state.pop(f"saved_{risk['name']}", False):
+            st.success("✅ Changes saved!")
         
         # Edit button
         col1, col2, col3 = st.columns([1, 1, 3])
         
         with col1:
             if not st.session_state[edit_key]:
-                if st.button("📝 Edit", key=f"edit_btn_{risk['name']}"):
-                    st.session_state[edit_key] = True
-                    st.experimental_rerun()
+                st.button("📝 Edit", key=f"edit_btn_{risk['name']}", on_click=start_edit, args=(risk['name'],))
         
         # Show edit box when editing
         if st.session_state[edit_key]:
-            edited_response = st.text_area(
+            st.text_area(
                 "Edit Analysis",
                 value=st.session_state[response_key] if st.session_state[response_key] else "",
                 key=f"edit_{risk['name']}",
@@ -464,47 +253,132 @@ def display_risk_analysis(risk, response):
             col1, col2, col3 = st.columns([1, 1, 3])
             
             with col1:
-                if st.button("💾 Save", key=f"save_{risk['name']}"):
-                    save_edited_response(risk['name'], edited_response)
-                    st.session_state[response_key] = edited_response
-                    st.session_state[edit_key] = False
-                    st.success("✅ Changes saved!")
-                    st.experimental_rerun()
+                st.button("💾 Save", key=f"save_{risk['name']}", on_click=save_edit, args=(risk,))
             
             with col2:
-                if st.button("❌ Cancel", key=f"cancel_{risk['name']}"):
-                    st.session_state[edit_key] = False
-                    st.experimental_rerun()
+                st.button("❌ Cancel", key=f"cancel_{risk['name']}", on_click=cancel_edit, args=(risk['name'],))
             
             with col3:
                 if st.button("🔄 Regenerate", key=f"regen_{risk['name']}"):
-                    client = CbGptClient()
-                    new_response = client.analyze_blockchain_security(
-                        st.session_state.blockchain_name,
-                        risk['prompt'],
-                        block_explorer_url=st.session_state.blockchain_website if hasattr(st.session_state, 'blockchain_website') else None
-                    )
-                    
-                    if new_response:
-                        save_edited_response(risk['name'], new_response)
-                        st.session_state[response_key] = new_response
-                        st.session_state[edit_key] = False
-                        st.success("✅ Analysis regenerated!")
-                        st.experimental_rerun()
-                    else:
-                        st.error("❌ Failed to regenerate analysis")
+                    # Mark the stored answer stale so the section shows progress until the job replaces it
+                    get_store().upsert(st.session_state.blockchain_name, get_session_id(), risk['name'], st.session_state[response_key])
+                    submit_analysis_job([risk], bypass_cache=True)
+                    st.session_state[edit_key] = False
+                    # The whole page reruns to pick up the new job's progress
+                    st.experimental_rerun()
+
+def load_fact_sheet():
+    """Return the cached fact sheet of the current chain when the sidebar option is on."""
+    if not st.session_state.get('use_fact_sheet', False):
+        return None
+    return FileFactSheetProvider().get(st.session_state.blockchain_name)
+
+def render_risk_slot(risk, pending=False, partial=None, running=True, reduced=False, error=None):
+    """Render a risk section, or its progress while the analysis is still pending.
+
+    A pending risk the last analysis failed to answer shows why.
+    """
+    if pending:
+        st.markdown(f"### {risk['name']}")
+        if partial:
+            st.markdown(partial + " ▌")
+        elif running:
+            st.info("⏳ Analysis in progress...")
+        elif error:
+            st.error(f"CB-GPT could not analyze this risk: {error}")
+        else:
+            st.warning("Not analyzed yet.")
+    else:
+        if reduced:
+            st.caption(f"ℹ️ {risk['name']} was answered with a reduced budget while CB-GPT was under load; it is re-asked once load drops.")
+        display_risk_analysis(risk, st.session_state[f"response_{risk['name']}"])
+
+def display_telemetry(telemetry):
+    """Show per-risk CB-GPT call telemetry in a collapsible panel."""
+    with st.expander("📊 CB-GPT request telemetry"):
+        aggregates = telemetry.aggregates()
+        if not aggregates:
+            st.info("No CB-GPT calls recorded yet.")
+            return
+        st.dataframe(aggregates, use_container_width=True, hide_index=True)
+        recent = telemetry.records()[-50:]
+        st.caption(f"Last {len(recent)} calls")
+        st.dataframe(
+            [
+                {
+                    "risk": record["risk"],
+                    "cache": record["cache"],
+                    "model": record.get("model"),
+                    "reasoning_effort": record.get("reasoning_effort"),
+                    "ok": record["ok"],
+                    "queue_wait_s": round(record["queue_wait"], 3),
+                    "service_latency_s": round(record["service_latency"], 3),
+                    "response_bytes": record["response_bytes"],
+                    "prompt_tokens": record["prompt_tokens"],
+                    "completion_tokens": record["completion_tokens"],
+                    "retries": record["retries"],
+                }
+                for record in reversed(recent)
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
+        st.download_button(
+            "⬇️ Download Prometheus metrics",
+            data=telemetry.to_prometheus(),
+            file_name="cb_gpt_metrics.prom",
+            mime="text/plain"
+        )
 
 def main():
     """Main application function."""
+    configure_page()
     st.markdown("<h1 class='main-header'>Blockchain Security Analysis Framework</h1>", unsafe_allow_html=True)
     
+    st.sidebar.toggle(
+        "Stream responses",
+        value=True,
+        key="stream_responses",
+        help="Render each analysis token by token as CB-GPT generates it"
+    )
+    st.sidebar.toggle(
+        "Group related risks",
+        value=False,
+        key="group_related_risks",
+        help="Answer risks that share a group in risks.json with one CB-GPT call (answers are not streamed)"
+    )
+    st.sidebar.toggle(
+        "Share chain facts across risks",
+        value=os.getenv("FACT_SHEET_DEFAULT", "").lower() in ("1", "true", "yes"),
+        key="use_fact_sheet",
+        help="Gather validators, audits and repositories once per chain and reuse them in every risk prompt"
+    )
+    reuse_similar = st.sidebar.toggle(
+        "Reuse answers from similar chains",
+        value=False,
+        key="reuse_similar_answers",
+        help="Offer a prior answer as a draft when chains on the same framework answered a risk near-identically"
+    )
+    if reuse_similar:
+        st.sidebar.slider(
+            "Similarity threshold",
+            min_value=0.5,
+            max_value=1.0,
+            value=DEFAULT_THRESHOLD,
+            step=0.01,
+            key="similarity_threshold",
+            help="Minimum TF-IDF cosine similarity between prior answers for them to count as agreeing"
+        )
+    if st.sidebar.button("🔑 Reload credentials", help="Rebuild the CB-GPT client after rotating API keys"):
+        invalidate_shared_client()
+    
     # Initialize session state for form data if not exists
     if 'form_submitted' not in st.session_state:
         st.session_state.form_submitted = False
     
     # Input form
     with st.form("blockchain_info"):
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         with col1:
             blockchain_name = st.text_input("Blockchain Name", 
                 value=st.session_state.get('blockchain_name', ''))
@@ -517,6 +391,12 @@ def main():
                 value=st.session_state.get('blockchain_website', ''),
                 help="Enter the blockchain's block explorer URL (e.g., https://etherscan.io) for validator distribution analysis"
             )
+        with col4:
+            blockchain_framework = st.text_input(
+                "Framework (optional)",
+                value=st.session_state.get('blockchain_framework', ''),
+                help="Codebase the chain is built on (e.g., Cosmos SDK, OP Stack); answers are shared between chains on the same framework"
+            )
         
         submitted = st.form_submit_button("Analyze Security")
     
@@ -526,17 +406,23 @@ def main():
         st.session_state.blockchain_name = blockchain_name
         st.session_state.blockchain_symbol = blockchain_symbol
         st.session_state.blockchain_website = blockchain_website
+        st.session_state.blockchain_framework = blockchain_framework
         st.session_state.form_submitted = True
         
-        # Clear existing responses
-        if os.path.exists(EDITED_RESPONSES_FILE):
-            os.remove(EDITED_RESPONSES_FILE)
-        save_json_file(EDITED_RESPONSES_FILE, {})
-        
-        # Clear session state responses
+        # Clear session state responses; stored answers whose prompt is unchanged are reused below
         for key in list(st.session_state.keys()):
             if key.startswith('response_'):
                 del st.session_state[key]
+        st.session_state.resume_analysis = True
+        
+        # Watched chains open with the last good shared answers while stale ones refresh in the background
+        watched = Watchlist().get(blockchain_name)
+        if watched:
+            risks = load_risks().get('risks', [])
+            fingerprints = {risk['name']: current_fingerprint(risk) for risk in risks}
+            get_refresher().serve(watched, get_session_id(), risks, fingerprints)
+            # Risks still unanswered are asked by this session's own job, not again by a refresh
+            get_refresher().refresh(watched, risks, get_session_id())
     
     # Show analysis if form was submitted (either now or previously)
     if st.session_state.form_submitted:
@@ -547,7 +433,43 @@ def main():
         
         # Initialize client and load risks
         risks_data = load_risks()
-        cb_gpt = CbGptClient()
+        cb_gpt = get_shared_client()
+        if cb_gpt.cache:
+            cache_stats = cb_gpt.cache.stats()
+            st.sidebar.caption(
+                f"Response cache: {cache_stats['entries']} entries, "
+                f"{cache_stats['hits']} hits / {cache_stats['misses']} misses"
+            )
+        with st.sidebar.expander("CB-GPT rate control"):
+            st.json(cb_gpt.rate_metrics())
+        
+        job_pool = get_job_pool()
+        if job_pool.answer_index:
+            reuse_stats = job_pool.answer_index.stats()
+            st.sidebar.caption(
+                f"Similar-answer reuse: {reuse_stats['hits']} of {reuse_stats['lookups']} lookups "
+                f"({reuse_stats['hit_rate']:.0%}), {reuse_stats['entries']} indexed answers"
+            )
+        
+        # Watched chains are kept fresh in the background so they open instantly
+        watchlist = Watchlist()
+        if watchlist.get(st.session_state.blockchain_name):
+            if job_pool.jobs.active(st.session_state.blockchain_name, WATCHLIST_SESSION):
+                st.sidebar.caption("🔄 Refreshing this watched chain's answers in the background")
+            if st.sidebar.button("☆ Stop watching this chain"):
+                watchlist.remove(st.session_state.blockchain_name)
+                st.experimental_rerun()
+        elif st.sidebar.button("⭐ Watch this chain", help="Keep this chain's answers fresh in the background so it opens instantly"):
+            entry = watchlist.add(
+                st.session_state.blockchain_name,
+                st.session_state.blockchain_symbol,
+                st.session_state.blockchain_website,
+                st.session_state.get('blockchain_framework')
+            )
+            # Start the shared answers from this session's, so only the missing ones are asked
+            get_refresher().seed(entry, get_session_id(), risks_data['risks'])
+            get_refresher().refresh(entry, risks_data['risks'], get_session_id())
+            st.experimental_rerun()
         
         # Group risks by criticality
         critical_risks = [risk for risk in risks_data['risks'] if risk['is_critical']]
@@ -555,104 +477,166 @@ def main():
         
         # Add reset button
         if st.button("⚠️ Start New Analysis"):
+            for job in job_pool.jobs.active(st.session_state.blockchain_name, get_session_id()):
+                job_pool.cancel(job['job_id'])
+            get_store().clear(st.session_state.blockchain_name, get_session_id())
             for key in list(st.session_state.keys()):
                 del st.session_state[key]
-            if os.path.exists(EDITED_RESPONSES_FILE):
-                os.remove(EDITED_RESPONSES_FILE)
             st.experimental_rerun()
             return
         
         # Load existing responses
         edited_responses = load_edited_responses()
+        stored_fingerprints = get_store().load_fingerprints(st.session_state.blockchain_name, get_session_id())
+        st.session_state.answers_updated_at = get_store().load_updated_at(st.session_state.blockchain_name, get_session_id())
         
-        # Display risks
-        st.markdown("## 🚨 Critical Security Risks")
-        for risk in critical_risks:
-            # Check if response exists in session state or edited responses
+        # Restore saved responses; risks that are new, unanswered or whose prompt changed are analyzed in the background
+        pending_risks = []
+        # Answers given with a reduced budget under load are shown, then re-asked once load drops
+        reduced_risks = []
+        for risk in critical_risks + non_critical_risks:
             response_key = f"response_{risk['name']}"
-            if response_key not in st.session_state:
-                # Check if response exists in edited responses file
-                if risk['name'] in edited_responses:
+            # Risks already at the reduced budget answer the same either way
+            reduced = (
+                not risk['is_critical'] and edited_responses.get(risk['name'])
+                and stored_fingerprints.get(risk['name']) == downgraded_fingerprint(risk) != current_fingerprint(risk)
+            )
+            if reduced:
+                reduced_risks.append(risk)
+                if response_key not in st.session_state:
                     st.session_state[response_key] = edited_responses[risk['name']]
-                else:
-                    # Generate new response
-                    response = cb_gpt.analyze_blockchain_security(
-                        st.session_state.blockchain_name,
-                        risk['prompt'],
-                        block_explorer_url=st.session_state.blockchain_website if st.session_state.blockchain_website else None
-                    )
-                    st.session_state[response_key] = response
-                    # Save to edited responses
-                    save_edited_response(risk['name'], response)
-            
-            display_risk_analysis(risk, st.session_state[response_key])
+            elif not edited_responses.get(risk['name']) or stored_fingerprints.get(risk['name']) != current_fingerprint(risk):
+                st.session_state.pop(response_key, None)
+                pending_risks.append(risk)
+            elif response_key not in st.session_state:
+                st.session_state[response_key] = edited_responses[risk['name']]
+        pending_names = {risk['name'] for risk in pending_risks}
+        reduced_names = {risk['name'] for risk in reduced_risks}
+        
+        # Pending risks are answered by a background job; this script only submits and polls it
+        active_jobs = job_pool.jobs.active(st.session_state.blockchain_name, get_session_id())
+        latest_job = job_pool.jobs.latest(st.session_state.blockchain_name, get_session_id())
+        resume = st.session_state.pop('resume_analysis', False)
+        # Risks a finished job failed to answer are only re-asked on Resume, not on every rerun
+        latest_clean = latest_job is None or (latest_job['status'] == 'done' and not latest_job['failed'])
+        if pending_risks and not active_jobs and (resume or latest_clean):
+            submit_analysis_job(pending_risks)
+            active_jobs = job_pool.jobs.active(st.session_state.blockchain_name, get_session_id())
+            # The new job may already have finished, or failed to submit
+            latest_job = job_pool.jobs.latest(st.session_state.blockchain_name, get_session_id())
+        elif reduced_risks and not active_jobs and latest_clean and cb_gpt.full_budget_available():
+            submit_analysis_job(reduced_risks)
+            active_jobs = job_pool.jobs.active(st.session_state.blockchain_name, get_session_id())
+        
+        if active_jobs:
+            total = sum(job['total'] for job in active_jobs)
+            completed = sum(job['completed'] for job in active_jobs)
+            failed = sum(job['failed'] for job in active_jobs)
+            failed_text = f" ({failed} failed)" if failed else ""
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.progress(min(1.0, completed / total) if total else 0.0, text=f"Analyzed {completed} of {total} security risks{failed_text}")
+            with col2:
+                if st.button("⏹️ Cancel analysis"):
+                    for job in active_jobs:
+                        job_pool.cancel(job['job_id'])
+                    st.experimental_rerun()
+        elif pending_risks:
+            status = ""
+            if latest_job:
+                failed = f", {latest_job['failed']} failed" if latest_job['failed'] else ""
+                status = f" (last analysis {latest_job['status']}{failed})"
+            st.warning(f"{len(pending_risks)} security risks have not been analyzed{status}.")
+            if latest_job and latest_job['error']:
+                st.error(f"The last analysis stopped: {latest_job['error']}")
+            if st.button("▶️ Resume analysis"):
+                st.session_state.resume_analysis = True
+                st.experimental_rerun()
+        
+        partials = {}
+        for job in active_jobs:
+            partials.update(job_pool.partial(job['job_id']))
+        # Why the last analysis failed each risk it could not answer, e.g. a failed Regenerate
+        risk_errors = latest_job['risk_errors'] if latest_job and not active_jobs else {}
+        
+        # Render every risk section; pending ones show their progress
+        st.markdown("## 🚨 Critical Security Risks")
+        for risk in critical_risks:
+            render_risk_slot(
+                risk, risk['name'] in pending_names, partials.get(risk['name']), bool(active_jobs), risk['name'] in reduced_names,
+                risk_errors.get(risk['name'])
+            )
         
         st.markdown("## ⚠️ Other Security Considerations")
         for risk in non_critical_risks:
-            # Check if response exists in session state or edited responses
-            response_key = f"response_{risk['name']}"
-            if response_key not in st.session_state:
-                # Check if response exists in edited responses file
-                if risk['name'] in edited_responses:
-                    st.session_state[response_key] = edited_responses[risk['name']]
-                else:
-                    # Generate new response
-                    response = cb_gpt.analyze_blockchain_security(
-                        st.session_state.blockchain_name,
-                        risk['prompt'],
-                        block_explorer_url=st.session_state.blockchain_website if st.session_state.blockchain_website else None
-                    )
-                    st.session_state[response_key] = response
-                    # Save to edited responses
-                    save_edited_response(risk['name'], response)
-            
-            display_risk_analysis(risk, st.session_state[response_key])
+            render_risk_slot(
+                risk, risk['name'] in pending_names, partials.get(risk['name']), bool(active_jobs), risk['name'] in reduced_names,
+                risk_errors.get(risk['name'])
+            )
+        
+        fact_sheet = load_fact_sheet()
+        if fact_sheet:
+            with st.expander("🧾 Chain fact sheet"):
+                st.markdown(fact_sheet)
+        
+        display_telemetry(cb_gpt.telemetry)
+        
+        if active_jobs:
+            # Poll the background job; the script never waits on CB-GPT itself
+            time.sleep(POLL_INTERVAL_SECONDS)
+            st.experimental_rerun()
+            return
         
         # Export functionality
         st.markdown("### Export Report")
-        col1, col2 = st.columns(2)
         
         # Reload edited responses to ensure we have the latest version
         edited_responses = load_edited_responses()
+        digest = report_digest(
+            st.session_state.blockchain_name,
+            st.session_state.blockchain_symbol,
+            st.session_state.blockchain_website,
+            critical_risks,
+            non_critical_risks,
+            edited_responses
+        )
         
-        with col1:
-            docx_buffer = generate_docx(
-                st.session_state.blockchain_name,
-                st.session_state.blockchain_symbol,
-                st.session_state.blockchain_website,
-                critical_risks,
-                non_critical_risks,
-                edited_responses
-            )
-            st.markdown(
-                get_download_link(
-                    docx_buffer,
-                    f"{st.session_state.blockchain_name}_Security_Analysis.docx",
-                    "📄 Download as DOCX"
-                ),
-                unsafe_allow_html=True
-            )
+        # Reports are only built on request, and rebuilt only when their content changes
+        if st.session_state.get('export_digest') != digest:
+            if 'export_digest' in st.session_state:
+                st.caption("The analysis has changed since the last export.")
+            if st.button("📦 Prepare report downloads"):
+                st.session_state.export_digest = digest
         
-        with col2:
-            pdf_buffer = generate_pdf(
-                st.session_state.blockchain_name,
-                st.session_state.blockchain_symbol,
-                st.session_state.blockchain_website,
-                critical_risks,
-                non_critical_risks,
-                edited_responses
-            )
-            if pdf_buffer:
-                st.markdown(
-                    get_download_link(
-                        pdf_buffer,
-                        f"{st.session_state.blockchain_name}_Security_Analysis.pdf",
-                        "📑 Download as PDF"
-                    ),
-                    unsafe_allow_html=True
+        if st.session_state.get('export_digest') == digest:
+            with st.spinner("Building reports..."):
+                exports = build_exports(
+                    digest,
+                    st.session_state.blockchain_name,
+                    st.session_state.blockchain_symbol,
+                    st.session_state.blockchain_website,
+                    critical_risks,
+                    non_critical_risks,
+                    edited_responses
                 )
-            else:
-                st.error("Failed to generate PDF. Please check the debug information above.")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button(
+                    "📄 Download as DOCX",
+                    data=exports['docx'],
+                    file_name=f"{st.session_state.blockchain_name}_Security_Analysis.docx",
+                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+                )
+            with col2:
+                if exports['pdf']:
+                    st.download_button(
+                        "📑 Download as PDF",
+                        data=exports['pdf'],
+                        file_name=f"{st.session_state.blockchain_name}_Security_Analysis.pdf",
+                        mime="application/pdf"
+                    )
+                else:
+                    st.error("Failed to generate PDF. Please check the debug information above.")
 
 if __name__ == "__main__":
     main() 
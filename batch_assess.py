@@ -0,0 +1,315 @@
+"""Headless batch assessment of many blockchains.
+
+Runs every risks.json prompt for every chain listed in a CSV or JSONL file
+(columns/keys: name, symbol, explorer_url and optionally framework) and writes per-chain DOCX/PDF
+reports plus a machine-readable results.jsonl, and records every answer in
+the cross-chain results index. Re-running with the same output directory
+resumes from the results already recorded there; answers to risks whose
+prompt has since changed in risks.json are re-queried.
+With --consolidated, one report covering every chain is also written,
+streamed to disk a chain at a time; answers are read back from
+results.jsonl for the chain being rendered rather than kept in memory. With --reuse-similar, chains declaring
+the same framework reuse near-identical prior answers as drafts.
+
+Usage:
+    python batch_assess.py chains.csv --output-dir reports --concurrency 8 --rate 2
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from answer_index import AnswerIndex, DEFAULT_THRESHOLD
+from cb_gpt_client import GenerationSettings, get_shared_client
+from fact_sheet import get_fact_sheet_provider
+from rate_limit import TokenBucket
+from results_index import ResultsIndex
+from reports import generate_docx, generate_pdf, write_consolidated_docx, write_consolidated_pdf
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Constants
+RISKS_FILE = os.path.join(os.path.dirname(__file__), 'risks.json')
+RESULTS_FILENAME = 'results.jsonl'
+REPORT_FORMATS = ('docx', 'pdf')
+CONSOLIDATED_BASENAME = 'Consolidated_Security_Analysis'
+
+def load_chains(path):
+    """Load the chains to assess from a CSV or JSONL file."""
+    with open(path, 'r', newline='') as f:
+        if path.endswith('.jsonl'):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    chains = []
+    for row in rows:
+        name = (row.get('name') or '').strip()
+        if not name:
+            logger.warning(f"Skipping chain without a name: {row}")
+            continue
+        chains.append({
+            "name": name,
+            "symbol": (row.get('symbol') or '').strip(),
+            "explorer_url": (row.get('explorer_url') or row.get('website') or '').strip() or None,
+            "framework": (row.get('framework') or '').strip() or None,
+        })
+    return chains
+
+def load_risks():
+    """Load risks from JSON file."""
+    with open(RISKS_FILE, 'r') as f:
+        return json.load(f)['risks']
+
+def index_results(results_path):
+    """Locate the latest answered record of each (chain, risk) in a results file.
+
+    Returns (byte offset, fingerprint) pairs keyed by (chain, risk), so the
+    answers themselves are only read back when a report needs them.
+    """
+    index = {}
+    if not os.path.exists(results_path):
+        return index
+    with open(results_path, 'rb') as f:
+        offset = 0
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a truncated final line behind
+                logger.warning("Ignoring malformed line in results file")
+                record = {}
+            if record.get('response'):
+                index[(record['chain'], record['risk'])] = (offset, record.get('fingerprint'))
+            offset += len(line)
+    return index
+
+def read_responses(results_path, offsets, chain_name, risk_names):
+    """Read one chain's answers back from a results file, given the byte offset of each (chain, risk) record."""
+    responses = {}
+    with open(results_path, 'rb') as f:
+        for risk_name in risk_names:
+            offset = offsets.get((chain_name, risk_name))
+            if offset is not None:
+                f.seek(offset)
+                responses[risk_name] = json.loads(f.readline())['response']
+    return responses
+
+class ResultWriter:
+    """Append-only, crash-safe JSONL writer shared by worker threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        """Append one record, flush it to disk and return the byte offset it starts at."""
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        return offset
+
+def report_basename(chain):
+    """Filesystem-safe base name for a chain's reports."""
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', chain['name']).strip('_') + '_Security_Analysis'
+
+def write_reports(chain, risks, responses, output_dir, formats):
+    """Write the DOCX/PDF reports for a fully assessed chain."""
+    critical_risks = [risk for risk in risks if risk['is_critical']]
+    non_critical_risks = [risk for risk in risks if not risk['is_critical']]
+    generators = {"docx": generate_docx, "pdf": generate_pdf}
+    for fmt in formats:
+        buffer = generators[fmt](
+            chain['name'],
+            chain['symbol'],
+            chain['explorer_url'],
+            critical_risks,
+            non_critical_risks,
+            responses
+        )
+        if buffer is None:
+            logger.error(f"Failed to generate {fmt.upper()} report for {chain['name']}")
+            continue
+        path = os.path.join(output_dir, f"{report_basename(chain)}.{fmt}")
+        with open(path, 'wb') as f:
+            f.write(buffer.getvalue())
+        logger.info(f"Wrote {path}")
+
+def write_consolidated_reports(chains, risks, load_responses, output_dir, formats):
+    """Write one report per format covering every chain, streamed to disk chain by chain.
+
+    load_responses(chain) returns a chain's answers keyed by risk name; it
+    is only called while that chain is rendered.
+    """
+    critical_risks = [risk for risk in risks if risk['is_critical']]
+    non_critical_risks = [risk for risk in risks if not risk['is_critical']]
+    writers = {"docx": write_consolidated_docx, "pdf": write_consolidated_pdf}
+    for fmt in formats:
+        path = os.path.join(output_dir, f"{CONSOLIDATED_BASENAME}.{fmt}")
+        try:
+            writers[fmt](path, chains, critical_risks, non_critical_risks, load_responses)
+        except Exception as e:
+            logger.error(f"Failed to write consolidated {fmt.upper()} report: {str(e)}")
+            continue
+        logger.info(f"Wrote {path}")
+
+def run_batch(chains, risks, output_dir, concurrency, rate, formats=REPORT_FORMATS, group_related=False, fact_sheets=False,
+              consolidated=False, reuse_similar=False, similarity_threshold=DEFAULT_THRESHOLD):
+    """Assess every chain against every risk, resuming from earlier partial results."""
+    os.makedirs(output_dir, exist_ok=True)
+    results_path = os.path.join(output_dir, RESULTS_FILENAME)
+    writer = ResultWriter(results_path)
+    limiter = TokenBucket(rate, capacity=concurrency) if rate else None
+    client = get_shared_client()
+    fact_sheet_provider = get_fact_sheet_provider(client) if fact_sheets else None
+    answer_index = AnswerIndex()
+    results_index = ResultsIndex()
+
+    # Only reuse answers given to the prompt each risk has now
+    fingerprints = {
+        (chain['name'], risk['name']): client.risk_fingerprint(risk['prompt'], chain['explorer_url'], GenerationSettings.for_risk(risk))
+        for chain in chains
+        for risk in risks
+    }
+    # Where each answered risk's record is in results.jsonl; answers are read back per chain for its reports
+    offsets = {
+        key: offset
+        for key, (offset, fingerprint) in index_results(results_path).items()
+        if key in fingerprints and fingerprint == fingerprints[key]
+    }
+    completed = set(offsets)
+
+    def load_responses(chain):
+        return read_responses(results_path, offsets, chain['name'], [risk['name'] for risk in risks])
+
+    tasks = []
+    remaining = {}
+    for chain in chains:
+        pending = [risk for risk in risks if (chain['name'], risk['name']) not in completed]
+        remaining[chain['name']] = len(pending)
+        tasks.extend((chain, batch) for batch in client.plan_batches(pending, group_related))
+    logger.info(
+        f"{sum(remaining.values())} risk analyses in {len(tasks)} requests to run across "
+        f"{len(chains)} chains ({len(completed)} already done)"
+    )
+
+    def analyze(chain, batch):
+        # Returns the answers and the telemetry record of the call behind each one
+        drafts, records = {}, {}
+        if reuse_similar:
+            # Chains finished earlier in this run count too, so forks later in the file get drafts
+            drafts, batch = answer_index.split_drafts(batch, chain['framework'], chain['name'], similarity_threshold)
+            if not batch:
+                return drafts, records
+        if limiter:
+            limiter.acquire()
+        # The provider gathers each chain's fact sheet once; later batches read the cached copy
+        fact_sheet = fact_sheet_provider.get(chain['name'], chain['explorer_url']) if fact_sheet_provider else None
+        answers = client.analyze_batch(chain['name'], batch, chain['explorer_url'], fact_sheet=fact_sheet, records=records)
+        for risk in batch:
+            answer_index.add(risk, chain['framework'], chain['name'], answers.get(risk['name']))
+        return {**answers, **drafts}, records
+
+    def finish_chain(chain):
+        if all((chain['name'], risk['name']) in offsets for risk in risks):
+            write_reports(chain, risks, load_responses(chain), output_dir, formats)
+        else:
+            logger.warning(f"{chain['name']} has failed risks; re-run to retry them before reports are written")
+
+    # Chains fully answered by a previous run only need their reports
+    for chain in chains:
+        if remaining[chain['name']] == 0:
+            finish_chain(chain)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+        futures = {executor.submit(analyze, chain, batch): (chain, batch) for chain, batch in tasks}
+        for future in as_completed(futures):
+            chain, batch = futures[future]
+            try:
+                answers, records = future.result()
+            except Exception as e:
+                logger.error(f"Error analyzing {[risk['name'] for risk in batch]} for {chain['name']}: {str(e)}")
+                answers, records = {}, {}
+            for risk in batch:
+                response = answers.get(risk['name'])
+                fingerprint = fingerprints[(chain['name'], risk['name'])]
+                if (records.get(risk['name']) or {}).get('downgraded'):
+                    # A reduced-budget answer is kept for the reports but re-asked by the next run
+                    fingerprint = client.downgraded_fingerprint(risk['prompt'], chain['explorer_url'], GenerationSettings.for_risk(risk))
+                offset = writer.write({
+                    "chain": chain['name'],
+                    "symbol": chain['symbol'],
+                    "explorer_url": chain['explorer_url'],
+                    "risk": risk['name'],
+                    "is_critical": risk['is_critical'],
+                    "fingerprint": fingerprint,
+                    "response": response,
+                    "completed_at": time.time(),
+                })
+                if response:
+                    offsets[(chain['name'], risk['name'])] = offset
+            indexed = []
+            for risk in batch:
+                record = records.get(risk['name']) or {}
+                indexed.append((chain['name'], risk, answers.get(risk['name']), record.get('latency'), record.get('model'), 'batch', None))
+            results_index.record_many(indexed)
+            remaining[chain['name']] -= len(batch)
+            if remaining[chain['name']] == 0:
+                finish_chain(chain)
+
+    if consolidated:
+        write_consolidated_reports(chains, risks, load_responses, output_dir, formats)
+    if reuse_similar:
+        reuse_stats = answer_index.stats()
+        logger.info(
+            f"Similar-answer reuse: {reuse_stats['hits']} of {reuse_stats['lookups']} lookups "
+            f"({reuse_stats['hit_rate']:.0%}) answered from drafts"
+        )
+    client.telemetry.write_metrics_file(os.path.join(output_dir, 'cb_gpt_metrics.prom'))
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Assess many blockchains against every risk in risks.json.")
+    parser.add_argument("chains", help="CSV or JSONL file with name, symbol and explorer_url per chain")
+    parser.add_argument("--output-dir", default="reports", help="Directory for reports and results.jsonl")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum CB-GPT calls in flight across all chains")
+    parser.add_argument("--rate", type=float, default=0, help="Maximum CB-GPT calls started per second (0 = unlimited)")
+    parser.add_argument("--group-related", action="store_true", help="Answer risks sharing a risks.json group in one request")
+    parser.add_argument("--fact-sheets", action="store_true", help="Gather a shared fact sheet per chain and include it in every prompt")
+    parser.add_argument("--consolidated", action="store_true", help="Also write one report covering every chain")
+    parser.add_argument("--reuse-similar", action="store_true", help="Reuse near-identical prior answers from chains on the same framework")
+    parser.add_argument("--similarity-threshold", type=float, default=DEFAULT_THRESHOLD, help="Minimum similarity for prior answers to count as agreeing")
+    parser.add_argument("--formats", default=",".join(REPORT_FORMATS), help="Comma-separated report formats (docx,pdf)")
+    args = parser.parse_args(argv)
+
+    formats = [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()]
+    unknown = set(formats) - set(REPORT_FORMATS)
+    if unknown:
+        parser.error(f"Unknown report formats: {', '.join(sorted(unknown))}")
+
+    run_batch(
+        load_chains(args.chains),
+        load_risks(),
+        args.output_dir,
+        args.concurrency,
+        args.rate,
+        formats,
+        args.group_related,
+        args.fact_sheets,
+        args.consolidated,
+        args.reuse_similar,
+        args.similarity_threshold
+    )
+
+if __name__ == "__main__":
+    main()
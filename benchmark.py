@@ -0,0 +1,622 @@
+"""Offline benchmarks for the analysis pipeline.
+
+Everything runs against fake_cb_gpt.FakeCbGptServiceApiClient, so no
+network access or credentials are needed.
+
+Usage:
+    python benchmark.py all
+    python benchmark.py assessment [--latency pareto] [--latency-mean 0.5] [--error-rate 0.05]
+    python benchmark.py reports [--size 3000]
+    python benchmark.py markdown [--size 20000] [--repeat 20]
+    python benchmark.py persistence
+    python benchmark.py startup [--repeat 5]
+    python benchmark.py consolidated [--chains 50]
+    python benchmark.py hedging [--latency pareto] [--latency-spread 0.7] [--repeat 30]
+    python benchmark.py interaction [--repeat 20]
+    python benchmark.py routing [--throttle-rate 0.2] [--repeat 5]
+    python benchmark.py singleflight [--sessions 4] [--latency-mean 1]
+    python benchmark.py results [--chains 2000] [--repeat 20]
+"""
+import argparse
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from fake_cb_gpt import LATENCY_DISTRIBUTIONS, FakeCbGptServiceApiClient, make_fake_client
+from reports import generate_docx, generate_pdf, process_markdown, write_consolidated_docx, write_consolidated_pdf
+from response_store import FileResponseStore, SqliteResponseStore
+from results_index import ResultsIndex, extract_verdict
+
+RISKS_FILE = os.path.join(os.path.dirname(__file__), 'risks.json')
+
+# Modules whose cold import cost is tracked, and heavy dependencies that should stay unloaded
+STARTUP_MODULES = ('reports', 'cb_gpt_client', 'job_queue', 'app')
+DEFERRED_PACKAGES = ('docx', 'reportlab', 'cb_ai_agentkit', 'streamlit')
+# Deferred packages a module needs at import time anyway: the app is the Streamlit UI
+REQUIRED_PACKAGES = {'app': ('streamlit',)}
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def time_calls(func, repeat):
+    """Call func repeatedly, returning the duration of each call in seconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def report(name, samples, items_per_call=1):
+    """Print latency percentiles and throughput for a set of timings."""
+    total = sum(samples)
+    throughput = (len(samples) * items_per_call / total) if total else float('inf')
+    print(
+        f"{name:<40} p50={percentile(samples, 50) * 1000:9.2f}ms "
+        f"p95={percentile(samples, 95) * 1000:9.2f}ms "
+        f"p99={percentile(samples, 99) * 1000:9.2f}ms "
+        f"throughput={throughput:10.1f}/s"
+    )
+
+def load_risks():
+    """Load risks from JSON file."""
+    with open(RISKS_FILE, 'r') as f:
+        return json.load(f)['risks']
+
+def make_fake_service(args):
+    """Build the fake CB-GPT service described by the command line options."""
+    return FakeCbGptServiceApiClient(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_spread=args.latency_spread,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        response_chars=args.size,
+        seed=args.seed
+    )
+
+def sample_markdown(size):
+    """Build a markdown-heavy answer of roughly `size` characters."""
+    sentence = (
+        "The **validator set** is run by *independent operators*; see `staking.go` and "
+        "[the audit report](https://example.com/audit?id=1&page=2) for details. "
+    )
+    return (sentence * (size // len(sentence) + 1))[:size]
+
+def legacy_process_markdown(text, for_pdf=True):
+    """The previous find/replace implementation, kept as the benchmark baseline."""
+    if not text:
+        return text if for_pdf else (text, [], [])
+    text = text.replace('```', '')
+    if for_pdf:
+        text = text.replace('`', '<font face="Courier" color="#333333">', 1)
+        text = text.replace('`', '</font>', 1) if '`' in text else text
+        text = text.replace('**', '<b>', 1)
+        text = text.replace('**', '</b>', 1) if '**' in text else text
+        text = text.replace('*', '<i>', 1)
+        text = text.replace('*', '</i>', 1) if '*' in text else text
+        text = re.sub(r'\[(.*?)\]\((.*?)\)', r'<link href="\2" color="blue"><u>\1</u></link>', text)
+        return text
+    formats = []
+    links = []
+    while '`' in text:
+        start_idx = text.find('`')
+        text = text.replace('`', '', 1)
+        if '`' in text:
+            end_idx = text.find('`')
+            text = text.replace('`', '', 1)
+            formats.append(('code', start_idx, end_idx))
+    while '**' in text:
+        start_idx = text.find('**')
+        text = text.replace('**', '', 1)
+        if '**' in text:
+            end_idx = text.find('**')
+            text = text.replace('**', '', 1)
+            formats.append(('bold', start_idx, end_idx))
+    while '*' in text:
+        start_idx = text.find('*')
+        text = text.replace('*', '', 1)
+        if '*' in text:
+            end_idx = text.find('*')
+            text = text.replace('*', '', 1)
+            formats.append(('italic', start_idx, end_idx))
+    for match in re.finditer(r'\[(.*?)\]\((.*?)\)', text):
+        links.append((match.group(1), match.group(2), match.start(), match.end()))
+    text = re.sub(r'\[(.*?)\]\((.*?)\)', r'\1', text)
+    return text, formats, links
+
+def check_offsets(process, text):
+    """Count DOCX format ranges that do not cover the text they were meant to style."""
+    processed, formats, _ = process(text, for_pdf=False)
+    expected = {'code': 'staking.go', 'bold': 'validator set', 'italic': 'independent operators'}
+    return sum(1 for fmt, start, end in formats if processed[start:end] != expected[fmt])
+
+def bench_markdown(args):
+    """Compare the legacy and single-pass markdown processors."""
+    text = sample_markdown(args.size)
+    print(f"process_markdown on a {len(text)}-character answer, {args.repeat} runs")
+    for label, process in (("legacy", legacy_process_markdown), ("single-pass", process_markdown)):
+        report(f"{label} pdf", time_calls(lambda: process(text, for_pdf=True), args.repeat))
+        report(f"{label} docx", time_calls(lambda: process(text, for_pdf=False), args.repeat))
+        print(f"{label} misplaced docx format ranges: {check_offsets(process, text)}")
+        print(f"{label} bold runs in pdf markup: {process(text, for_pdf=True).count('<b>')} of {text.count('**') // 2}")
+
+def bench_assessment(args):
+    """Time a full assessment of every risk in risks.json against the fake service."""
+    risks = load_risks()
+    service = make_fake_service(args)
+    print(
+        f"Full {len(risks)}-risk assessment, {args.latency} latency (mean {args.latency_mean}s), "
+        f"{args.error_rate:.0%} errors, {args.throttle_rate:.0%} throttling, {args.repeat} runs"
+    )
+    failures = 0
+
+    def run():
+        nonlocal failures
+        responses = make_fake_client(service).analyze_many("Benchmark Chain", risks, "https://explorer.example.com")
+        failures += sum(1 for response in responses.values() if not response)
+
+    report("assessment", time_calls(run, args.repeat), items_per_call=len(risks))
+    print(f"service calls: {service.calls}, failed risks: {failures} of {len(risks) * args.repeat}")
+
+def bench_hedging(args):
+    """Compare per-call and whole-assessment tail latency with hedging off and on."""
+    from rate_limit import TokenBucket
+    risks = load_risks()
+    print(
+        f"Hedged requests: {args.repeat} assessments of {len(risks)} risks, {args.latency} latency "
+        f"(mean {args.latency_mean}s, spread {args.latency_spread})"
+    )
+    for hedging in (False, True):
+        service = make_fake_service(args)
+        # Every run must reach the service, and the rate limiter would dominate the timings
+        client = make_fake_client(service, cache=False, hedging=hedging)
+        client.rate_limiter = TokenBucket(1000, capacity=1000)
+        client.hedge_min_delay = 0.0
+        label = "hedged" if hedging else "unhedged"
+        samples = time_calls(lambda: client.analyze_many("Benchmark Chain", risks, "https://explorer.example.com"), args.repeat)
+        report(f"{label} assessment", samples, items_per_call=len(risks))
+        report(f"{label} call", [record["latency"] for record in client.telemetry.records()])
+        metrics = client.rate_metrics()
+        print(
+            f"{'':<40} service calls={service.calls} hedges={metrics['hedges']} "
+            f"hedge wins={metrics['hedge_wins']} extra load={metrics['hedges'] / (len(risks) * args.repeat):.1%}"
+        )
+
+def bench_routing(args):
+    """Compare assessments with non-critical risks never, under load, or always downgraded."""
+    from cb_gpt_client import DOWNGRADE_MAX_TOKENS
+    from rate_limit import TokenBucket
+    risks = load_risks()
+    # The fake answers at most max_tokens * 4 characters, so answers must outgrow the downgrade cap for it to cut anything
+    service_args = argparse.Namespace(**dict(vars(args), size=max(args.size, 2 * 4 * DOWNGRADE_MAX_TOKENS)))
+    print(
+        f"Per-risk routing: {args.repeat} assessments of {len(risks)} risks of {service_args.size} characters, {args.latency} latency "
+        f"(mean {args.latency_mean}s), {args.throttle_rate:.0%} throttling, downgrade cap {DOWNGRADE_MAX_TOKENS} tokens"
+    )
+    for policy in ("never", "auto", "always"):
+        client = make_fake_client(make_fake_service(service_args), cache=False)
+        client.rate_limiter = TokenBucket(1000, capacity=1000)
+        client.load_policy = policy
+        samples = time_calls(lambda: client.analyze_many("Benchmark Chain", risks, "https://explorer.example.com"), args.repeat)
+        report(f"load policy {policy}", samples, items_per_call=len(risks))
+        critical = {risk['name'] for risk in risks if risk['is_critical']}
+        tokens = {True: 0, False: 0}
+        for record in client.telemetry.records():
+            tokens[record["risk"] in critical] += record["completion_tokens"] or 0
+        print(
+            f"{'':<40} downgraded={client.rate_metrics()['downgraded']} "
+            f"completion tokens critical={tokens[True]} non-critical={tokens[False]}"
+        )
+
+def bench_singleflight(args):
+    """Run several sessions assessing the same chain at once, with and without single-flight de-duplication."""
+    from concurrent.futures import ThreadPoolExecutor
+    from rate_limit import SingleFlight, TokenBucket
+    risks = load_risks()
+    print(
+        f"{args.sessions} concurrent sessions assessing the same chain ({len(risks)} risks), "
+        f"{args.latency} latency (mean {args.latency_mean}s)"
+    )
+    for label, stream in (("request", False), ("stream", True)):
+        for coalescing in (False, True):
+            service = make_fake_service(args)
+            single_flight = SingleFlight() if coalescing else False
+            clients = []
+            for _ in range(args.sessions):
+                # Each session has its own client, as separate app sessions and batch runs would
+                client = make_fake_client(service, cache=False, single_flight=single_flight)
+                client.rate_limiter = TokenBucket(1000, capacity=1000)
+                clients.append(client)
+
+            def run_session(client):
+                if not stream:
+                    return client.analyze_many("Benchmark Chain", risks, "https://explorer.example.com")
+                from cb_gpt_client import STREAM_FAILED
+                answers = {}
+                for risk_name, delta in client.stream_many("Benchmark Chain", risks, "https://explorer.example.com"):
+                    if delta is STREAM_FAILED:
+                        answers[risk_name] = None
+                    elif delta is not None:
+                        answers[risk_name] = answers.get(risk_name, "") + delta
+                return answers
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+                results = list(executor.map(run_session, clients))
+            duration = time.perf_counter() - start
+            identical = all(result == results[0] and all(result.values()) for result in results)
+            coalesced = single_flight.metrics()["coalesced"] if single_flight else 0
+            print(
+                f"{label + (' coalesced' if coalescing else ''):<40} time={duration:6.2f}s "
+                f"service calls={service.calls:4d} coalesced={coalesced:4d} identical complete answers={identical}"
+            )
+
+def bench_reports(args):
+    """Time DOCX and PDF generation for a full assessment."""
+    risks = load_risks()
+    critical_risks = [risk for risk in risks if risk['is_critical']]
+    non_critical_risks = [risk for risk in risks if not risk['is_critical']]
+    responses = {risk['name']: sample_markdown(args.size) for risk in risks}
+    print(f"Report generation for {len(risks)} risks of {args.size} characters, {args.repeat} runs")
+    for label, generate in (("docx", generate_docx), ("pdf", generate_pdf)):
+        report(label, time_calls(
+            lambda: generate("Benchmark Chain", "BNCH", "https://explorer.example.com", critical_risks, non_critical_risks, responses),
+            args.repeat
+        ))
+
+def measure_peak(func):
+    """Run func once, returning its duration in seconds and peak traced memory in bytes."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        func()
+        return time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_consolidated(args):
+    """Compare peak memory of a multi-chain report built in memory against the streaming writers."""
+    risks = load_risks()
+    critical_risks = [risk for risk in risks if risk['is_critical']]
+    non_critical_risks = [risk for risk in risks if not risk['is_critical']]
+    chains = [
+        {"name": f"Benchmark Chain {index}", "symbol": f"BN{index}", "explorer_url": "https://explorer.example.com"}
+        for index in range(args.chains)
+    ]
+
+    def load_responses(chain):
+        return {risk['name']: sample_markdown(args.size) for risk in risks}
+
+    # Baseline: every chain's risks folded into one in-memory report
+    def flatten(section):
+        return [dict(risk, name=f"{chain['name']}: {risk['name']}") for chain in chains for risk in section]
+
+    def all_responses():
+        answer = sample_markdown(args.size)
+        return {risk['name']: answer for risk in flatten(risks)}
+
+    print(f"Consolidated report for {args.chains} chains x {len(risks)} risks of {args.size} characters")
+    with tempfile.TemporaryDirectory() as tmp:
+        # Warm up imports and font caches so they are not counted against the first measurement
+        warmup = os.path.join(tmp, 'warmup')
+        write_consolidated_docx(warmup, chains[:1], critical_risks, non_critical_risks, load_responses)
+        write_consolidated_pdf(warmup, chains[:1], critical_risks, non_critical_risks, load_responses)
+        os.remove(warmup)
+        measurements = (
+            ("in-memory docx", lambda: generate_docx(
+                "All chains", "", None, flatten(critical_risks), flatten(non_critical_risks), all_responses()).getvalue()),
+            ("streaming docx", lambda: write_consolidated_docx(
+                os.path.join(tmp, 'consolidated.docx'), chains, critical_risks, non_critical_risks, load_responses)),
+            ("in-memory pdf", lambda: generate_pdf(
+                "All chains", "", None, flatten(critical_risks), flatten(non_critical_risks), all_responses()).getvalue()),
+            ("streaming pdf", lambda: write_consolidated_pdf(
+                os.path.join(tmp, 'consolidated.pdf'), chains, critical_risks, non_critical_risks, load_responses)),
+        )
+        for label, build in measurements:
+            duration, peak = measure_peak(build)
+            print(f"{label:<40} time={duration:8.2f}s peak memory={peak / 2**20:8.1f}MiB")
+        for name in sorted(os.listdir(tmp)):
+            print(f"{name:<40} {os.path.getsize(os.path.join(tmp, name)) / 2**20:8.1f}MiB on disk")
+
+def bench_persistence(args):
+    """Time saving and loading a full assessment through each response store backend."""
+    risks = load_risks()
+    answer = sample_markdown(args.size)
+    print(f"Response store upserts of {len(risks)} risks of {args.size} characters, {args.repeat} runs")
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = (
+            ("sqlite", SqliteResponseStore(os.path.join(tmp, 'responses.sqlite3'))),
+            ("files", FileResponseStore(os.path.join(tmp, 'responses'))),
+        )
+        for label, store in stores:
+            def save_all():
+                for risk in risks:
+                    store.upsert("Benchmark Chain", "benchmark", risk['name'], answer)
+
+            report(f"{label} save assessment", time_calls(save_all, args.repeat), items_per_call=len(risks))
+            report(f"{label} load assessment", time_calls(lambda: store.load("Benchmark Chain", "benchmark"), args.repeat))
+
+def bench_results(args):
+    """Time dashboard queries over a results index holding two assessments of every chain."""
+    risks = load_risks()
+    body = sample_markdown(args.size)
+    answers = [f"{body}\n\n**Verdict:** {verdict}" for verdict in ("PASS", "FAIL")] + [body]
+    report("extract verdict", time_calls(lambda: extract_verdict(answers[0]), args.repeat * 10))
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        index = ResultsIndex(os.path.join(tmp, 'results_index.sqlite3'))
+        for run in range(2):
+            start = time.perf_counter()
+            index.record_many(
+                (f"Benchmark Chain {chain}", risk, answers[(chain + position + run) % len(answers)], 1.0, None, 'benchmark',
+                 now - (2 - run) * 20 * 86400 + chain)
+                for chain in range(args.chains)
+                for position, risk in enumerate(risks)
+            )
+            print(f"{'index ' + str(args.chains * len(risks)) + ' answers':<40} time={time.perf_counter() - start:8.2f}s")
+        print(f"Results index of {index.stats()['answers']} answers for {args.chains} chains x {len(risks)} risks")
+        month = now - 30 * 86400
+        critical = next(risk['name'] for risk in risks if risk['is_critical'])
+        queries = (
+            ("summary, no filters", lambda: index.summary()),
+            ("summary, all answers", lambda: index.summary(latest_only=False)),
+            ("recent answers, no filters", lambda: index.query()),
+            ("failed one risk last month", lambda: index.chains(risks=[critical], verdicts=['fail'], since=month)),
+            ("critical failures, chain search", lambda: index.query(chain_search="Chain 1", verdicts=['fail'], critical_only=True)),
+        )
+        for label, query in queries:
+            report(label, time_calls(query, args.repeat))
+
+def measure_import(module):
+    """Import a module in a fresh interpreter under -X importtime.
+
+    Returns the module's cumulative import time in seconds and the deferred
+    packages that were loaded along with it.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed: {result.stderr.strip().splitlines()[-1]}")
+    cumulative = 0.0
+    loaded = set()
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)', line)
+        if not match:
+            continue
+        name = match.group(4)
+        if name == module:
+            cumulative = int(match.group(2)) / 1e6
+        package = name.split('.')[0]
+        if package in DEFERRED_PACKAGES and package not in REQUIRED_PACKAGES.get(module, ()):
+            loaded.add(package)
+    return cumulative, sorted(loaded)
+
+def bench_startup(args):
+    """Measure the cold import cost of the app modules with python -X importtime."""
+    print(f"Cold import time per module (python -X importtime), {args.repeat} runs")
+    for module in STARTUP_MODULES:
+        samples = []
+        loaded = []
+        try:
+            for _ in range(args.repeat):
+                cumulative, loaded = measure_import(module)
+                samples.append(cumulative)
+        except RuntimeError as e:
+            print(f"{module:<40} skipped: {str(e)}")
+            continue
+        report(f"import {module}", samples)
+        print(f"{'':<40} deferred packages loaded: {', '.join(loaded) or 'none'}")
+
+def full_page_script():
+    """Streamlit script run by the interaction benchmark: the whole app, as `streamlit run app.py` runs it."""
+    import app
+    app.main()
+
+class FragmentReruns:
+    """Makes AppTest rerun only the fragment a clicked widget belongs to, as a browser does.
+
+    AppTest reruns the whole script on every interaction and gives each run
+    empty fragment storage. Installed as AppTest's script runner factory,
+    this keeps the fragments registered by the last full run, remembers
+    which fragment rendered each widget, and queues just that fragment when
+    one of its widgets is clicked.
+    """
+
+    def __init__(self):
+        from streamlit.runtime.fragment import MemoryFragmentStorage
+        self.storage = MemoryFragmentStorage()
+        self.widget_fragments = {}
+        self.pending_fragment = None
+
+    def record_widgets(self, forward_msgs):
+        """Note the fragment each widget in a run's output was rendered by."""
+        for msg in forward_msgs:
+            if msg.WhichOneof('type') != 'delta' or msg.delta.WhichOneof('type') != 'new_element':
+                continue
+            element = msg.delta.new_element
+            widget_id = getattr(getattr(element, element.WhichOneof('type')), 'id', None)
+            if widget_id and msg.delta.fragment_id:
+                self.widget_fragments[widget_id] = msg.delta.fragment_id
+
+    def click(self, app_test, key):
+        """Click a button inside a fragment and rerun just that fragment."""
+        button = app_test.button(key=key)
+        self.pending_fragment = self.widget_fragments.get(button.id)
+        if self.pending_fragment is None:
+            raise RuntimeError(f"Button {key} is not rendered inside a fragment")
+        button.click().run()
+
+    def runner_class(self):
+        """LocalScriptRunner subclass sharing this fragment storage across runs."""
+        from urllib import parse
+        from streamlit.runtime.scriptrunner.script_requests import RerunData
+        from streamlit.testing.v1.element_tree import parse_tree_from_messages
+        from streamlit.testing.v1.local_script_runner import LocalScriptRunner, require_widgets_deltas
+        reruns = self
+
+        class FragmentScriptRunner(LocalScriptRunner):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self._fragment_storage = reruns.storage
+
+            def run(self, widget_state=None, query_params=None, timeout=3, page_hash=""):
+                fragment_id, reruns.pending_fragment = reruns.pending_fragment, None
+                if fragment_id is None:
+                    tree = super().run(widget_state, query_params, timeout, page_hash)
+                else:
+                    self.request_rerun(RerunData(
+                        widget_states=widget_state,
+                        query_string=parse.urlencode(query_params or {}, doseq=True),
+                        page_script_hash=page_hash,
+                        fragment_id_queue=[fragment_id]
+                    ))
+                    self.start()
+                    require_widgets_deltas(self, timeout)
+                    tree = parse_tree_from_messages(self.forward_msgs())
+                reruns.record_widgets(self.forward_msgs())
+                return tree
+
+        return FragmentScriptRunner
+
+def isolated_app(tmp, client):
+    """Patch the app's stores, indexes, job pool and watchlist to live under tmp and use the given client."""
+    from unittest import mock
+    import app
+    from answer_index import AnswerIndex
+    from job_queue import JobQueue, JobWorkerPool
+    from watchlist import Watchlist, WatchlistRefresher
+    store = SqliteResponseStore(os.path.join(tmp, 'responses.sqlite3'))
+    results_index = ResultsIndex(os.path.join(tmp, 'results_index.sqlite3'))
+    pool = JobWorkerPool(
+        JobQueue(os.path.join(tmp, 'jobs.sqlite3')), store, client_factory=lambda: client,
+        answer_index=AnswerIndex(os.path.join(tmp, 'answer_index.sqlite3')), results_index=results_index
+    )
+
+    def watchlist():
+        return Watchlist(os.path.join(tmp, 'watchlist.json'))
+
+    refresher = WatchlistRefresher(watchlist(), store, pool.jobs, client_factory=lambda: client)
+    patches = [
+        mock.patch.object(app, 'get_store', lambda: store),
+        mock.patch.object(app, 'get_results_index', lambda: results_index),
+        mock.patch.object(app, 'get_job_pool', lambda: pool),
+        mock.patch.object(app, 'get_refresher', lambda: refresher),
+        mock.patch.object(app, 'get_shared_client', lambda: client),
+        mock.patch.object(app, 'Watchlist', watchlist),
+    ]
+    return store, patches
+
+def bench_interaction(args):
+    """Compare an Edit/Cancel click rerunning the whole page against rerunning just its risk section's fragment.
+
+    Both run app.main as a browser session would, with every store under a
+    temporary directory and a fake CB-GPT client.
+    """
+    from unittest import mock
+    from streamlit.testing.v1 import AppTest
+    from cb_gpt_client import GenerationSettings
+    risks = load_risks()
+    chain, session_id = "Benchmark Chain", f"benchmark-{uuid.uuid4().hex}"
+    client = make_fake_client()
+    state = {
+        "session_id": session_id, "form_submitted": True, "blockchain_name": chain,
+        "blockchain_symbol": "BNCH", "blockchain_website": "", "blockchain_framework": "",
+    }
+    risk = risks[0]
+    print(f"Edit/Cancel clicks on one of {len(risks)} risk sections of {args.size} characters, {args.repeat} runs")
+    with tempfile.TemporaryDirectory() as tmp:
+        store, patches = isolated_app(tmp, client)
+        # Seed a finished assessment so the page renders every section without calling CB-GPT
+        for seeded in risks:
+            fingerprint = client.risk_fingerprint(seeded['prompt'], generation=GenerationSettings.for_risk(seeded))
+            store.upsert(chain, session_id, seeded['name'], sample_markdown(args.size), fingerprint)
+        fragments = FragmentReruns()
+        for patch in patches:
+            patch.start()
+        try:
+            for label, runner_class in (
+                ("full page rerun", None),
+                ("fragment rerun", fragments.runner_class()),
+            ):
+                app_test = AppTest.from_function(full_page_script, default_timeout=60)
+                for key, value in state.items():
+                    app_test.session_state[key] = value
+                runner = mock.patch('streamlit.testing.v1.app_test.LocalScriptRunner', runner_class) if runner_class else None
+                if runner:
+                    runner.start()
+                try:
+                    app_test.run()
+                    samples = []
+                    for index in range(args.repeat):
+                        button = f"edit_btn_{risk['name']}" if index % 2 == 0 else f"cancel_{risk['name']}"
+                        start = time.perf_counter()
+                        if runner:
+                            fragments.click(app_test, button)
+                        else:
+                            app_test.button(key=button).click().run()
+                        samples.append(time.perf_counter() - start)
+                        if app_test.exception:
+                            raise RuntimeError(app_test.exception[0].message)
+                    report(label, samples)
+                finally:
+                    if runner:
+                        runner.stop()
+        finally:
+            for patch in patches:
+                patch.stop()
+
+def bench_all(args):
+    """Run every benchmark in turn."""
+    for name, bench in BENCHMARKS.items():
+        if bench is not bench_all:
+            bench(args)
+            print()
+
+BENCHMARKS = {
+    "assessment": bench_assessment,
+    "reports": bench_reports,
+    "markdown": bench_markdown,
+    "persistence": bench_persistence,
+    "startup": bench_startup,
+    "consolidated": bench_consolidated,
+    "hedging": bench_hedging,
+    "interaction": bench_interaction,
+    "routing": bench_routing,
+    "singleflight": bench_singleflight,
+    "results": bench_results,
+    "all": bench_all,
+}
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the security analysis pipeline.")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS), help="Benchmark to run")
+    parser.add_argument("--size", type=int, default=3000, help="Characters per synthetic answer")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per measurement")
+    parser.add_argument("--latency", choices=sorted(LATENCY_DISTRIBUTIONS), default="lognormal", help="Fake service latency distribution")
+    parser.add_argument("--latency-mean", type=float, default=0.2, help="Mean fake service latency in seconds")
+    parser.add_argument("--latency-spread", type=float, default=0.5, help="Spread of the latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake calls failing with HTTP 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of fake calls failing with HTTP 429")
+    parser.add_argument("--chains", type=int, default=50, help="Chains in the consolidated report and results index benchmarks")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent sessions in the single-flight benchmark")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the fake service")
+    args = parser.parse_args(argv)
+    BENCHMARKS[args.benchmark](args)
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,241 @@
+import codecs
+import hashlib
 import json
 import os
 import logging
-from cb_ai_agentkit.cb_gpt_service.cb_gpt_service_api_client import CbGptServiceApiClient
-from cb_ai_agentkit.config import CbGptEnv
-import streamlit as st
-from requests.exceptions import RequestException
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from response_cache import ResponseCache, make_cache_key
+from rate_limit import AdaptiveConcurrencyLimiter, HedgeBudget, LatencyTracker, SingleFlight, TokenBucket, backoff_delay
+from telemetry import Telemetry
+from requests.exceptions import ConnectionError, RequestException, Timeout
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+RISKS_FILE = os.path.join(os.path.dirname(__file__), 'risks.json')
+
+def _risk_count(default=6):
+    """Number of risks in risks.json, or the default if it cannot be read."""
+    try:
+        with open(RISKS_FILE, 'r') as f:
+            return len(json.load(f)['risks'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return default
+
+# Upper bound on simultaneous CB-GPT calls issued by analyze_many, also the rate limiter's burst and the
+# starting concurrency limit. By default every risk in risks.json gets its own call at once, so a full
+# assessment takes about as long as its slowest call; a lower cap runs it in waves, each as slow as its slowest call
+MAX_CONCURRENT_REQUESTS = int(os.getenv("CB_GPT_MAX_CONCURRENCY", "0")) or max(6, _risk_count())
+
+MODEL_ID = "o4-mini"
+
+# Client-side rate control; the concurrency limit adapts (AIMD) between 1 and CB_GPT_MAX_IN_FLIGHT
+RATE_LIMIT_PER_SECOND = float(os.getenv("CB_GPT_RATE_PER_SECOND", "5"))
+MAX_IN_FLIGHT = int(os.getenv("CB_GPT_MAX_IN_FLIGHT", "16"))
+MAX_RETRIES = int(os.getenv("CB_GPT_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("CB_GPT_RETRY_BASE_DELAY_SECONDS", "1"))
+REQUEST_DEADLINE_SECONDS = float(os.getenv("CB_GPT_REQUEST_DEADLINE_SECONDS", "180"))
+
+# Hedging: a request still unanswered after the risk's usual latency percentile gets a duplicate;
+# hedges are budgeted to a fraction of requests so a slow service is not sent twice the load
+HEDGE_ENABLED = os.getenv("CB_GPT_HEDGE", "1") != "0"
+HEDGE_PERCENTILE = float(os.getenv("CB_GPT_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("CB_GPT_HEDGE_MIN_SAMPLES", "10"))
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("CB_GPT_HEDGE_DEFAULT_DELAY_SECONDS", "60"))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("CB_GPT_HEDGE_MIN_DELAY_SECONDS", "1"))
+HEDGE_BUDGET_RATIO = float(os.getenv("CB_GPT_HEDGE_BUDGET_RATIO", "0.1"))
+
+# Identical requests in flight at the same time, e.g. two sessions analyzing the same chain,
+# share one upstream call across every client in the process
+SINGLE_FLIGHT_ENABLED = os.getenv("CB_GPT_SINGLE_FLIGHT", "1") != "0"
+
+# Generation settings risks.json may set per risk: model, max_tokens, reasoning_effort and timeout (seconds)
+REASONING_EFFORTS = ('low', 'medium', 'high')
+
+# While the service is saturated, non-critical risks are downgraded to a cheaper, faster request;
+# CB_GPT_LOAD_POLICY "always" or "never" forces the downgrade on or off
+LOAD_POLICIES = ('auto', 'always', 'never')
+LOAD_POLICY = os.getenv("CB_GPT_LOAD_POLICY", "auto")
+DOWNGRADE_MODEL = os.getenv("CB_GPT_DOWNGRADE_MODEL") or None
+DOWNGRADE_MAX_TOKENS = int(os.getenv("CB_GPT_DOWNGRADE_MAX_TOKENS", "1000"))
+DOWNGRADE_REASONING_EFFORT = os.getenv("CB_GPT_DOWNGRADE_REASONING_EFFORT", "low")
+
+# HTTP statuses that signal throttling or an overloaded service
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+CREDENTIALS_FILE = 'cdp_api_key.json'
+
+# Set CB_GPT_CACHE_ENABLED=0 to always go to the service
+CACHE_ENABLED = os.getenv("CB_GPT_CACHE_ENABLED", "1") != "0"
+
+STANDARD_DISCLAIMER = (
+    "Respond only with factual, publicly available information. "
+    "Do not speculate, assume, hallucinate, or generate unverifiable content. "
+    "If a clear, direct answer is Not verifiable with public information, "
+    "state 'Not verifiable with public information' and explain why. "
+    "Link to sources where possible. "
+    "Keep responses brief, cohesive, and without excessive formatting or headings"
+)
+
+SECURITY_SYSTEM_PROMPT = """You are a blockchain security expert analyzing security risks.
+Follow these steps:
+1. Address the specific security risk asked
+2. Provide concrete examples and data where possible
+3. Cite all sources used
+4. Only use factual, publicly verifiable information"""
+
+# Asked of every risk answer, so results_index can read its verdict; not of fact sheets
+VERDICT_INSTRUCTION = (
+    'end with a line of its own reading exactly "Verdict: PASS", "Verdict: FAIL" or "Verdict: UNKNOWN" '
+    '(PASS if the risk is mitigated, UNKNOWN if it cannot be verified with public information)'
+)
+RISK_SYSTEM_PROMPT = f"{SECURITY_SYSTEM_PROMPT}\n5. Finally, {VERDICT_INSTRUCTION}"
+
+GROUP_RESPONSE_INSTRUCTIONS = (
+    "You will be asked about several security risks at once. "
+    "Respond with a single JSON object and nothing else. "
+    "Its keys must be exactly the risk names given, and each value must be "
+    "the answer to that risk as a markdown string. Each answer must "
+    f"{VERDICT_INSTRUCTION}."
+)
+
+# Marker emitted by the service at the end of a server-sent event stream
+STREAM_DONE_MARKER = "[DONE]"
+
+# Yielded by stream_many in place of a risk's end marker when its stream failed part-way;
+# the deltas already received for that risk do not make a complete answer
+STREAM_FAILED = object()
+
+class IncompleteStreamError(RequestException):
+    """A streamed answer ended before the service's terminal event or [DONE] marker."""
+
+class CbGptError(Exception):
+    """A CB-GPT request that could not be answered, after any retries.
+
+    status_code is the HTTP status the service last replied with, if any.
+    """
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class GenerationSettings(namedtuple('GenerationSettings', ['model', 'max_tokens', 'reasoning_effort', 'timeout', 'critical'])):
+    """Model, output budget, reasoning effort and hard deadline of one request."""
+
+    @classmethod
+    def for_risk(cls, risk=None):
+        """Settings declared by a risks.json entry; unset fields use MODEL_ID and the service defaults."""
+        risk = risk or {}
+        reasoning_effort = risk.get('reasoning_effort')
+        if reasoning_effort is not None and reasoning_effort not in REASONING_EFFORTS:
+            logger.warning(f"Ignoring unknown reasoning effort '{reasoning_effort}' for risk '{risk.get('name')}'")
+            reasoning_effort = None
+        return cls(
+            model=risk.get('model') or MODEL_ID,
+            max_tokens=risk.get('max_tokens'),
+            reasoning_effort=reasoning_effort,
+            timeout=risk.get('timeout'),
+            critical=risk.get('is_critical', True)
+        )
+
+    @classmethod
+    def for_group(cls, risks):
+        """Settings for several risks answered together: the most generous of each."""
+        settings = [cls.for_risk(risk) for risk in risks]
+        efforts = [s.reasoning_effort for s in settings]
+        return cls(
+            # A critical risk's model wins, so grouping never downgrades it
+            model=next((s.model for s in settings if s.critical), settings[0].model),
+            max_tokens=None if any(s.max_tokens is None for s in settings) else sum(s.max_tokens for s in settings),
+            reasoning_effort=max(efforts, key=lambda effort: REASONING_EFFORTS.index(effort or 'medium')),
+            timeout=max(s.timeout or REQUEST_DEADLINE_SECONDS for s in settings),
+            critical=any(s.critical for s in settings)
+        )
+
+    @property
+    def cache_tag(self):
+        """Identifies the settings that shape an answer; just the model name when no budgets are set."""
+        tag = self.model
+        if self.max_tokens:
+            tag += f"|max_tokens={self.max_tokens}"
+        if self.reasoning_effort:
+            tag += f"|reasoning_effort={self.reasoning_effort}"
+        return tag
+
+    def downgraded(self):
+        """Cheaper settings used for a non-critical risk while the service is under load."""
+        return self._replace(
+            model=DOWNGRADE_MODEL or self.model,
+            max_tokens=min(self.max_tokens or DOWNGRADE_MAX_TOKENS, DOWNGRADE_MAX_TOKENS),
+            reasoning_effort=DOWNGRADE_REASONING_EFFORT
+        )
+
 class CbGptClient:
-    def __init__(self):
-        """Initialize the CB-GPT client with credentials."""
-        try:
-            credentials = self._load_credentials()
-            self.client = self._initialize_client(credentials)
-            logger.info("CB-GPT client initialized successfully")
-        except Exception as e:
-            error_msg = f"Error initializing CB-GPT client: {str(e)}"
-            logger.error(error_msg)
-            st.error(error_msg)
-            raise
+    def __init__(self, service_client=None, cache=None, telemetry=None, single_flight=None, hedging=None):
+        """Initialize the CB-GPT client with credentials, or with an already constructed service client.
+
+        The credentialed service client is only built on the first request,
+        so creating a CbGptClient does not import or authenticate agentkit.
+        Unset, cache and single_flight use the process-wide defaults and
+        hedging follows CB_GPT_HEDGE; False turns each of them off, and a
+        ResponseCache or SingleFlight is used as given.
+        """
+        if cache is None and CACHE_ENABLED:
+            cache = ResponseCache()
+        self.cache = cache if cache is not False else None
+        self.telemetry = telemetry or Telemetry()
+        # Per-thread telemetry record of the call in progress
+        self._local = threading.local()
+        self.rate_limiter = TokenBucket(RATE_LIMIT_PER_SECOND, capacity=MAX_CONCURRENT_REQUESTS)
+        self.concurrency_limiter = AdaptiveConcurrencyLimiter(
+            initial=MAX_CONCURRENT_REQUESTS,
+            maximum=max(MAX_IN_FLIGHT, MAX_CONCURRENT_REQUESTS)
+        )
+        if LOAD_POLICY not in LOAD_POLICIES:
+            raise ValueError(f"Unknown CB_GPT_LOAD_POLICY: {LOAD_POLICY}")
+        self.load_policy = LOAD_POLICY
+        if single_flight is None:
+            single_flight = _single_flight if SINGLE_FLIGHT_ENABLED else None
+        self.single_flight = single_flight if single_flight is not False else None
+        self.hedging = HEDGE_ENABLED if hedging is None else hedging
+        self.hedge_min_delay = HEDGE_MIN_DELAY_SECONDS
+        self.hedge_budget = HedgeBudget(HEDGE_BUDGET_RATIO)
+        self.latency_tracker = LatencyTracker()
+        # Runs the competing attempts of hedged requests; idle threads are only created on demand
+        self._attempt_executor = ThreadPoolExecutor(
+            max_workers=4 * max(MAX_IN_FLIGHT, MAX_CONCURRENT_REQUESTS),
+            thread_name_prefix="cb-gpt-attempt"
+        )
+        self._request_stats = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0, "deadline_exceeded": 0, "hedge_wins": 0, "downgraded": 0}
+        self._stats_lock = threading.Lock()
+        self._client = service_client
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The CB-GPT service client, built from the credentials on first use."""
+        if self._client is not None:
+            return self._client
+        with self._client_lock:
+            if self._client is None:
+                try:
+                    credentials = self._load_credentials()
+                    self._client = self._initialize_client(credentials)
+                    logger.info("CB-GPT client initialized successfully")
+                except Exception as e:
+                    logger.error(f"Error initializing CB-GPT client: {str(e)}")
+                    raise
+        return self._client
 
     def _load_credentials(self):
         """Load API credentials from file."""
         try:
-            with open('cdp_api_key.json', 'r') as f:
+            with open(CREDENTIALS_FILE, 'r') as f:
                 return json.load(f)
         except FileNotFoundError:
             raise FileNotFoundError("Credentials file (cdp_api_key.json) not found")
@@ -35,6 +244,10 @@ class CbGptClient:
 
     def _initialize_client(self, credentials):
         """Initialize the CB-GPT service client."""
+        # agentkit is slow to import, so it is only loaded once a request needs it
+        from cb_ai_agentkit.cb_gpt_service.cb_gpt_service_api_client import CbGptServiceApiClient
+        from cb_ai_agentkit.config import CbGptEnv
+        
         api_key = os.getenv("CB_AI_AGENTKIT_API_KEY", credentials['name'])
         api_secret = os.getenv("CB_AI_AGENTKIT_API_SECRET", credentials['privateKey'])
         
@@ -44,68 +257,372 @@ class CbGptClient:
             cb_gpt_env=CbGptEnv.PROD
         )
 
-    def _make_request(self, system_prompt, user_prompt):
-        """Make a request to CB-GPT with specific prompts."""
+    def _cache_key(self, system_prompt, user_prompt, block_explorer_url=None, generation=None):
+        """Build the response cache key for a pair of prompts."""
+        model = (generation or GenerationSettings.for_risk()).cache_tag
+        return make_cache_key(model, self._build_full_system_prompt(system_prompt), user_prompt, block_explorer_url)
+
+    def risk_fingerprint(self, risk_prompt, block_explorer_url=None, generation=None):
+        """Hash of everything that shapes a risk's answer, stored alongside it to detect stale answers.
+
+        Covers the risk prompt, the system prompt, the model and the risk's
+        generation budgets, so editing a risk in risks.json or switching
+        models invalidates only the answers that depend on it.
+        """
+        model = (generation or GenerationSettings.for_risk()).cache_tag
+        return make_cache_key(model, self._build_full_system_prompt(RISK_SYSTEM_PROMPT), risk_prompt, block_explorer_url)[:16]
+
+    def downgraded_fingerprint(self, risk_prompt, block_explorer_url=None, generation=None):
+        """Fingerprint to store an answer under when its call was downgraded, so it reads as outdated and is re-asked."""
+        return self.risk_fingerprint(risk_prompt, block_explorer_url, (generation or GenerationSettings.for_risk()).downgraded())
+
+    def full_budget_available(self):
+        """Whether a non-critical request sent now would keep its full budget under the load policy."""
+        if self.load_policy == "always":
+            return False
+        return self.load_policy == "never" or not self.concurrency_limiter.saturated()
+
+    def _apply_load_policy(self, generation):
+        """Downgrade a non-critical request per the load policy, leaving critical ones untouched."""
+        if generation.critical or self.full_budget_available():
+            return generation
+        self._count("downgraded")
+        return generation.downgraded()
+
+    def _begin_call(self, risk_name, bypass_cache, cache_key, generation=None, chain=None, downgraded=False):
+        """Start the telemetry record for a call on this thread."""
+        record = self.telemetry.begin(risk_name, getattr(self._local, 'queued_at', None))
+        record["chain"] = chain
+        record["downgraded"] = downgraded
+        self._local.queued_at = None
+        if generation is not None:
+            record["model"] = generation.model
+            record["reasoning_effort"] = generation.reasoning_effort
+        if cache_key:
+            record["cache"] = "bypass" if bypass_cache else "miss"
+        self._local.record = record
+        return record
+
+    def _end_call(self, record):
+        """Finish the telemetry record for a call on this thread."""
+        self._local.record = None
+        self._local.last_record = record
+        self.telemetry.finish(record)
+
+    def _current_record(self):
+        """Telemetry record of the call in progress on this thread, if any."""
+        return getattr(self._local, 'record', None)
+
+    def last_call_record(self):
+        """Telemetry record of the most recent call finished on this thread."""
+        return getattr(self._local, 'last_record', None)
+
+    def _run_queued(self, queued_at, func, *args, **kwargs):
+        """Run func on a worker thread, attributing the time since queued_at to queue wait."""
+        self._local.queued_at = queued_at
+        return func(*args, **kwargs)
+
+    def _make_request(self, system_prompt, user_prompt, block_explorer_url=None, bypass_cache=False, risk_name=None, generation=None,
+                      chain=None):
+        """Make a request to CB-GPT with specific prompts, serving repeats from the response cache."""
+        # A call failing before its record starts must not leave the previous call's record as the last one
+        self._local.last_record = None
+        record = None
         try:
-            request_body = self._prepare_request(system_prompt, user_prompt)
-            return self._execute_request(request_body)
+            requested = generation or GenerationSettings.for_risk()
+            generation = self._apply_load_policy(requested)
+            cache_key = self._cache_key(system_prompt, user_prompt, block_explorer_url, generation) if self.cache else None
+            record = self._begin_call(risk_name, bypass_cache, cache_key, generation, chain, generation != requested)
+            if cache_key and not bypass_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info("Serving CB-GPT response from cache")
+                    record.update(cache="hit", ok=True, response_bytes=len(cached.encode('utf-8')))
+                    return cached
+            request_body = self._prepare_request(system_prompt, user_prompt, generation=generation)
+            response = self._execute_request(request_body, generation)
+            if not response:
+                raise CbGptError("CB-GPT returned no usable answer")
+            if cache_key:
+                self.cache.set(cache_key, response)
+            record["ok"] = True
+            return response
         except Exception as e:
-            error_msg = f"Error querying CB-GPT: {str(e)}"
-            logger.error(error_msg)
-            st.error(error_msg)
-            return None
+            logger.error(f"Error querying CB-GPT: {str(e)}")
+            if record is not None:
+                record["error"] = str(e)
+            if isinstance(e, CbGptError):
+                raise
+            raise CbGptError(str(e), getattr(getattr(e, 'response', None), 'status_code', None)) from e
+        finally:
+            if record is not None:
+                self._end_call(record)
 
-    def _prepare_request(self, system_prompt, user_prompt):
-        """Prepare the request body with prompts."""
-        standard_disclaimer = (
-            "Respond only with factual, publicly available information. "
-            "Do not speculate, assume, hallucinate, or generate unverifiable content. "
-            "If a clear, direct answer is Not verifiable with public information, "
-            "state 'Not verifiable with public information' and explain why. "
-            "Link to sources where possible. "
-            "Keep responses brief, cohesive, and without excessive formatting or headings"
-        )
-        
-        full_system_prompt = f"{standard_disclaimer}\n\n{system_prompt}" if system_prompt else standard_disclaimer
-        
-        return json.dumps({
+    def _make_stream_request(self, system_prompt, user_prompt, block_explorer_url=None, bypass_cache=False, risk_name=None, generation=None,
+                             chain=None):
+        """Make a streaming request to CB-GPT, yielding content deltas as they arrive.
+
+        A stream that fails part-way re-raises after its deltas, so callers can
+        discard them; only complete answers are cached or counted as ok.
+        """
+        self._local.last_record = None
+        record = None
+        try:
+            requested = generation or GenerationSettings.for_risk()
+            generation = self._apply_load_policy(requested)
+            cache_key = self._cache_key(system_prompt, user_prompt, block_explorer_url, generation) if self.cache else None
+            record = self._begin_call(risk_name, bypass_cache, cache_key, generation, chain, generation != requested)
+            if cache_key and not bypass_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info("Serving CB-GPT response from cache")
+                    record.update(cache="hit", ok=True, response_bytes=len(cached.encode('utf-8')))
+                    yield cached
+                    return
+            request_body = self._prepare_request(system_prompt, user_prompt, stream=True, generation=generation)
+            deltas = []
+            for delta in self._execute_stream(request_body, generation):
+                deltas.append(delta)
+                record["response_bytes"] += len(delta.encode('utf-8'))
+                yield delta
+            if cache_key and deltas:
+                self.cache.set(cache_key, "".join(deltas))
+            record["ok"] = bool(deltas)
+        except Exception as e:
+            logger.error(f"Error streaming from CB-GPT: {str(e)}")
+            if record is not None:
+                record["error"] = str(e)
+            raise
+        finally:
+            if record is not None:
+                self._end_call(record)
+
+    def _build_full_system_prompt(self, system_prompt):
+        """Prefix the system prompt with the standard disclaimer."""
+        return f"{STANDARD_DISCLAIMER}\n\n{system_prompt}" if system_prompt else STANDARD_DISCLAIMER
+
+    def _prepare_request(self, system_prompt, user_prompt, stream=False, generation=None):
+        """Prepare the request body with prompts and any generation budgets."""
+        body = {
             "messages": [
-                {"role": "system", "content": full_system_prompt},
+                {"role": "system", "content": self._build_full_system_prompt(system_prompt)},
                 {"role": "user", "content": user_prompt}
             ],
-            "stream": False
-        })
+            "stream": stream
+        }
+        if generation is not None and generation.max_tokens:
+            body["max_completion_tokens"] = generation.max_tokens
+        if generation is not None and generation.reasoning_effort:
+            body["reasoning_effort"] = generation.reasoning_effort
+        return json.dumps(body)
 
-    def _execute_request(self, request_body):
-        """Execute the request and process the response."""
-        try:
-            logger.info("Making request to CB-GPT service...")
-            response = self.client.generate_content(
-                model_id="o4-mini",
-                request_body=request_body,
-                redaction_required=False,
-                uses_multimodal=False,
-                incognito=False,
-                or_component_id="blockchain_security_analysis"
-            )
-            logger.info("Received response from CB-GPT service")
-            
-            return self._process_response(response)
-        except RequestException as e:
-            error_msg = f"Network error while calling CB-GPT service: {str(e)}"
-            logger.error(error_msg)
-            st.error(error_msg)
-            return None
+    def _generate(self, request_body, model=MODEL_ID):
+        """Send a prepared request body to the CB-GPT service."""
+        return self.client.generate_content(
+            model_id=model,
+            request_body=request_body,
+            redaction_required=False,
+            uses_multimodal=False,
+            incognito=False,
+            or_component_id="blockchain_security_analysis"
+        )
+
+    def _count(self, stat):
+        """Increment one of the request counters."""
+        with self._stats_lock:
+            self._request_stats[stat] += 1
+
+    def _is_retryable(self, error):
+        """Whether a request error signals throttling, overload or a transient network fault."""
+        if isinstance(error, (Timeout, ConnectionError)):
+            return True
+        status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+        return status_code in RETRYABLE_STATUS_CODES
+
+    def _generate_with_retries(self, request_body, record=None, deadline=None, cancelled=None, model=MODEL_ID):
+        """Send a request under the rate and concurrency limits, retrying transient failures.
+
+        Retries use full-jitter exponential backoff and stop once the
+        deadline would be exceeded; the last error is re-raised. Setting
+        `cancelled` stops a hedged attempt before its next send.
+        """
+        deadline = deadline or time.monotonic() + REQUEST_DEADLINE_SECONDS
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            if not self.rate_limiter.acquire(timeout=remaining):
+                self._count("deadline_exceeded")
+                raise Timeout("Deadline exceeded while waiting for the CB-GPT rate limiter")
+            if not self.concurrency_limiter.acquire(timeout=deadline - time.monotonic()):
+                self._count("deadline_exceeded")
+                raise Timeout("Deadline exceeded while waiting for a CB-GPT concurrency slot")
+            if cancelled is not None and cancelled.is_set():
+                self.concurrency_limiter.release()
+                raise Timeout("Superseded by a faster hedged attempt")
+            self._count("requests")
+            if record is not None and attempt == 1:
+                record["queue_wait"] = time.time() - record["queued_at"]
+            overloaded = False
+            started_at = time.monotonic()
+            try:
+                response = self._generate(request_body, model)
+                if record is not None:
+                    record["service_latency"] = time.monotonic() - started_at
+                return response
+            except RequestException as e:
+                overloaded = self._is_retryable(e)
+                if not overloaded:
+                    self._count("failures")
+                    raise
+                self._count("throttled")
+                delay = backoff_delay(attempt, RETRY_BASE_DELAY_SECONDS)
+                if attempt > MAX_RETRIES or time.monotonic() + delay >= deadline:
+                    self._count("failures")
+                    raise
+                logger.warning(f"CB-GPT request failed ({str(e)}); retry {attempt} of {MAX_RETRIES} in {delay:.1f}s")
+                self._count("retries")
+                if record is not None:
+                    record["retries"] += 1
+            finally:
+                self.concurrency_limiter.release(overloaded=overloaded)
+            time.sleep(delay)
+
+    def _hedge_delay(self, risk_name, stream):
+        """Soft deadline after which a request is hedged: the risk's usual latency percentile.
+
+        Falls back to the percentile across all risks, then to
+        HEDGE_DEFAULT_DELAY_SECONDS, until enough samples have been seen.
+        """
+        for key in ((risk_name, stream), (None, stream)):
+            delay = self.latency_tracker.percentile(key, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES)
+            if delay is not None:
+                return max(self.hedge_min_delay, delay)
+        return max(self.hedge_min_delay, HEDGE_DEFAULT_DELAY_SECONDS)
+
+    def _generate_hedged(self, request_body, stream=False, generation=None):
+        """Send a request, racing a duplicate against it once it runs past its soft deadline.
+
+        The first attempt to succeed wins; the loser is cancelled, or, if it is
+        already waiting on the service, abandoned and its answer discarded.
+        Only one hedge is sent per request, and only while the hedge budget
+        allows. Past the hard deadline (the risk's timeout, or
+        REQUEST_DEADLINE_SECONDS) the request fails with Timeout whatever is
+        still in flight.
+        """
+        generation = generation or GenerationSettings.for_risk()
+        timeout = generation.timeout or REQUEST_DEADLINE_SECONDS
+        record = self._current_record()
+        started_at = time.monotonic()
+        deadline = started_at + timeout
+        if not self.hedging:
+            return self._generate_with_retries(request_body, record, deadline, model=generation.model)
+
+        risk_name = record["risk"] if record is not None else None
+        hedge_at = started_at + self._hedge_delay(risk_name, stream)
+        self.hedge_budget.record_request()
+        cancelled = threading.Event()
+        # Each attempt fills its own stats, copied to the call's record only if it wins
+        primary_stats = {"queued_at": record["queued_at"] if record is not None else time.time(), "retries": 0}
+        attempts = {
+            self._attempt_executor.submit(self._generate_with_retries, request_body, primary_stats, deadline, cancelled, generation.model): primary_stats
+        }
+        error = None
+        while attempts:
+            wake_at = min(hedge_at, deadline) if hedge_at else deadline
+            done, _ = wait(attempts, timeout=max(0.0, wake_at - time.monotonic()), return_when=FIRST_COMPLETED)
+            for future in done:
+                stats = attempts.pop(future)
+                try:
+                    response = future.result()
+                except RequestException as e:
+                    error = e
+                    continue
+                cancelled.set()
+                for loser in attempts:
+                    loser.cancel()
+                for key in ((risk_name, stream), (None, stream)):
+                    self.latency_tracker.observe(key, time.monotonic() - started_at)
+                if record is not None:
+                    record["queue_wait"] = primary_stats.get("queue_wait", 0.0)
+                    record["service_latency"] = stats.get("service_latency", 0.0)
+                    record["retries"] += primary_stats["retries"] + (stats["retries"] if stats is not primary_stats else 0)
+                if stats is not primary_stats:
+                    self._count("hedge_wins")
+                    if record is not None:
+                        record["hedge"] = "won"
+                return response
+
+            now = time.monotonic()
+            if now >= deadline and attempts:
+                cancelled.set()
+                for loser in attempts:
+                    loser.cancel()
+                self._count("deadline_exceeded")
+                raise Timeout(f"No CB-GPT answer within the {timeout:.0f}s deadline")
+            if hedge_at and now >= hedge_at and attempts:
+                hedge_at = None
+                if self.hedge_budget.try_spend():
+                    logger.info(f"CB-GPT request for {risk_name or 'unknown risk'} is slow; sending a hedge")
+                    if record is not None:
+                        record["hedge"] = "sent"
+                    hedge_stats = {"queued_at": time.time(), "retries": 0}
+                    attempts[self._attempt_executor.submit(
+                        self._generate_with_retries, request_body, hedge_stats, deadline, cancelled, generation.model
+                    )] = hedge_stats
+        raise error
+
+    def rate_metrics(self):
+        """Live request counters and adaptive concurrency state."""
+        with self._stats_lock:
+            metrics = dict(self._request_stats)
+        metrics.update(self.concurrency_limiter.metrics())
+        metrics.update(self.hedge_budget.metrics())
+        if self.single_flight is not None:
+            metrics.update(self.single_flight.metrics())
+        return metrics
+
+    def _flight_key(self, request_body, generation=None):
+        """Single-flight key: the prepared request body and the model it is sent to."""
+        model = (generation or GenerationSettings.for_risk()).model
+        return hashlib.sha256(f"{model}\0{request_body}".encode('utf-8')).hexdigest()
+
+    def _generate_coalesced(self, request_body, generation=None):
+        """Send a request, or wait for an identical one already in flight and share its response."""
+        if self.single_flight is None:
+            return self._generate_hedged(request_body, generation=generation)
+        led = []
+
+        def lead():
+            led.append(True)
+            return self._generate_hedged(request_body, generation=generation)
+
+        response = self.single_flight.do(self._flight_key(request_body, generation), lead)
+        record = self._current_record()
+        if record is not None and not led:
+            record["coalesced"] = True
+        return response
+
+    def _execute_request(self, request_body, generation=None):
+        """Execute the request and process the response; network and HTTP errors propagate."""
+        logger.info("Making request to CB-GPT service...")
+        response = self._generate_coalesced(request_body, generation)
+        logger.info("Received response from CB-GPT service")
+        record = self._current_record()
+        if record is not None and isinstance(response, dict) and isinstance(response.get('response'), str):
+            record["response_bytes"] = len(response['response'].encode('utf-8'))
+
+        return self._process_response(response)
 
     def _process_response(self, response):
         """Process and validate the response from CB-GPT."""
         if not isinstance(response, dict) or 'response' not in response:
             logger.error(f"Unexpected response format: {response}")
-            st.error("Received invalid response from CB-GPT service")
             return None
 
         try:
             inner_response = json.loads(response['response'])
+            self._record_usage(inner_response)
             if isinstance(inner_response, dict) and 'choices' in inner_response:
                 choices = inner_response['choices']
                 if choices and len(choices) > 0:
@@ -114,28 +631,434 @@ class CbGptClient:
                         return message['content']
             
             logger.error(f"Unexpected response format: {response}")
-            st.error("Received unexpected response format from CB-GPT service")
             return None
         except json.JSONDecodeError as e:
-            error_msg = f"Failed to parse response JSON: {str(e)}"
-            logger.error(error_msg)
-            st.error(error_msg)
+            logger.error(f"Failed to parse response JSON: {str(e)}")
             return None
 
-    def analyze_blockchain_security(self, blockchain_name, risk_prompt, block_explorer_url=None):
-        """Analyze blockchain security based on provided risk prompt."""
-        system_prompt = """You are a blockchain security expert analyzing security risks.
-Follow these steps:
-1. Address the specific security risk asked
-2. Provide concrete examples and data where possible
-3. Cite all sources used
-4. Only use factual, publicly verifiable information"""
+    def _record_usage(self, inner_response):
+        """Copy token counts from the inner payload into the current telemetry record."""
+        record = self._current_record()
+        usage = inner_response.get('usage') if isinstance(inner_response, dict) else None
+        if record is None or not isinstance(usage, dict):
+            return
+        record["prompt_tokens"] = usage.get('prompt_tokens')
+        record["completion_tokens"] = usage.get('completion_tokens')
+
+    def _stream_deltas(self, request_body, generation=None):
+        """Send a streaming request and yield its content deltas."""
+        response = self._generate_hedged(request_body, stream=True, generation=generation)
+        yield from self._iter_stream_deltas(response)
+
+    def _execute_stream(self, request_body, generation=None):
+        """Execute a streaming request, yielding content deltas.
+
+        An identical stream already in flight is joined instead: its deltas
+        so far are replayed, then the rest as they arrive. A dropped
+        connection, or a leader that abandons the shared stream, raises
+        RequestException after the deltas received so far.
+        """
+        logger.info("Making streaming request to CB-GPT service...")
+        if self.single_flight is None:
+            yield from self._stream_deltas(request_body, generation)
+        else:
+            led = []
+
+            def lead():
+                led.append(True)
+                return self._stream_deltas(request_body, generation)
+
+            flight_key = self._flight_key(request_body, generation)
+            yield from self.single_flight.stream(flight_key, lead, abandoned_error=IncompleteStreamError)
+            record = self._current_record()
+            if record is not None and not led:
+                record["coalesced"] = True
+        logger.info("Finished streaming response from CB-GPT service")
+
+    def _iter_stream_deltas(self, response):
+        """Parse a streamed CB-GPT response into content deltas.
+
+        Accepts either an iterable of server-sent event chunks (str, bytes or
+        already decoded dicts) or a complete response dict, in which case the
+        whole message content is yielded at once as the non-streaming fallback.
+        Raises IncompleteStreamError if the chunks run out before the [DONE]
+        marker or an event carrying a finish_reason.
+        """
+        if isinstance(response, dict):
+            chunks = [response['response']] if 'response' in response else [response]
+        elif isinstance(response, (str, bytes)):
+            chunks = [response]
+        else:
+            chunks = response
+
+        buffer = ""
+        finished = False
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in chunks:
+            if isinstance(chunk, dict):
+                payloads = [chunk]
+            else:
+                if isinstance(chunk, bytes):
+                    chunk = decoder.decode(chunk)
+                buffer += chunk
+                # Events may be split across chunks, so only consume complete lines
+                *lines, buffer = buffer.split('\n')
+                payloads = [self._parse_stream_line(line) for line in lines]
+            for payload in payloads:
+                if payload is STREAM_DONE_MARKER:
+                    return
+                delta = self._extract_delta(payload)
+                if delta:
+                    yield delta
+                finished = finished or self._is_final_event(payload)
+        if buffer.strip():
+            payload = self._parse_stream_line(buffer)
+            if payload is STREAM_DONE_MARKER:
+                return
+            delta = self._extract_delta(payload)
+            if delta:
+                yield delta
+            finished = finished or self._is_final_event(payload)
+        if not finished:
+            raise IncompleteStreamError("CB-GPT stream ended before its final event")
+
+    def _parse_stream_line(self, line):
+        """Parse one server-sent event line into its decoded payload, the [DONE] marker, or None."""
+        line = line.strip()
+        if not line or line.startswith(':'):
+            return None
+        if line.startswith('data:'):
+            line = line[len('data:'):].strip()
+        if line == STREAM_DONE_MARKER:
+            return STREAM_DONE_MARKER
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping unparseable stream line: {line[:200]}")
+            return None
+
+    def _first_choice(self, payload):
+        """The first choice of a decoded stream event or full completion payload, or None."""
+        if isinstance(payload, dict) and isinstance(payload.get('response'), str):
+            try:
+                payload = json.loads(payload['response'])
+            except json.JSONDecodeError:
+                return None
+        if not isinstance(payload, dict) or not payload.get('choices'):
+            return None
+        return payload['choices'][0]
+
+    def _extract_delta(self, payload):
+        """Extract the content delta from a decoded stream event or full completion payload."""
+        choice = self._first_choice(payload)
+        if choice is None:
+            return None
+        delta = choice.get('delta') or choice.get('message') or {}
+        return delta.get('content')
+
+    def _is_final_event(self, payload):
+        """Whether a payload ends the answer: an event with a finish_reason, or a whole completion message."""
+        choice = self._first_choice(payload)
+        return choice is not None and (bool(choice.get('finish_reason')) or 'message' in choice)
+
+    def _fact_sheet_section(self, blockchain_name, fact_sheet):
+        """Prompt section sharing the pre-fetched chain fact sheet, if there is one."""
+        if not fact_sheet:
+            return ""
+        return (
+            f"Known facts about {blockchain_name}, gathered earlier from public sources. "
+            "Rely on them instead of re-researching and only add what this question needs:\n"
+            f"{fact_sheet}\n\n"
+        )
+
+    def _build_security_prompts(self, blockchain_name, risk_prompt, block_explorer_url=None, fact_sheet=None, verdict=True):
+        """Build the system and user prompts for a risk analysis, asking for a verdict line unless verdict is False."""
+        system_prompt = RISK_SYSTEM_PROMPT if verdict else SECURITY_SYSTEM_PROMPT
+
+        user_prompt = f"""Analyze the security of {blockchain_name} blockchain.
+{f'Use block explorer at {block_explorer_url} for data.' if block_explorer_url else ''}
+{self._fact_sheet_section(blockchain_name, fact_sheet)}{risk_prompt}"""
 
+        return system_prompt, user_prompt
+
+    def analyze_blockchain_security(self, blockchain_name, risk_prompt, block_explorer_url=None, bypass_cache=False, risk_name=None, fact_sheet=None,
+                                    generation=None, verdict=True):
+        """Analyze blockchain security based on provided risk prompt; verdict=False leaves out the verdict line.
+
+        Raises CbGptError if the request fails.
+        """
+        system_prompt, user_prompt = self._build_security_prompts(blockchain_name, risk_prompt, block_explorer_url, fact_sheet, verdict)
+        return self._make_request(system_prompt, user_prompt, block_explorer_url, bypass_cache=bypass_cache, risk_name=risk_name,
+                                  generation=generation, chain=blockchain_name)
+
+    def analyze_blockchain_security_stream(self, blockchain_name, risk_prompt, block_explorer_url=None, bypass_cache=False, risk_name=None, fact_sheet=None,
+                                           generation=None, verdict=True):
+        """Analyze blockchain security, yielding the answer incrementally as content deltas."""
+        system_prompt, user_prompt = self._build_security_prompts(blockchain_name, risk_prompt, block_explorer_url, fact_sheet, verdict)
+        return self._make_stream_request(system_prompt, user_prompt, block_explorer_url, bypass_cache=bypass_cache, risk_name=risk_name,
+                                         generation=generation, chain=blockchain_name)
+
+    def _build_group_prompts(self, blockchain_name, risks, block_explorer_url=None, fact_sheet=None):
+        """Build one pair of prompts asking for several risks as a JSON object keyed by risk name."""
+        system_prompt = f"{SECURITY_SYSTEM_PROMPT}\n\n{GROUP_RESPONSE_INSTRUCTIONS}"
+        risk_sections = "\n\n".join(f"### {risk['name']}\n{risk['prompt']}" for risk in risks)
         user_prompt = f"""Analyze the security of {blockchain_name} blockchain.
 {f'Use block explorer at {block_explorer_url} for data.' if block_explorer_url else ''}
-{risk_prompt}"""
+{self._fact_sheet_section(blockchain_name, fact_sheet)}Answer each of the following risks, keyed by the risk name in the heading:
+
+{risk_sections}"""
+
+        return system_prompt, user_prompt
+
+    def _split_group_answer(self, raw_answer, risk_names):
+        """Validate a grouped JSON answer and split it into per-risk answers.
+
+        Risks that are missing or not answered with a non-empty string are
+        left out, so callers can fall back to individual requests for them.
+        """
+        if not raw_answer:
+            return {}
+        text = raw_answer.strip()
+        start, end = text.find('{'), text.rfind('}')
+        if start == -1 or end <= start:
+            logger.error("Grouped CB-GPT answer did not contain a JSON object")
+            return {}
+        try:
+            parsed = json.loads(text[start:end + 1])
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse grouped CB-GPT answer: {str(e)}")
+            return {}
+        if not isinstance(parsed, dict):
+            return {}
+        return {
+            name: parsed[name].strip()
+            for name in risk_names
+            if isinstance(parsed.get(name), str) and parsed[name].strip()
+        }
+
+    def analyze_group(self, blockchain_name, risks, block_explorer_url=None, bypass_cache=False, group_name=None, fact_sheet=None,
+                      records=None):
+        """Answer several related risks with a single request, returning answers keyed by risk name.
+
+        Any risk the grouped answer does not cover is re-asked individually.
+        If given, `records` is filled with the telemetry record of the call
+        that answered each risk.
+        """
+        system_prompt, user_prompt = self._build_group_prompts(blockchain_name, risks, block_explorer_url, fact_sheet)
+        try:
+            raw_answer = self._make_request(
+                system_prompt,
+                user_prompt,
+                block_explorer_url,
+                bypass_cache=bypass_cache,
+                risk_name=f"group:{group_name or '+'.join(risk['name'] for risk in risks)}",
+                generation=GenerationSettings.for_group(risks),
+                chain=blockchain_name
+            )
+        except CbGptError:
+            raw_answer = None
+        answers = self._split_group_answer(raw_answer, [risk['name'] for risk in risks])
+        if records is not None:
+            records.update((name, self.last_call_record()) for name in answers)
+        for risk in risks:
+            if risk['name'] not in answers:
+                logger.info(f"Grouped answer missing '{risk['name']}', falling back to an individual request")
+                answers[risk['name']] = self._analyze_risk(blockchain_name, risk, block_explorer_url, bypass_cache, fact_sheet, records)
+        return answers
+
+    def _analyze_risk(self, blockchain_name, risk, block_explorer_url=None, bypass_cache=False, fact_sheet=None, records=None):
+        """Answer one risk on its own, returning None if the request failed; the call record says why."""
+        try:
+            return self.analyze_blockchain_security(
+                blockchain_name,
+                risk['prompt'],
+                block_explorer_url,
+                bypass_cache=bypass_cache,
+                risk_name=risk['name'],
+                fact_sheet=fact_sheet,
+                generation=GenerationSettings.for_risk(risk)
+            )
+        except CbGptError:
+            return None
+        finally:
+            if records is not None:
+                records[risk['name']] = self.last_call_record()
+
+    def plan_batches(self, risks, group_related=False):
+        """Split risks into request batches: one per risk, or one per risks.json group when grouping."""
+        if not group_related:
+            return [[risk] for risk in risks]
+        batches = []
+        groups = {}
+        for risk in risks:
+            group = risk.get('group')
+            if not group:
+                batches.append([risk])
+            elif group in groups:
+                groups[group].append(risk)
+            else:
+                groups[group] = [risk]
+                batches.append(groups[group])
+        return batches
+
+    def analyze_batch(self, blockchain_name, batch, block_explorer_url=None, bypass_cache=False, fact_sheet=None, records=None):
+        """Answer one batch from plan_batches, returning answers keyed by risk name.
+
+        If given, `records` is filled with the telemetry record of the call
+        that answered each risk. A failed risk is answered with None, and
+        its record's "error" says why.
+        """
+        if len(batch) == 1:
+            risk = batch[0]
+            return {risk['name']: self._analyze_risk(blockchain_name, risk, block_explorer_url, bypass_cache, fact_sheet, records)}
+        return self.analyze_group(
+            blockchain_name,
+            batch,
+            block_explorer_url,
+            bypass_cache=bypass_cache,
+            group_name=batch[0].get('group'),
+            fact_sheet=fact_sheet,
+            records=records
+        )
+
+    def iter_analyze_many(self, blockchain_name, risks, block_explorer_url=None, max_workers=None, group_related=False,
+                          fact_sheet=None, bypass_cache=False, records=None):
+        """Analyze several risks concurrently, yielding (risk name, response) as each call completes.
+
+        With group_related, risks sharing a risks.json "group" are answered
+        together in one request. If given, `records` holds the telemetry
+        record of each risk's call by the time the risk is yielded. Closing
+        the generator early drops the batches that have not started yet.
+        """
+        if not risks:
+            return
+        batches = self.plan_batches(risks, group_related)
+        max_workers = min(max_workers or MAX_CONCURRENT_REQUESTS, len(batches))
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cb-gpt")
+        try:
+            futures = {
+                executor.submit(
+                    self._run_queued,
+                    time.time(),
+                    self.analyze_batch,
+                    blockchain_name,
+                    batch,
+                    block_explorer_url,
+                    bypass_cache=bypass_cache,
+                    fact_sheet=fact_sheet,
+                    # Each batch records only its own risks, before its future completes
+                    records=records
+                ): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    answers = future.result()
+                except Exception as e:
+                    logger.error(f"Error analyzing risks {[risk['name'] for risk in batch]}: {str(e)}")
+                    answers = {}
+                for risk in batch:
+                    yield risk['name'], answers.get(risk['name'])
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def analyze_many(self, blockchain_name, risks, block_explorer_url=None, max_workers=None, group_related=False, fact_sheet=None):
+        """Analyze several risks concurrently and return the responses keyed by risk name."""
+        return dict(self.iter_analyze_many(blockchain_name, risks, block_explorer_url, max_workers, group_related, fact_sheet))
+
+    def stream_many(self, blockchain_name, risks, block_explorer_url=None, max_workers=None, fact_sheet=None, bypass_cache=False,
+                    records=None):
+        """Stream several risk analyses concurrently.
+
+        Yields (risk name, delta) tuples interleaved across risks as content
+        arrives; a delta of None marks the end of that risk's answer, and
+        STREAM_FAILED marks a stream that failed part-way, whose deltas so
+        far must be discarded. Closing the generator early drops the risks
+        that have not started yet.
+        """
+        if not risks:
+            return
+        deltas = queue.Queue()
+
+        def stream_risk(risk, queued_at):
+            self._local.queued_at = queued_at
+            end = None
+            try:
+                for delta in self.analyze_blockchain_security_stream(
+                    blockchain_name,
+                    risk['prompt'],
+                    block_explorer_url,
+                    bypass_cache=bypass_cache,
+                    risk_name=risk['name'],
+                    fact_sheet=fact_sheet,
+                    generation=GenerationSettings.for_risk(risk)
+                ):
+                    deltas.put((risk['name'], delta))
+            except Exception as e:
+                logger.error(f"Error streaming risk '{risk['name']}': {str(e)}")
+                end = STREAM_FAILED
+            finally:
+                if records is not None:
+                    records[risk['name']] = self.last_call_record()
+                deltas.put((risk['name'], end))
+
+        max_workers = min(max_workers or MAX_CONCURRENT_REQUESTS, len(risks))
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cb-gpt-stream")
+        try:
+            for risk in risks:
+                executor.submit(stream_risk, risk, time.time())
+            remaining = len(risks)
+            while remaining:
+                risk_name, delta = deltas.get()
+                if delta is None or delta is STREAM_FAILED:
+                    remaining -= 1
+                yield risk_name, delta
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+# Process-wide single-flight layer shared by every client
+_single_flight = SingleFlight()
+
+# Process-wide client pool, keyed by credentials fingerprint
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+
+def credentials_fingerprint():
+    """Fingerprint the current credentials so a rotated key yields a fresh client."""
+    try:
+        stat = os.stat(CREDENTIALS_FILE)
+        file_state = f"{stat.st_mtime_ns}:{stat.st_size}"
+    except OSError:
+        file_state = "missing"
+    parts = [
+        file_state,
+        os.getenv("CB_AI_AGENTKIT_API_KEY", ""),
+        os.getenv("CB_AI_AGENTKIT_API_SECRET", ""),
+    ]
+    return hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest()
+
+def get_shared_client():
+    """Return the process-wide CbGptClient, building it once per set of credentials.
+
+    Reusing one client keeps the underlying service client, with its
+    connections and auth state, alive across Streamlit reruns and sessions.
+    """
+    fingerprint = credentials_fingerprint()
+    with _shared_clients_lock:
+        client = _shared_clients.get(fingerprint)
+        if client is None:
+            if _shared_clients:
+                logger.info("Credentials changed, rebuilding CB-GPT client")
+                _shared_clients.clear()
+            client = CbGptClient()
+            _shared_clients[fingerprint] = client
+        return client
 
-        return self._make_request(system_prompt, user_prompt)
+def invalidate_shared_client():
+    """Drop the pooled client so the next call re-reads credentials."""
+    with _shared_clients_lock:
+        _shared_clients.clear()
 
 def test_client():
     """Test the CB-GPT client functionality."""
@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from cb_gpt_client import CbGptError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Constants
+FACT_SHEET_DIR = os.getenv("FACT_SHEET_DIR", os.path.join(os.path.dirname(__file__), 'data', 'fact_sheets'))
+FACT_SHEET_TTL_SECONDS = int(os.getenv("FACT_SHEET_TTL_SECONDS", str(7 * 24 * 3600)))
+
+FACT_SHEET_PROMPT = (
+    "Compile a compact fact sheet that later security questions about this chain will reuse. "
+    "Cover only: the consensus mechanism and its fault threshold; the largest validators, "
+    "staking entities or mining pools with their approximate shares; published security audits "
+    "(auditor, date, link); the official GitHub organization and main node repositories; "
+    "and notable past security incidents. Use terse bullet points under 250 words and cite sources."
+)
+
+def chain_slug(blockchain_name):
+    """Filesystem-safe identifier for a chain."""
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '-', blockchain_name.strip().lower()).strip('-') or 'chain'
+    digest = hashlib.sha256(blockchain_name.strip().lower().encode('utf-8')).hexdigest()[:8]
+    return f"{slug}-{digest}"
+
+# Process-wide locks, one per fact sheet file, so that every provider (e.g. one per
+# batch run or app session) gathers each chain's fact sheet only once at a time
+_fact_sheet_locks = {}
+_fact_sheet_locks_lock = threading.Lock()
+
+class FactSheetProvider(ABC):
+    """Produces the shared per-chain fact sheet injected into every risk prompt."""
+
+    @abstractmethod
+    def get(self, blockchain_name, block_explorer_url=None):
+        """Return the fact sheet for a chain, or None if none is available."""
+
+class FileFactSheetProvider(FactSheetProvider):
+    """Serves pre-written fact sheets from <directory>/<chain slug>.md, e.g. for tests or offline runs."""
+
+    def __init__(self, directory=FACT_SHEET_DIR):
+        self.directory = directory
+
+    def path_for(self, blockchain_name):
+        """Location of a chain's fact sheet file."""
+        return os.path.join(self.directory, f"{chain_slug(blockchain_name)}.md")
+
+    def get(self, blockchain_name, block_explorer_url=None):
+        try:
+            with open(self.path_for(blockchain_name), 'r') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+class CbGptFactSheetProvider(FileFactSheetProvider):
+    """Gathers fact sheets with one CB-GPT call per chain and caches them on disk."""
+
+    def __init__(self, client, directory=FACT_SHEET_DIR, ttl_seconds=FACT_SHEET_TTL_SECONDS):
+        super().__init__(directory)
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+
+    def _chain_lock(self, blockchain_name):
+        """Lock ensuring each chain's fact sheet is only gathered once at a time, across providers."""
+        with _fact_sheet_locks_lock:
+            return _fact_sheet_locks.setdefault(os.path.abspath(self.path_for(blockchain_name)), threading.Lock())
+
+    def get(self, blockchain_name, block_explorer_url=None):
+        with self._chain_lock(blockchain_name):
+            path = self.path_for(blockchain_name)
+            if os.path.exists(path) and time.time() - os.path.getmtime(path) < self.ttl_seconds:
+                return super().get(blockchain_name, block_explorer_url)
+
+            try:
+                fact_sheet = self.client.analyze_blockchain_security(
+                    blockchain_name,
+                    FACT_SHEET_PROMPT,
+                    block_explorer_url,
+                    risk_name="Fact Sheet",
+                    verdict=False
+                )
+            except CbGptError:
+                fact_sheet = None
+            if not fact_sheet:
+                logger.warning(f"Could not gather a fact sheet for {blockchain_name}")
+                return None
+            self._write(path, fact_sheet)
+            return fact_sheet
+
+    def _write(self, path, fact_sheet):
+        """Atomically write a fact sheet file."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(fact_sheet)
+        os.replace(tmp_path, path)
+
+def get_fact_sheet_provider(client, provider=None):
+    """Create the fact sheet provider selected by name or the FACT_SHEET_PROVIDER env var."""
+    provider = provider or os.getenv("FACT_SHEET_PROVIDER", "cbgpt")
+    if provider == "cbgpt":
+        return CbGptFactSheetProvider(client)
+    if provider == "files":
+        return FileFactSheetProvider()
+    raise ValueError(f"Unknown fact sheet provider: {provider}")
@@ -0,0 +1,118 @@
+"""Drop-in fake of CbGptServiceApiClient for offline benchmarks.
+
+Pass an instance to CbGptClient(service_client=...) to exercise the whole
+request pipeline without network access or credentials.
+"""
+import json
+import random
+import threading
+import time
+import zlib
+from requests import Response
+from requests.exceptions import HTTPError, Timeout
+
+# Latency samplers, each taking (rng, mean seconds, spread) and returning seconds
+LATENCY_DISTRIBUTIONS = {
+    "constant": lambda rng, mean, spread: mean,
+    "uniform": lambda rng, mean, spread: rng.uniform(max(0.0, mean - spread), mean + spread),
+    "lognormal": lambda rng, mean, spread: rng.lognormvariate(0, spread) * mean,
+    # Heavy tail: most calls near mean/2, a few many times slower
+    "pareto": lambda rng, mean, spread: mean / 2 * rng.paretovariate(max(1.01, 1 / max(spread, 1e-6))),
+}
+
+# Reasoning effort scales the sampled latency; unset behaves like "medium"
+REASONING_LATENCY_FACTORS = {"low": 0.5, "medium": 1.0, "high": 2.0}
+
+ANSWER_SENTENCE = (
+    "The **validator set** is operated by *independent entities*; see `consensus/state.go` and "
+    "[the latest audit](https://example.com/audit) for details. "
+)
+
+def http_error(status_code):
+    """Build a requests HTTPError carrying the given status code."""
+    response = Response()
+    response.status_code = status_code
+    return HTTPError(f"{status_code} Error from fake CB-GPT service", response=response)
+
+class FakeCbGptServiceApiClient:
+    """Fake CB-GPT service with configurable latency, failures and answer size."""
+
+    def __init__(self, latency="lognormal", latency_mean=0.2, latency_spread=0.5, error_rate=0.0,
+                 throttle_rate=0.0, timeout_rate=0.0, response_chars=1500, stream_chunk_chars=40, seed=None):
+        self.latency = LATENCY_DISTRIBUTIONS[latency]
+        self.latency_mean = latency_mean
+        self.latency_spread = latency_spread
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.timeout_rate = timeout_rate
+        self.response_chars = response_chars
+        self.stream_chunk_chars = stream_chunk_chars
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _answer(self, request):
+        """Synthesize an answer of the configured size."""
+        user_prompt = request['messages'][-1]['content']
+        first_line = user_prompt.strip().splitlines()[0] if user_prompt.strip() else ""
+        # Roughly four characters per token
+        chars = min(self.response_chars, request['max_completion_tokens'] * 4) if request.get('max_completion_tokens') else self.response_chars
+        body = (ANSWER_SENTENCE * (chars // len(ANSWER_SENTENCE) + 1))[:chars]
+        if 'Verdict: PASS' not in request['messages'][0]['content']:
+            return f"{first_line}\n\n{body}"
+        # The same prompt always gets the same verdict
+        verdict = ('PASS', 'FAIL', 'UNKNOWN')[zlib.crc32(user_prompt.encode('utf-8')) % 3]
+        return f"{first_line}\n\n{body}\n\nVerdict: {verdict}"
+
+    def generate_content(self, model_id, request_body, redaction_required=False, uses_multimodal=False,
+                         incognito=False, or_component_id=None):
+        """Mimic CbGptServiceApiClient.generate_content."""
+        request = json.loads(request_body)
+        with self._lock:
+            self.calls += 1
+            delay = self.latency(self._rng, self.latency_mean, self.latency_spread)
+            roll = self._rng.random()
+        time.sleep(delay * REASONING_LATENCY_FACTORS.get(request.get('reasoning_effort'), 1.0))
+        if roll < self.throttle_rate:
+            raise http_error(429)
+        if roll < self.throttle_rate + self.error_rate:
+            raise http_error(503)
+        if roll < self.throttle_rate + self.error_rate + self.timeout_rate:
+            raise Timeout("Fake CB-GPT service timed out")
+
+        answer = self._answer(request)
+        if request.get('stream'):
+            return self._stream(answer)
+        return {
+            "response": json.dumps({
+                "model": model_id,
+                "choices": [{"message": {"role": "assistant", "content": answer}}],
+                "usage": {
+                    "prompt_tokens": len(request_body) // 4,
+                    "completion_tokens": len(answer) // 4,
+                },
+            })
+        }
+
+    def _stream(self, answer):
+        """Yield the answer as server-sent event chunks."""
+        for start in range(0, len(answer), self.stream_chunk_chars):
+            delta = answer[start:start + self.stream_chunk_chars]
+            yield "data: " + json.dumps({"choices": [{"delta": {"content": delta}}]}) + "\n\n"
+        yield "data: [DONE]\n\n"
+
+def make_fake_client(service=None, cache=None, **options):
+    """Build a CbGptClient around a fake service, with a fresh in-memory cache and telemetry kept off disk.
+
+    Pass cache=False to send every call to the service; any other keyword,
+    such as single_flight or hedging, goes to CbGptClient as is.
+    """
+    from cb_gpt_client import CbGptClient
+    from response_cache import ResponseCache
+    from telemetry import Telemetry
+    return CbGptClient(
+        service_client=service or FakeCbGptServiceApiClient(),
+        cache=ResponseCache(':memory:') if cache is None else cache,
+        telemetry=Telemetry(path=None, metrics_path=None),
+        **options
+    )
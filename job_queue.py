@@ -0,0 +1,430 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from cb_gpt_client import STREAM_FAILED, GenerationSettings, get_shared_client
+from fact_sheet import get_fact_sheet_provider
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Constants
+JOBS_DB_FILE = os.path.join(os.path.dirname(__file__), 'data', 'jobs.sqlite3')
+# Sessions expected to run an analysis at the same time; each job runs on one interactive worker
+EXPECTED_SESSIONS = int(os.getenv("CB_GPT_EXPECTED_SESSIONS", "4"))
+JOB_WORKERS = int(os.getenv("CB_GPT_JOB_WORKERS", str(EXPECTED_SESSIONS)))
+POLL_INTERVAL_SECONDS = 0.5
+ACTIVE_STATUSES = ('queued', 'running')
+# A running job's owner renews its lease every JOB_LEASE_SECONDS / 4; once it lapses, any worker may resume the job
+JOB_LEASE_SECONDS = float(os.getenv("CB_GPT_JOB_LEASE_SECONDS", "60"))
+
+class JobQueue:
+    """SQLite-backed queue of assessment jobs.
+
+    A job asks for a list of risks to be answered for one chain and
+    session. Jobs move from queued to running to done, failed or
+    cancelled; the answers themselves go to the response store.
+
+    Several processes may share the database. A running job belongs to the
+    worker pool that claimed it for as long as the pool keeps renewing its
+    lease; only a job whose lease has lapsed, e.g. because its process
+    died, is handed to another pool. Progress and status updates from a
+    pool that no longer owns a job are ignored.
+    """
+
+    def __init__(self, path=JOBS_DB_FILE):
+        """Open (or create) the job database."""
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                chain TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                explorer_url TEXT,
+                risks TEXT NOT NULL,
+                options TEXT NOT NULL,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                completed INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                risk_errors TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                owner TEXT,
+                lease_expires_at REAL
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if 'owner' not in columns:
+            # Databases created before leases existed; their running jobs count as expired
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at REAL")
+        if 'risk_errors' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN risk_errors TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_session ON jobs (chain, session_id, created_at)")
+
+    def _to_job(self, row):
+        """Convert a database row into a job dict."""
+        if row is None:
+            return None
+        job = dict(row)
+        job['risks'] = json.loads(job['risks'])
+        job['options'] = json.loads(job['options'])
+        job['risk_errors'] = json.loads(job['risk_errors'] or '{}')
+        return job
+
+    def submit(self, chain, session_id, risks, explorer_url=None, **options):
+        """Queue a job answering the given risks and return its id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, chain, session_id, explorer_url, risks, options, status, total, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, chain, session_id, explorer_url, json.dumps(risks), json.dumps(options), len(risks), now, now)
+            )
+        return job_id
+
+    def get(self, job_id):
+        """Return a job by id, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_job(row)
+
+    def active(self, chain, session_id):
+        """Return the queued and running jobs of a chain and session, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE chain = ? AND session_id = ? AND status IN ('queued', 'running') "
+                "ORDER BY created_at",
+                (chain, session_id)
+            ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def latest(self, chain, session_id):
+        """Return the most recently submitted job of a chain and session, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE chain = ? AND session_id = ? ORDER BY created_at DESC LIMIT 1",
+                (chain, session_id)
+            ).fetchone()
+        return self._to_job(row)
+
+    def claim(self, owner, session_id=None, lease_seconds=JOB_LEASE_SECONDS, exclude_session_id=None):
+        """Atomically lease the oldest claimable job to owner and return it, or None.
+
+        Claimable jobs are queued ones and running ones whose lease has
+        lapsed. With a session_id, only that session's jobs are considered;
+        with an exclude_session_id, that session's jobs are skipped.
+        """
+        now = time.time()
+        where = "(status = 'queued' OR (status = 'running' AND COALESCE(lease_expires_at, 0) < ?))"
+        params = [now]
+        if session_id is not None:
+            where += " AND session_id = ?"
+            params.append(session_id)
+        if exclude_session_id is not None:
+            where += " AND session_id != ?"
+            params.append(exclude_session_id)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT * FROM jobs WHERE {where} ORDER BY created_at LIMIT 1", params
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', owner = ?, lease_expires_at = ?, updated_at = ? WHERE job_id = ?",
+                        (owner, now + lease_seconds, now, row['job_id'])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = self._to_job(row)
+        if job:
+            if job['status'] == 'running':
+                logger.info(f"Resuming analysis job {job['job_id']} after its worker's lease lapsed")
+            job.update(status='running', owner=owner, lease_expires_at=now + lease_seconds)
+        return job
+
+    def heartbeat(self, job_id, owner, lease_seconds=JOB_LEASE_SECONDS):
+        """Renew owner's lease on a running job, returning whether it still holds it."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE job_id = ? AND owner = ? AND status = 'running'",
+                (time.time() + lease_seconds, job_id, owner)
+            )
+        return cursor.rowcount > 0
+
+    def holds(self, job_id, owner):
+        """Whether owner still runs a job: it was neither cancelled nor taken over after a lapsed lease."""
+        job = self.get(job_id)
+        return job is not None and job['status'] == 'running' and job['owner'] == owner
+
+    def record_progress(self, job_id, owner, completed=0, failed=0):
+        """Count finished risks of a job owner runs; failed ones are counted in both."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET completed = completed + ?, failed = failed + ?, updated_at = ? WHERE job_id = ? AND owner = ?",
+                (completed, failed, time.time(), job_id, owner)
+            )
+
+    def record_error(self, job_id, owner, risk_name, error):
+        """Keep why a risk of a job owner runs could not be answered, for the UI to show."""
+        with self._lock:
+            row = self._conn.execute("SELECT risk_errors FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            risk_errors = json.loads(row['risk_errors'] or '{}')
+            risk_errors[risk_name] = error
+            self._conn.execute(
+                "UPDATE jobs SET risk_errors = ?, updated_at = ? WHERE job_id = ? AND owner = ?",
+                (json.dumps(risk_errors), time.time(), job_id, owner)
+            )
+
+    def reset_progress(self, job_id, owner, completed=0):
+        """Restart the progress count of a job owner runs, e.g. when a requeued job resumes."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET completed = ?, failed = 0, risk_errors = NULL, updated_at = ? WHERE job_id = ? AND owner = ?",
+                (completed, time.time(), job_id, owner)
+            )
+
+    def finish(self, job_id, owner, status, error=None):
+        """Mark a job owner runs as done or failed; cancelled jobs stay cancelled."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ? AND owner = ? AND status = 'running'",
+                (status, error, time.time(), job_id, owner)
+            )
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job, returning whether it was still active."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE job_id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id)
+            )
+        return cursor.rowcount > 0
+
+class JobWorkerPool:
+    """Background threads that claim queued jobs and run them to completion.
+
+    Each answer is written to the response store as soon as it arrives, so a
+    cancelled or interrupted job keeps the work it finished. While a job
+    streams, the partial answers are kept in memory for the UI to show.
+    With an answer index, fresh answers are indexed and jobs asking for it
+    reuse near-identical answers from chains on the same framework. With a
+    results index, every completed answer is also recorded for portfolio
+    queries across chains.
+
+    The pool leases the jobs it claims and renews the leases from a
+    heartbeat thread, so pools in other processes sharing the database
+    leave them alone. With a session_id, the pool only runs that
+    session's jobs; with an exclude_session_id, it runs every other
+    session's, so background refreshes can get a pool of their own.
+    """
+
+    def __init__(self, jobs, store, client_factory=get_shared_client, workers=JOB_WORKERS, answer_index=None, results_index=None,
+                 session_id=None, lease_seconds=JOB_LEASE_SECONDS, exclude_session_id=None):
+        self.jobs = jobs
+        self.store = store
+        self.answer_index = answer_index
+        self.results_index = results_index
+        self.client_factory = client_factory
+        self.workers = workers
+        self.session_id = session_id
+        self.exclude_session_id = exclude_session_id
+        self.lease_seconds = lease_seconds
+        # Identifies this pool as the owner of the jobs it leases
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._threads = []
+        self._running = set()
+        self._cancelled = set()
+        self._partials = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Start the worker threads and the lease heartbeat."""
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """Ask the worker threads to exit once their current job is done."""
+        self._stopping.set()
+
+    def cancel(self, job_id):
+        """Cancel a job; a running job stops after the answers already in flight."""
+        with self._lock:
+            self._cancelled.add(job_id)
+        return self.jobs.cancel(job_id)
+
+    def partial(self, job_id):
+        """Snapshot of the answers a running job is still streaming, keyed by risk name."""
+        with self._lock:
+            return {risk_name: "".join(deltas) for risk_name, deltas in self._partials.get(job_id, {}).items()}
+
+    def _cancel_requested(self, job_id):
+        """Whether a running job should stop."""
+        with self._lock:
+            return job_id in self._cancelled
+
+    def _heartbeat(self):
+        """Renew the leases of the jobs this pool is running until stopped."""
+        while not self._stopping.wait(self.lease_seconds / 4):
+            with self._lock:
+                running = list(self._running)
+            for job_id in running:
+                if not self.jobs.heartbeat(job_id, self.owner, self.lease_seconds):
+                    logger.warning(f"Lost the lease on analysis job {job_id}; it stops after the answers in flight")
+
+    def _work(self):
+        """Worker loop: claim and run jobs until stopped."""
+        while not self._stopping.is_set():
+            job = self.jobs.claim(self.owner, self.session_id, self.lease_seconds, self.exclude_session_id)
+            if job is None:
+                time.sleep(POLL_INTERVAL_SECONDS)
+                continue
+            with self._lock:
+                self._running.add(job['job_id'])
+            try:
+                self._run(job)
+                self.jobs.finish(job['job_id'], self.owner, 'done')
+            except Exception as e:
+                logger.error(f"Analysis job {job['job_id']} failed: {str(e)}")
+                self.jobs.finish(job['job_id'], self.owner, 'failed', str(e))
+            finally:
+                with self._lock:
+                    self._running.discard(job['job_id'])
+                    self._partials.pop(job['job_id'], None)
+                    self._cancelled.discard(job['job_id'])
+
+    def _run(self, job):
+        """Answer every risk of a job that does not already have an up-to-date stored answer."""
+        job_id, chain, session_id = job['job_id'], job['chain'], job['session_id']
+        explorer_url, options = job['explorer_url'], job['options']
+        client = self.client_factory()
+
+        fingerprints = {
+            risk['name']: client.risk_fingerprint(risk['prompt'], explorer_url, GenerationSettings.for_risk(risk))
+            for risk in job['risks']
+        }
+        stored = self.store.load_fingerprints(chain, session_id)
+        # A requeued job resumes where it stopped
+        pending = [risk for risk in job['risks'] if stored.get(risk['name']) != fingerprints[risk['name']]]
+        if options.get('refresh'):
+            # Refresh jobs re-ask up-to-date answers too, unless written since the job was submitted
+            updated_at = self.store.load_updated_at(chain, session_id)
+            pending = [
+                risk for risk in job['risks']
+                if risk in pending or (updated_at.get(risk['name']) or 0) < job['created_at']
+            ]
+        self.jobs.reset_progress(job_id, self.owner, completed=len(job['risks']) - len(pending))
+
+        framework = options.get('framework')
+        if self.answer_index and options.get('reuse_similar') and pending:
+            drafts, pending = self.answer_index.split_drafts(pending, framework, chain, options.get('similarity_threshold'))
+            for risk_name, response in drafts.items():
+                self.store.upsert(chain, session_id, risk_name, response, fingerprints[risk_name])
+                self.jobs.record_progress(job_id, self.owner, completed=1)
+            if self.results_index:
+                self.results_index.record_many(
+                    (chain, risk, drafts[risk['name']], None, None, 'draft', None) for risk in job['risks'] if risk['name'] in drafts
+                )
+        if not pending:
+            return
+        risks_by_name = {risk['name']: risk for risk in pending}
+
+        fact_sheet = None
+        if options.get('fact_sheet'):
+            fact_sheet = get_fact_sheet_provider(client).get(chain, explorer_url)
+
+        # Telemetry record of the call that answered each risk
+        records = {}
+        if options.get('stream') and not options.get('group_related'):
+            results = self._stream(job_id, client, chain, pending, explorer_url, fact_sheet, options.get('bypass_cache', False), records)
+        else:
+            results = client.iter_analyze_many(
+                chain,
+                pending,
+                explorer_url,
+                group_related=options.get('group_related', False),
+                fact_sheet=fact_sheet,
+                bypass_cache=options.get('bypass_cache', False),
+                records=records
+            )
+        try:
+            for risk_name, response in results:
+                record = records.get(risk_name) or {}
+                # A failed risk is not stored, so it stays pending and a failed refresh keeps the last good answer
+                if response:
+                    fingerprint = fingerprints[risk_name]
+                    if record.get('downgraded'):
+                        # A reduced-budget answer is shown but reads as outdated, so it is re-asked once load drops
+                        risk = risks_by_name[risk_name]
+                        fingerprint = client.downgraded_fingerprint(risk['prompt'], explorer_url, GenerationSettings.for_risk(risk))
+                    self.store.upsert(chain, session_id, risk_name, response, fingerprint)
+                self.jobs.record_progress(job_id, self.owner, completed=1, failed=0 if response else 1)
+                if not response:
+                    self.jobs.record_error(job_id, self.owner, risk_name, record.get('error') or "CB-GPT returned an empty answer")
+                if self.answer_index:
+                    self.answer_index.add(risks_by_name[risk_name], framework, chain, response)
+                if self.results_index and response:
+                    self.results_index.record(
+                        chain,
+                        risks_by_name[risk_name],
+                        response,
+                        latency=record.get('latency'),
+                        model=record.get('model'),
+                        source='refresh' if options.get('refresh') else 'job'
+                    )
+                if self._cancel_requested(job_id) or not self.jobs.holds(job_id, self.owner):
+                    logger.info(f"Analysis job {job_id} cancelled or taken over")
+                    break
+        finally:
+            results.close()
+
+    def _stream(self, job_id, client, chain, risks, explorer_url, fact_sheet, bypass_cache, records=None):
+        """Stream a job's answers, keeping partial text for the UI and yielding (risk name, response)."""
+        with self._lock:
+            partials = self._partials.setdefault(job_id, {})
+        stream = client.stream_many(chain, risks, explorer_url, fact_sheet=fact_sheet, bypass_cache=bypass_cache, records=records)
+        try:
+            for risk_name, delta in stream:
+                with self._lock:
+                    if delta is STREAM_FAILED:
+                        # A truncated answer is never stored as if it were complete
+                        partials.pop(risk_name, None)
+                        response = None
+                    elif delta is None:
+                        response = "".join(partials.pop(risk_name, [])) or None
+                    else:
+                        partials.setdefault(risk_name, []).append(delta)
+                        response = None
+                if delta is None or delta is STREAM_FAILED:
+                    yield risk_name, response
+                elif self._cancel_requested(job_id):
+                    return
+        finally:
+            stream.close()
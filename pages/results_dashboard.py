@@ -0,0 +1,98 @@
+import streamlit as st
+import json
+import os
+import time
+from datetime import datetime
+from results_index import DEFAULT_QUERY_LIMIT, VERDICTS, ResultsIndex
+
+# Constants
+RISKS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'risks.json')
+SINCE_OPTIONS = {"Any time": None, "Last 24 hours": 1, "Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90}
+VERDICT_ICONS = {"pass": "✅ pass", "fail": "❌ fail", "unknown": "❔ unknown"}
+
+@st.cache_resource
+def get_results_index():
+    """Return the process-wide index of completed answers across chains."""
+    return ResultsIndex()
+
+def risk_options(index):
+    """Risk names from risks.json plus any older ones still in the index."""
+    with open(RISKS_FILE, 'r') as f:
+        names = [risk['name'] for risk in json.load(f)['risks']]
+    return names + [name for name in index.risk_names() if name not in names]
+
+def format_rows(rows):
+    """Dashboard rows with readable times, verdicts and latency."""
+    return [
+        {
+            "chain": row["chain"],
+            "risk": row["risk"],
+            "critical": bool(row["is_critical"]),
+            "verdict": VERDICT_ICONS[row["verdict"]],
+            "answered": datetime.fromtimestamp(row["answered_at"]).strftime("%Y-%m-%d %H:%M"),
+            "latency_s": round(row["latency"], 2) if row["latency"] is not None else None,
+            "model": row["model"],
+            "source": row["source"],
+            "prompt_hash": row["prompt_hash"],
+        }
+        for row in rows
+    ]
+
+def main():
+    st.set_page_config(page_title="Assessment Results", page_icon="📈", layout="wide")
+    st.title("📈 Assessment Results Across Chains")
+    index = get_results_index()
+
+    with st.sidebar:
+        st.subheader("Filters")
+        risks = st.multiselect("Risks", risk_options(index))
+        chain_search = st.text_input("Chain name contains")
+        verdicts = st.multiselect("Verdicts", VERDICTS, format_func=VERDICT_ICONS.get)
+        critical_only = st.checkbox("Critical risks only")
+        since_label = st.selectbox("Answered", list(SINCE_OPTIONS))
+        latest_only = st.checkbox("Latest answer per chain and risk only", value=True,
+                                  help="Turn off to include superseded answers, e.g. to see how verdicts changed")
+
+    since_days = SINCE_OPTIONS[since_label]
+    filters = {
+        "risks": risks,
+        "chain_search": chain_search.strip(),
+        "verdicts": verdicts,
+        "critical_only": critical_only,
+        "since": time.time() - since_days * 86400 if since_days else None,
+        "latest_only": latest_only,
+    }
+
+    started = time.perf_counter()
+    summary = index.summary(**filters)
+    rows = index.query(**filters)
+    failing = index.chains(**{**filters, "verdicts": ["fail"]}) if not verdicts or "fail" in verdicts else []
+    elapsed = time.perf_counter() - started
+
+    stats = index.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Indexed answers", stats["answers"])
+    col2.metric("Chains", stats["chains"])
+    col3.metric("Failing chains", len(failing))
+    col4.metric("Unknown verdict", sum(risk["unknown"] for risk in summary))
+    st.caption(f"Queried in {elapsed * 1000:.0f} ms. Verdicts are read from the answers' own wording; "
+               "answers without an explicit pass or fail are counted as unknown.")
+
+    if not summary:
+        st.info("No assessments match these filters yet.")
+        return
+
+    st.subheader("By risk")
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+
+    if failing:
+        st.subheader(f"Failing chains ({len(failing)})")
+        st.write(", ".join(failing))
+
+    st.subheader("Assessments")
+    if len(rows) == DEFAULT_QUERY_LIMIT:
+        st.caption(f"Showing the newest {DEFAULT_QUERY_LIMIT}; narrow the filters to see the rest.")
+    st.dataframe(format_rows(rows), use_container_width=True, hide_index=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import random
+import threading
+import time
+from collections import deque
+
+class TokenBucket:
+    """Thread-safe token bucket limiting how often requests may start."""
+
+    def __init__(self, rate, capacity=None):
+        """Allow `rate` requests per second with bursts of up to `capacity`."""
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        """Add the tokens accrued since the last refill."""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self, timeout=None):
+        """Block until a token is available; return False if the timeout expires first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency limit: grows additively on success, halves on overload."""
+
+    def __init__(self, initial=4, minimum=1, maximum=16, decrease_factor=0.5):
+        """Start at `initial` in-flight requests, adapting between `minimum` and `maximum`."""
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.initial = float(min(max(initial, minimum), maximum))
+        self._limit = self.initial
+        self._in_flight = 0
+        self._waiting = 0
+        self._successes = 0
+        self._overloads = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        """Current whole-number concurrency limit."""
+        return max(self.minimum, int(self._limit))
+
+    def acquire(self, timeout=None):
+        """Wait for an in-flight slot; return False if the timeout expires first."""
+        with self._condition:
+            self._waiting += 1
+            try:
+                if not self._condition.wait_for(lambda: self._in_flight < self.limit, timeout=timeout):
+                    return False
+            finally:
+                self._waiting -= 1
+            self._in_flight += 1
+            return True
+
+    def saturated(self):
+        """Whether the service is under load: requests are queueing, or overloads cut the limit below its start."""
+        with self._condition:
+            return self._waiting > 0 or self._limit < self.initial
+
+    def release(self, overloaded=False):
+        """Free a slot and adapt the limit to the outcome of the request."""
+        with self._condition:
+            self._in_flight -= 1
+            if overloaded:
+                self._overloads += 1
+                self._limit = max(float(self.minimum), self._limit * self.decrease_factor)
+            else:
+                self._successes += 1
+                # Roughly +1 per full window of successful requests
+                self._limit = min(float(self.maximum), self._limit + 1.0 / self._limit)
+            self._condition.notify_all()
+
+    def metrics(self):
+        """Snapshot of the limiter state."""
+        with self._condition:
+            return {
+                "concurrency_limit": self.limit,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "successes": self._successes,
+                "overloads": self._overloads,
+            }
+
+class HedgeBudget:
+    """Caps hedged requests at a fraction of primary requests.
+
+    Every primary request earns `ratio` of a token, up to `burst` tokens;
+    a hedge spends a whole one. With ratio 0.1, hedging can add at most
+    roughly 10% load however slow the service gets.
+    """
+
+    def __init__(self, ratio=0.1, burst=5):
+        self.ratio = ratio
+        self.burst = float(burst)
+        self._tokens = 0.0
+        self._spent = 0
+        self._denied = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        """Credit the budget for one primary request."""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self):
+        """Take one hedge from the budget; return False if it is exhausted."""
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self._spent += 1
+                return True
+            self._denied += 1
+            return False
+
+    def metrics(self):
+        """Snapshot of the budget state."""
+        with self._lock:
+            return {"hedge_tokens": round(self._tokens, 2), "hedges": self._spent, "hedges_denied": self._denied}
+
+class LatencyTracker:
+    """Sliding window of recent latencies per key, for percentile-based hedge delays."""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key, seconds):
+        """Record one latency sample."""
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key, pct, min_samples=1):
+        """Nearest-rank percentile of the recent samples, or None with fewer than min_samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[max(0, int(round(pct / 100 * len(samples))) - 1)]
+
+class _Flight:
+    """One in-flight call shared by every caller with the same key."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.items = []
+        self.result = None
+        self.error = None
+        self.done = False
+
+class SingleFlight:
+    """Coalesces concurrent identical calls: the first caller runs, later ones share its outcome.
+
+    Only calls that overlap in time are coalesced; once a call lands the
+    next one with the same key runs again.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._leaders = 0
+        self._coalesced = 0
+
+    def _join(self, key):
+        """Return the flight for a key and whether this caller leads it."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._coalesced += 1
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            self._leaders += 1
+            return flight, True
+
+    def _land(self, key, flight, error=None):
+        """Finish a flight and wake its followers."""
+        with self._lock:
+            self._flights.pop(key, None)
+        with flight.condition:
+            flight.error = error
+            flight.done = True
+            flight.condition.notify_all()
+
+    def do(self, key, func):
+        """Return func(), or the result of an identical call already in flight."""
+        flight, leader = self._join(key)
+        if not leader:
+            with flight.condition:
+                flight.condition.wait_for(lambda: flight.done)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = func()
+        except Exception as e:
+            self._land(key, flight, e)
+            raise
+        self._land(key, flight)
+        return flight.result
+
+    def stream(self, key, func, abandoned_error=RuntimeError):
+        """Yield from func(), or replay the items of an identical stream in flight as they arrive.
+
+        If the leading caller stops early, followers get abandoned_error
+        after the items it received.
+        """
+        flight, leader = self._join(key)
+        if leader:
+            error = abandoned_error("The coalesced call was abandoned")
+            try:
+                for item in func():
+                    with flight.condition:
+                        flight.items.append(item)
+                        flight.condition.notify_all()
+                    yield item
+                error = None
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self._land(key, flight, error)
+            return
+        index = 0
+        while True:
+            with flight.condition:
+                flight.condition.wait_for(lambda: flight.done or len(flight.items) > index)
+                items = flight.items[index:]
+                done = flight.done
+            index += len(items)
+            yield from items
+            if done:
+                if flight.error is not None:
+                    raise flight.error
+                return
+
+    def metrics(self):
+        """Calls run and calls coalesced onto them since start."""
+        with self._lock:
+            return {"flights": self._leaders, "coalesced": self._coalesced, "in_flight_keys": len(self._flights)}
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0):
+    """Full-jitter exponential backoff delay for a retry attempt (1-based)."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
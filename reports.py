@@ -0,0 +1,711 @@
+from io import BytesIO
+from collections import namedtuple
+from xml.sax.saxutils import escape
+import gc
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import zipfile
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# python-docx and reportlab are imported inside the functions that use them,
+# so importing this module stays cheap until a report is actually built.
+
+def report_digest(blockchain_name, blockchain_symbol, blockchain_website, critical_risks, non_critical_risks, edited_responses):
+    """Digest of everything that goes into a report, used to skip rebuilding unchanged exports."""
+    payload = json.dumps({
+        "chain": [blockchain_name, blockchain_symbol, blockchain_website],
+        "risks": [[risk['name'], edited_responses.get(risk['name'])] for risk in critical_risks + non_critical_risks],
+        "critical": [risk['name'] for risk in critical_risks],
+    }, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+# Inline markdown tokens: `code`, [text](url), and ** / * emphasis markers
+INLINE_TOKEN_PATTERN = re.compile(r'`([^`]*)`|\[([^\]]*)\]\(([^)]*)\)|(\*\*|\*)')
+
+# A run of text sharing one set of inline styles; url is set for links
+InlineSpan = namedtuple('InlineSpan', ['text', 'bold', 'italic', 'code', 'url'])
+
+def parse_inline_markdown(text):
+    """Tokenize inline markdown into a flat list of styled spans in a single linear pass."""
+    if not text:
+        return []
+    
+    # Remove code block markers
+    text = text.replace('```', '')
+    
+    tokens = []
+    pos = 0
+    for match in INLINE_TOKEN_PATTERN.finditer(text):
+        if match.start() > pos:
+            tokens.append(('text', text[pos:match.start()]))
+        code, link_text, link_url, marker = match.groups()
+        if code is not None:
+            tokens.append(('code', code))
+        elif link_text is not None:
+            tokens.append(('link', link_text, link_url))
+        else:
+            tokens.append(('marker', marker))
+        pos = match.end()
+    if pos < len(text):
+        tokens.append(('text', text[pos:]))
+    
+    # An unpaired trailing emphasis marker is literal text
+    for marker in ('**', '*'):
+        positions = [i for i, token in enumerate(tokens) if token == ('marker', marker)]
+        if len(positions) % 2:
+            tokens[positions[-1]] = ('text', marker)
+    
+    spans = []
+    bold = italic = False
+    for token in tokens:
+        kind = token[0]
+        if kind == 'marker':
+            if token[1] == '**':
+                bold = not bold
+            else:
+                italic = not italic
+            continue
+        if kind == 'link':
+            spans.append(InlineSpan(token[1], bold, italic, False, token[2]))
+            continue
+        span = InlineSpan(token[1], bold, italic, kind == 'code', None)
+        previous = spans[-1] if spans else None
+        if previous and previous.url is None and previous[1:] == span[1:]:
+            spans[-1] = previous._replace(text=previous.text + span.text)
+        elif span.text:
+            spans.append(span)
+    return spans
+
+def render_pdf_markup(spans):
+    """Render inline spans as reportlab paragraph markup."""
+    parts = []
+    for span in spans:
+        markup = escape(span.text)
+        if span.code:
+            markup = f'<font face="Courier" color="#333333">{markup}</font>'
+        if span.url is not None:
+            markup = f'<link href="{escape(span.url, {chr(34): "&quot;"})}" color="blue"><u>{markup}</u></link>'
+        if span.italic:
+            markup = f'<i>{markup}</i>'
+        if span.bold:
+            markup = f'<b>{markup}</b>'
+        parts.append(markup)
+    return ''.join(parts)
+
+def process_markdown(text, for_pdf=True):
+    """Process markdown formatting for PDF or DOCX.
+    
+    For PDF this returns reportlab markup; for DOCX it returns the plain text
+    with (format, start, end) ranges and (text, url, start, end) links.
+    """
+    if not text:
+        return text if for_pdf else (text, [], [])
+    
+    spans = parse_inline_markdown(text)
+    if for_pdf:
+        return render_pdf_markup(spans)
+    
+    formats = []
+    links = []
+    pieces = []
+    offset = 0
+    for span in spans:
+        end = offset + len(span.text)
+        if span.url is not None:
+            links.append((span.text, span.url, offset, end))
+        for fmt in ('code', 'bold', 'italic'):
+            if getattr(span, fmt):
+                formats.append((fmt, offset, end))
+        pieces.append(span.text)
+        offset = end
+    return ''.join(pieces), formats, links
+
+def add_hyperlink(paragraph, text, url):
+    """Add a hyperlink to a paragraph."""
+    from docx.opc import constants
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+    
+    part = paragraph.part
+    r_id = part.relate_to(url, constants.RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
+    
+    hyperlink = OxmlElement('w:hyperlink')
+    hyperlink.set(qn('r:id'), r_id)
+    
+    new_run = OxmlElement('w:r')
+    rPr = OxmlElement('w:rPr')
+    
+    c = OxmlElement('w:color')
+    c.set(qn('w:val'), '0000FF')
+    rPr.append(c)
+    
+    u = OxmlElement('w:u')
+    u.set(qn('w:val'), 'single')
+    rPr.append(u)
+    
+    new_run.append(rPr)
+    
+    t = OxmlElement('w:t')
+    t.text = text
+    new_run.append(t)
+    
+    hyperlink.append(new_run)
+    paragraph._p.append(hyperlink)
+    
+    return hyperlink
+
+def add_formatted_paragraph(doc, text, style=None):
+    """Add a paragraph with proper markdown formatting."""
+    if not text.strip():
+        return
+    from docx.shared import Pt
+    
+    spans = parse_inline_markdown(text)
+    
+    # Create paragraph
+    paragraph = doc.add_paragraph()
+    if style:
+        paragraph.style = style
+    
+    # Handle code blocks
+    if text.startswith('    ') or text.startswith('```'):
+        run = paragraph.add_run(''.join(span.text for span in spans))
+        run.font.name = 'Courier New'
+        run.font.size = Pt(10)
+        return
+    
+    # Add formatted text
+    for span in spans:
+        if span.url is not None:
+            add_hyperlink(paragraph, span.text, span.url)
+            continue
+        run = paragraph.add_run(span.text)
+        if span.bold:
+            run.bold = True
+        if span.italic:
+            run.italic = True
+        if span.code:
+            run.font.name = 'Courier New'
+            run.font.size = Pt(10)
+
+def generate_docx(blockchain_name, blockchain_symbol, blockchain_website, critical_risks, non_critical_risks, edited_responses):
+    """Generate a DOCX report of the security analysis."""
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    
+    doc = Document()
+    
+    # Add title
+    title = doc.add_heading(f'Security Analysis Report: {blockchain_name} ({blockchain_symbol})', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    # Add website
+    if blockchain_website:
+        paragraph = doc.add_paragraph()
+        paragraph.add_run("Block Explorer: ")
+        add_hyperlink(paragraph, blockchain_website, blockchain_website)
+    doc.add_paragraph()  # Add spacing
+    
+    # Add critical risks section
+    doc.add_heading('Critical Security Risks', 1)
+    for risk in critical_risks:
+        doc.add_heading(risk['name'], 2)
+        content = edited_responses.get(risk['name'], 'No analysis available')
+        if content and content.strip():
+            # Split the analysis into paragraphs
+            paragraphs = content.split('\n')
+            for para in paragraphs:
+                if para.strip():
+                    add_formatted_paragraph(doc, para.strip())
+        else:
+            doc.add_paragraph("No analysis available")
+        doc.add_paragraph()  # Add spacing
+    
+    # Add non-critical risks section
+    doc.add_heading('Other Security Considerations', 1)
+    for risk in non_critical_risks:
+        doc.add_heading(risk['name'], 2)
+        content = edited_responses.get(risk['name'], 'No analysis available')
+        if content and content.strip():
+            # Split the analysis into paragraphs
+            paragraphs = content.split('\n')
+            for para in paragraphs:
+                if para.strip():
+                    add_formatted_paragraph(doc, para.strip())
+        else:
+            doc.add_paragraph("No analysis available")
+        doc.add_paragraph()  # Add spacing
+    
+    # Save to BytesIO
+    docx_buffer = BytesIO()
+    doc.save(docx_buffer)
+    docx_buffer.seek(0)
+    return docx_buffer
+
+def pdf_styles():
+    """Paragraph styles shared by the PDF reports."""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    
+    styles = getSampleStyleSheet()
+    
+    # Custom styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        alignment=1,  # Center alignment
+        textColor=colors.HexColor('#1E3D59')
+    )
+    
+    heading1_style = ParagraphStyle(
+        'CustomHeading1',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=12,
+        spaceBefore=24,
+        textColor=colors.HexColor('#2E5575')
+    )
+    
+    heading2_style = ParagraphStyle(
+        'CustomHeading2',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=8,
+        spaceBefore=16,
+        textColor=colors.HexColor('#2E5575')
+    )
+    
+    heading3_style = ParagraphStyle(
+        'CustomHeading3',
+        parent=styles['Heading3'],
+        fontSize=12,
+        spaceAfter=6,
+        spaceBefore=12,
+        textColor=colors.HexColor('#2E5575')
+    )
+    
+    normal_style = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontSize=11,
+        spaceAfter=12,
+        leading=14
+    )
+    
+    code_style = ParagraphStyle(
+        'CodeStyle',
+        parent=styles['Code'],
+        fontSize=10,
+        fontName='Courier',
+        spaceAfter=12,
+        leading=14,
+        backColor=colors.HexColor('#f5f5f5')
+    )
+    
+    return {
+        "title": title_style,
+        "heading1": heading1_style,
+        "heading2": heading2_style,
+        "heading3": heading3_style,
+        "normal": normal_style,
+        "code": code_style,
+    }
+
+def generate_pdf(blockchain_name, blockchain_symbol, blockchain_website, critical_risks, non_critical_risks, edited_responses):
+    """Generate a PDF report of the security analysis, or None if it could not be built."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
+    
+    styles = pdf_styles()
+    title_style = styles['title']
+    heading1_style = styles['heading1']
+    heading2_style = styles['heading2']
+    normal_style = styles['normal']
+    code_style = styles['code']
+    
+    # Build the document content
+    content = []
+    
+    # Add title
+    content.append(Paragraph(f"Security Analysis Report:<br/>{blockchain_name} ({blockchain_symbol})", title_style))
+    
+    # Add website if provided
+    if blockchain_website:
+        content.append(Paragraph(f'Block Explorer: <link href="{blockchain_website}" color="blue"><u>{blockchain_website}</u></link>', normal_style))
+    
+    content.append(Spacer(1, 20))
+    
+    # Add critical risks section
+    content.append(Paragraph("Critical Security Risks", heading1_style))
+    
+    for risk in critical_risks:
+        content.append(Paragraph(risk['name'], heading2_style))
+        analysis = edited_responses.get(risk['name'])
+        if analysis and analysis.strip():
+            # Split the analysis into paragraphs and process markdown in each
+            paragraphs = analysis.split('\n')
+            for para in paragraphs:
+                if para.strip():
+                    # Check if this is a code block (indented or between backticks)
+                    if para.startswith('    ') or para.startswith('```'):
+                        content.append(Paragraph(render_pdf_markup(parse_inline_markdown(para.strip())), code_style))
+                    else:
+                        content.append(Paragraph(render_pdf_markup(parse_inline_markdown(para.strip())), normal_style))
+        else:
+            content.append(Paragraph("No analysis available", normal_style))
+        content.append(Spacer(1, 12))
+    
+    # Add non-critical risks section
+    content.append(Paragraph("Other Security Considerations", heading1_style))
+    
+    for risk in non_critical_risks:
+        content.append(Paragraph(risk['name'], heading2_style))
+        analysis = edited_responses.get(risk['name'])
+        if analysis and analysis.strip():
+            # Split the analysis into paragraphs and process markdown in each
+            paragraphs = analysis.split('\n')
+            for para in paragraphs:
+                if para.strip():
+                    # Check if this is a code block (indented or between backticks)
+                    if para.startswith('    ') or para.startswith('```'):
+                        content.append(Paragraph(render_pdf_markup(parse_inline_markdown(para.strip())), code_style))
+                    else:
+                        content.append(Paragraph(render_pdf_markup(parse_inline_markdown(para.strip())), normal_style))
+        else:
+            content.append(Paragraph("No analysis available", normal_style))
+        content.append(Spacer(1, 12))
+    
+    try:
+        # Build the PDF
+        doc.build(content)
+        buffer.seek(0)
+        return buffer
+    except Exception as e:
+        # Callers report the failure; this also runs in batch jobs without a UI
+        logger.error(f"Error generating PDF: {str(e)}")
+        return None
+
+# Consolidated multi-chain reports
+#
+# These write one report covering many chains straight to a file, one chain
+# section at a time, so memory stays bounded by a single chain's answers
+# rather than growing with the number of chains. What does grow is a few
+# bytes of bookkeeping per chain and per PDF object or DOCX hyperlink.
+
+CONSOLIDATED_TITLE = "Consolidated Security Analysis Report"
+
+# Characters that are not allowed in XML 1.0 documents
+XML_INVALID_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def report_sections(critical_risks, non_critical_risks):
+    """The (heading, risks) sections every report is made of."""
+    return (
+        ("Critical Security Risks", critical_risks),
+        ("Other Security Considerations", non_critical_risks),
+    )
+
+def answer_paragraphs(analysis):
+    """Split an answer into (text, is_code) paragraphs, skipping blank lines."""
+    for para in analysis.split('\n'):
+        if para.strip():
+            yield para.strip(), para.startswith('    ') or para.startswith('```')
+
+def write_atomically(path, write):
+    """Run write(tmp_path) on a temp file next to path, then move it into place."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# Object references such as "12 0 R", and the end of the dictionary that starts a stream
+PDF_REFERENCE_PATTERN = re.compile(rb'(\d+) (\d+) R\b')
+PDF_STREAM_START_PATTERN = re.compile(rb'>>\s*stream\r?\n')
+
+def pdf_string(text):
+    """Escape text as a PDF literal string."""
+    return '(' + text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+class PdfConcatenator:
+    """Appends whole PDFs written by reportlab to one output PDF, one part at a time.
+
+    A reportlab canvas keeps every page until it saves, so one long report
+    is written as one part per chain. Each part's objects are copied to the
+    output with new numbers, and its page tree is hung under a shared root.
+    Only the part being copied is held in memory; the output keeps one
+    offset per object for the cross-reference table.
+    """
+
+    # Objects 1-3 are the shared page tree root, the catalog and the document info
+    ROOT, CATALOG, INFO = 1, 2, 3
+
+    def __init__(self, out, title=None):
+        self._out = out
+        self._title = title
+        # Byte offset of object n at index n - 1; the first three are written last
+        self._offsets = [None] * self.INFO
+        self._page_trees = []
+        self._page_count = 0
+        self._out.write(b'%PDF-1.4\n%\x93\x8c\x8b\x9e\n')
+
+    def _write_object(self, number, body):
+        """Write one indirect object, recording its offset."""
+        if number > len(self._offsets):
+            self._offsets.extend([None] * (number - len(self._offsets)))
+        self._offsets[number - 1] = self._out.tell()
+        self._out.write(b'%d 0 obj' % number + body + b'endobj\n')
+
+    def append(self, path):
+        """Copy every page of a part PDF to the end of the output."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        startxref = int(re.search(rb'startxref\s+(\d+)\s+%%EOF\s*$', data).group(1))
+        xref, trailer = data[startxref:].split(b'trailer', 1)
+        offsets = {}
+        tokens = xref.split()[1:]
+        position = 0
+        while position < len(tokens):
+            first, count = int(tokens[position]), int(tokens[position + 1])
+            position += 2
+            for number in range(first, first + count):
+                if tokens[position + 2] == b'n':
+                    offsets[number] = int(tokens[position])
+                position += 3
+        bodies = {}
+        ends = sorted(offsets.values()) + [startxref]
+        for number, offset in offsets.items():
+            end = ends[ends.index(offset) + 1]
+            header = re.match(rb'\s*\d+ \d+ obj', data[offset:end])
+            bodies[number] = data[offset + header.end():data.rindex(b'endobj', offset, end)]
+        del data
+
+        catalog = int(re.search(rb'/Root (\d+) 0 R', trailer).group(1))
+        info = re.search(rb'/Info (\d+) 0 R', trailer)
+        page_tree = int(re.search(rb'/Pages (\d+) 0 R', bodies[catalog]).group(1))
+        kept = sorted(number for number in bodies if number not in (catalog, info and int(info.group(1))))
+        first_number = len(self._offsets) + 1
+        numbers = {old: first_number + index for index, old in enumerate(kept)}
+
+        def renumber(match):
+            new = numbers.get(int(match.group(1)))
+            return b'null' if new is None else b'%d 0 R' % new
+
+        for old in kept:
+            body = bodies.pop(old)
+            stream = PDF_STREAM_START_PATTERN.search(body)
+            split = stream.start() if stream else len(body)
+            head = PDF_REFERENCE_PATTERN.sub(renumber, body[:split])
+            if old == page_tree:
+                head = head.replace(b'<<', b'<< /Parent %d 0 R' % self.ROOT, 1)
+                self._page_count += int(re.search(rb'/Count (\d+)', head).group(1))
+                self._page_trees.append(numbers[old])
+            self._write_object(numbers[old], head + body[split:])
+
+    def close(self):
+        """Write the shared page tree, catalog, document info and cross-reference table."""
+        kids = ' '.join(f"{number} 0 R" for number in self._page_trees)
+        self._write_object(self.ROOT, f"\n<< /Type /Pages /Kids [ {kids} ] /Count {self._page_count} >>\n".encode('latin-1'))
+        self._write_object(self.CATALOG, f"\n<< /Type /Catalog /Pages {self.ROOT} 0 R /PageMode /UseNone >>\n".encode('latin-1'))
+        info = f"/Title {pdf_string(self._title)} " if self._title else ""
+        self._write_object(self.INFO, f"\n<< {info}/Producer (ReportLab PDF Library) >>\n".encode('latin-1'))
+        xref_offset = self._out.tell()
+        size = len(self._offsets) + 1
+        self._out.write(b'xref\n0 %d\n0000000000 65535 f \n' % size)
+        for offset in self._offsets:
+            self._out.write(b'%010d 00000 n \n' % offset)
+        self._out.write(b'trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                        % (size, self.CATALOG, self.INFO, xref_offset))
+
+def write_consolidated_pdf(path, chains, critical_risks, non_critical_risks, load_responses):
+    """Write one PDF covering every chain, laying out and saving one chain at a time.
+
+    Each chain is rendered to a part file on its own and then appended to
+    the report, so reportlab never holds more than one chain's pages.
+    load_responses(chain) returns that chain's answers keyed by risk name;
+    it is called once per chain, in order.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    
+    styles = pdf_styles()
+    
+    def chain_section(index, chain):
+        content = [] if index else [Paragraph(CONSOLIDATED_TITLE, styles['title'])]
+        content.append(Paragraph(escape(f"{chain['name']} ({chain['symbol']})"), styles['heading1']))
+        if chain.get('explorer_url'):
+            url = escape(chain['explorer_url'], {'"': '&quot;'})
+            content.append(Paragraph(f'Block Explorer: <link href="{url}" color="blue"><u>{url}</u></link>', styles['normal']))
+        responses = load_responses(chain)
+        for heading, risks in report_sections(critical_risks, non_critical_risks):
+            content.append(Paragraph(heading, styles['heading2']))
+            for risk in risks:
+                content.append(Paragraph(escape(risk['name']), styles['heading3']))
+                analysis = responses.get(risk['name'])
+                if analysis and analysis.strip():
+                    for text, is_code in answer_paragraphs(analysis):
+                        markup = render_pdf_markup(parse_inline_markdown(text))
+                        content.append(Paragraph(markup, styles['code'] if is_code else styles['normal']))
+                else:
+                    content.append(Paragraph("No analysis available", styles['normal']))
+                content.append(Spacer(1, 12))
+        return content
+    
+    def write(tmp_path):
+        part_path = tmp_path + '.part'
+        try:
+            with open(tmp_path, 'wb') as out:
+                pdf = PdfConcatenator(out, title=CONSOLIDATED_TITLE)
+                # Every part starts on a new page, so chains need no page breaks
+                sections = (chain_section(index, chain) for index, chain in enumerate(chains))
+                for content in sections if chains else [[Paragraph(CONSOLIDATED_TITLE, styles['title'])]]:
+                    doc = SimpleDocTemplate(part_path, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72,
+                                            pageCompression=1)
+                    doc.build(content)
+                    pdf.append(part_path)
+                    # reportlab's document, canvas and page objects reference each other; without a
+                    # collection here every finished part stays in memory until the cyclic GC gets to it
+                    del doc, content
+                    gc.collect()
+                pdf.close()
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+    
+    write_atomically(path, write)
+
+DOCX_TEMPLATE_SKIPPED_PARTS = ('word/document.xml', 'word/_rels/document.xml.rels')
+DOCX_HYPERLINK_RELATIONSHIP = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink"
+
+def docx_text(text):
+    """Escape text for a WordprocessingML text node."""
+    return escape(XML_INVALID_CHARS.sub('', text))
+
+def docx_paragraph(runs, style=None, center=False):
+    """WordprocessingML for one paragraph made of already rendered runs."""
+    properties = ''
+    if style or center:
+        properties = '<w:pPr>' + (f'<w:pStyle w:val="{style}"/>' if style else '') + ('<w:jc w:val="center"/>' if center else '') + '</w:pPr>'
+    return f'<w:p>{properties}{runs}</w:p>'
+
+def docx_run(text, bold=False, italic=False, code=False, link=False):
+    """WordprocessingML for one run of text."""
+    properties = ''
+    if code:
+        properties += '<w:rFonts w:ascii="Courier New" w:hAnsi="Courier New"/>'
+    if bold:
+        properties += '<w:b/>'
+    if italic:
+        properties += '<w:i/>'
+    if link:
+        properties += '<w:color w:val="0000FF"/><w:u w:val="single"/>'
+    if code:
+        properties += '<w:sz w:val="20"/>'
+    properties = f'<w:rPr>{properties}</w:rPr>' if properties else ''
+    return f'<w:r>{properties}<w:t xml:space="preserve">{docx_text(text)}</w:t></w:r>'
+
+class DocxHyperlinks:
+    """Relationship ids of the external links in a streamed document, one per distinct URL."""
+
+    def __init__(self, first_id):
+        self._next_id = first_id
+        self.ids = {}
+
+    def rel_id(self, url):
+        """Relationship id for a URL, allocating one the first time it is seen."""
+        if url not in self.ids:
+            self.ids[url] = f"rId{self._next_id}"
+            self._next_id += 1
+        return self.ids[url]
+
+    def link(self, text, url):
+        """WordprocessingML for a hyperlink run."""
+        return f'<w:hyperlink r:id="{self.rel_id(url)}">{docx_run(text, link=True)}</w:hyperlink>'
+
+def docx_answer_paragraph(text, is_code, hyperlinks):
+    """WordprocessingML for one answer paragraph, mirroring add_formatted_paragraph."""
+    spans = parse_inline_markdown(text)
+    if is_code:
+        return docx_paragraph(docx_run(''.join(span.text for span in spans), code=True))
+    runs = []
+    for span in spans:
+        if span.url is not None:
+            runs.append(hyperlinks.link(span.text, span.url))
+        else:
+            runs.append(docx_run(span.text, span.bold, span.italic, span.code))
+    return docx_paragraph(''.join(runs))
+
+def write_consolidated_docx(path, chains, critical_risks, non_critical_risks, load_responses):
+    """Write one DOCX covering every chain, streaming document.xml into the package chain by chain.
+
+    The styles and other package parts come from python-docx's default
+    template, so headings look the same as in generate_docx reports.
+    load_responses(chain) returns that chain's answers keyed by risk name.
+    """
+    import docx
+    
+    template_path = os.path.join(os.path.dirname(docx.__file__), 'templates', 'default.docx')
+    
+    def write(tmp_path):
+        with zipfile.ZipFile(template_path) as template, zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as package:
+            for item in template.infolist():
+                if item.filename not in DOCX_TEMPLATE_SKIPPED_PARTS:
+                    package.writestr(item, template.read(item.filename))
+            template_document = template.read('word/document.xml').decode('utf-8')
+            template_rels = template.read('word/_rels/document.xml.rels').decode('utf-8')
+            
+            head, tail = template_document.split('<w:body>', 1)
+            section_properties = tail[tail.index('<w:sectPr'):tail.index('</w:body>')]
+            used_ids = [int(rel_id) for rel_id in re.findall(r'Id="rId(\d+)"', template_rels)]
+            hyperlinks = DocxHyperlinks(max(used_ids, default=0) + 1)
+            
+            with package.open('word/document.xml', 'w', force_zip64=True) as document:
+                def emit(xml):
+                    document.write(xml.encode('utf-8'))
+                
+                emit(head + '<w:body>')
+                emit(docx_paragraph(docx_run(CONSOLIDATED_TITLE), style='Title', center=True))
+                for index, chain in enumerate(chains):
+                    if index:
+                        emit('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+                    emit(docx_paragraph(docx_run(f"{chain['name']} ({chain['symbol']})"), style='Heading1'))
+                    if chain.get('explorer_url'):
+                        emit(docx_paragraph(docx_run("Block Explorer: ") + hyperlinks.link(chain['explorer_url'], chain['explorer_url'])))
+                    responses = load_responses(chain)
+                    for heading, risks in report_sections(critical_risks, non_critical_risks):
+                        emit(docx_paragraph(docx_run(heading), style='Heading2'))
+                        for risk in risks:
+                            emit(docx_paragraph(docx_run(risk['name']), style='Heading3'))
+                            analysis = responses.get(risk['name'])
+                            if analysis and analysis.strip():
+                                for text, is_code in answer_paragraphs(analysis):
+                                    emit(docx_answer_paragraph(text, is_code, hyperlinks))
+                            else:
+                                emit(docx_paragraph(docx_run("No analysis available")))
+                            emit(docx_paragraph(''))
+                emit(section_properties + '</w:body></w:document>')
+            
+            links = ''.join(
+                f'<Relationship Id="{rel_id}" Type="{DOCX_HYPERLINK_RELATIONSHIP}" Target="{escape(url, {chr(34): "&quot;"})}" TargetMode="External"/>'
+                for url, rel_id in hyperlinks.ids.items()
+            )
+            package.writestr('word/_rels/document.xml.rels', template_rels.replace('</Relationships>', links + '</Relationships>'))
+    
+    write_atomically(path, write)
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Constants
+CACHE_FILE = os.path.join(os.path.dirname(__file__), 'data', 'response_cache.sqlite3')
+DEFAULT_TTL_SECONDS = int(os.getenv("CB_GPT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+DEFAULT_MAX_ENTRIES = int(os.getenv("CB_GPT_CACHE_MAX_ENTRIES", "5000"))
+
+def make_cache_key(model_id, system_prompt, user_prompt, block_explorer_url=None):
+    """Build a content-addressed cache key for a CB-GPT request."""
+    payload = json.dumps([model_id, system_prompt, user_prompt, block_explorer_url or ""], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """SQLite-backed cache of CB-GPT answers with per-entry TTL and an LRU size cap."""
+
+    def __init__(self, path=CACHE_FILE, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        """Open (or create) the cache database."""
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+
+    def get(self, key):
+        """Return the cached answer for a key, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < now:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value, ttl_seconds=None):
+        """Store an answer and evict expired or least recently used entries."""
+        if not value:
+            return
+        now = time.time()
+        expires_at = now + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, now, expires_at, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        """Drop expired entries, then the least recently used ones beyond the size cap."""
+        self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def clear(self):
+        """Remove every cached answer and reset the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
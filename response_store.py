@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Constants
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+STORE_DB_FILE = os.path.join(DATA_DIR, 'responses.sqlite3')
+STORE_FILES_DIR = os.path.join(DATA_DIR, 'responses')
+
+class ResponseStore(ABC):
+    """Per-chain, per-session storage of risk responses.
+
+    Every record is addressed by (chain, session id, risk name) and written
+    on its own, so saving one risk never rewrites the others. Records carry
+    the fingerprint of the prompt they answer so stale ones can be re-queried.
+    """
+
+    @abstractmethod
+    def load(self, chain, session_id):
+        """Return all stored responses for a chain and session, keyed by risk name."""
+
+    @abstractmethod
+    def load_fingerprints(self, chain, session_id):
+        """Return the prompt fingerprint of every stored response, keyed by risk name."""
+
+    @abstractmethod
+    def load_updated_at(self, chain, session_id):
+        """Return when each stored response was last written (epoch seconds), keyed by risk name."""
+
+    @abstractmethod
+    def upsert(self, chain, session_id, risk_name, response, fingerprint=None, updated_at=None):
+        """Atomically insert or replace a single risk response; updated_at defaults to now."""
+
+    @abstractmethod
+    def clear(self, chain, session_id):
+        """Delete every response stored for a chain and session."""
+
+class SqliteResponseStore(ResponseStore):
+    """SQLite response store using write-ahead logging for durable single-row upserts."""
+
+    def __init__(self, path=STORE_DB_FILE):
+        """Open (or create) the store database."""
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                chain TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                risk_name TEXT NOT NULL,
+                response TEXT,
+                updated_at REAL NOT NULL,
+                fingerprint TEXT,
+                PRIMARY KEY (chain, session_id, risk_name)
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(responses)")}
+        if 'fingerprint' not in columns:
+            # Stores created before fingerprints existed; their records count as stale
+            self._conn.execute("ALTER TABLE responses ADD COLUMN fingerprint TEXT")
+
+    def load(self, chain, session_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT risk_name, response FROM responses WHERE chain = ? AND session_id = ?",
+                (chain, session_id)
+            ).fetchall()
+        return dict(rows)
+
+    def load_fingerprints(self, chain, session_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT risk_name, fingerprint FROM responses WHERE chain = ? AND session_id = ?",
+                (chain, session_id)
+            ).fetchall()
+        return dict(rows)
+
+    def load_updated_at(self, chain, session_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT risk_name, updated_at FROM responses WHERE chain = ? AND session_id = ?",
+                (chain, session_id)
+            ).fetchall()
+        return dict(rows)
+
+    def upsert(self, chain, session_id, risk_name, response, fingerprint=None, updated_at=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO responses (chain, session_id, risk_name, response, updated_at, fingerprint) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (chain, session_id, risk_name) "
+                "DO UPDATE SET response = excluded.response, updated_at = excluded.updated_at, "
+                "fingerprint = excluded.fingerprint",
+                (chain, session_id, risk_name, response, updated_at or time.time(), fingerprint)
+            )
+
+    def clear(self, chain, session_id):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM responses WHERE chain = ? AND session_id = ?",
+                (chain, session_id)
+            )
+
+class FileResponseStore(ResponseStore):
+    """One JSON file per record, written to a temp file and renamed into place."""
+
+    def __init__(self, root=STORE_FILES_DIR):
+        """Use the given directory as the store root."""
+        self.root = root
+
+    def _namespace_dir(self, chain, session_id):
+        """Directory holding every record of a chain and session."""
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', chain).strip('_') or 'chain'
+        digest = hashlib.sha256(chain.encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.root, f"{slug}-{digest}", re.sub(r'[^A-Za-z0-9_-]+', '_', session_id))
+
+    def _load_records(self, chain, session_id):
+        """Read every record of a chain and session."""
+        directory = self._namespace_dir(chain, session_id)
+        records = []
+        if not os.path.isdir(directory):
+            return records
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, filename), 'r') as f:
+                    record = json.load(f)
+                records.append((record['risk_name'], record['response'], record.get('fingerprint'), record.get('updated_at')))
+            except (OSError, json.JSONDecodeError, KeyError) as e:
+                logger.error(f"Skipping unreadable response record {filename}: {str(e)}")
+        return records
+
+    def load(self, chain, session_id):
+        return {risk_name: response for risk_name, response, _, _ in self._load_records(chain, session_id)}
+
+    def load_fingerprints(self, chain, session_id):
+        return {risk_name: fingerprint for risk_name, _, fingerprint, _ in self._load_records(chain, session_id)}
+
+    def load_updated_at(self, chain, session_id):
+        return {risk_name: updated_at for risk_name, _, _, updated_at in self._load_records(chain, session_id)}
+
+    def upsert(self, chain, session_id, risk_name, response, fingerprint=None, updated_at=None):
+        directory = self._namespace_dir(chain, session_id)
+        os.makedirs(directory, exist_ok=True)
+        filename = hashlib.sha256(risk_name.encode('utf-8')).hexdigest()[:16] + '.json'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({
+                    "risk_name": risk_name,
+                    "response": response,
+                    "fingerprint": fingerprint,
+                    "updated_at": updated_at or time.time()
+                }, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(directory, filename))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def clear(self, chain, session_id):
+        directory = self._namespace_dir(chain, session_id)
+        if not os.path.isdir(directory):
+            return
+        for filename in os.listdir(directory):
+            os.remove(os.path.join(directory, filename))
+
+STORE_BACKENDS = {
+    "sqlite": SqliteResponseStore,
+    "files": FileResponseStore,
+}
+
+def get_response_store(backend=None):
+    """Create the response store selected by name or the RESPONSE_STORE_BACKEND env var."""
+    backend = backend or os.getenv("RESPONSE_STORE_BACKEND", "sqlite")
+    try:
+        return STORE_BACKENDS[backend]()
+    except KeyError:
+        raise ValueError(f"Unknown response store backend: {backend}")
@@ -0,0 +1,194 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from answer_index import prompt_hash
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Constants
+RESULTS_INDEX_FILE = os.path.join(os.path.dirname(__file__), 'data', 'results_index.sqlite3')
+VERDICTS = ('pass', 'fail', 'unknown')
+DEFAULT_QUERY_LIMIT = 1000
+
+# The verdict line the security prompt asks every answer to end with, e.g. "Verdict: FAIL" or "**Verdict:** PASS"
+VERDICT_LINE_PATTERN = re.compile(r'^[\s*_#>-]*verdict[*_\s]*:[*_\s]*(pass|fail|unknown)[*_.\s]*$', re.IGNORECASE | re.MULTILINE)
+# Explicit verdict statements in free text, strongest first, for answers given before the verdict line was asked for
+VERDICT_PATTERNS = (
+    re.compile(r'\b(?:verdict|result|status|assessment|conclusion)[*_\s]*[:–-][*_\s]*(pass(?:ed|es)?|fail(?:ed|s)?)\b', re.IGNORECASE),
+    re.compile(r'(?:✅|✔️?)\s*\**\s*(pass(?:ed|es)?)\b|(?:❌|✖️?)\s*\**\s*(fail(?:ed|s)?)\b', re.IGNORECASE),
+    re.compile(r'\b(PASS(?:ED)?|FAIL(?:ED)?)\b'),
+)
+
+def extract_verdict(response):
+    """Pass, fail or unknown, read from the verdict line of an answer.
+
+    Without a verdict line, falls back to explicit verdict language in the
+    text; answers that state no verdict, or both, are unknown rather than
+    guessed.
+    """
+    if not response:
+        return 'unknown'
+    verdict_lines = VERDICT_LINE_PATTERN.findall(response)
+    if verdict_lines:
+        # The last one is the answer's conclusion
+        return verdict_lines[-1].lower()
+    for pattern in VERDICT_PATTERNS:
+        found = {
+            'pass' if word.lower().startswith('pass') else 'fail'
+            for match in pattern.finditer(response)
+            for word in match.groups() if word
+        }
+        if len(found) == 1:
+            return found.pop()
+        if found:
+            return 'unknown'
+    return 'unknown'
+
+class ResultsIndex:
+    """Local SQLite index of every completed risk answer across chains.
+
+    One row per answer with its chain, risk, criticality, time, prompt
+    hash, latency and extracted verdict, for portfolio queries such as
+    "which chains failed No Central Authority in the last month". The
+    answer text itself stays in the response store.
+    """
+
+    def __init__(self, path=RESULTS_INDEX_FILE):
+        """Open (or create) the index database."""
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS assessments (
+                id INTEGER PRIMARY KEY,
+                chain TEXT NOT NULL,
+                risk TEXT NOT NULL,
+                is_critical INTEGER NOT NULL,
+                verdict TEXT NOT NULL,
+                answered_at REAL NOT NULL,
+                prompt_hash TEXT,
+                latency REAL,
+                model TEXT,
+                source TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS assessments_by_risk ON assessments (risk, answered_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS assessments_by_chain ON assessments (chain, risk, answered_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS assessments_by_time ON assessments (answered_at)")
+
+    def _row(self, chain, risk, response, latency=None, model=None, source=None, answered_at=None):
+        """Column values for one answer."""
+        return (
+            chain,
+            risk['name'],
+            int(bool(risk.get('is_critical'))),
+            extract_verdict(response),
+            answered_at or time.time(),
+            prompt_hash(risk['prompt']) if risk.get('prompt') else None,
+            latency,
+            model,
+            source,
+        )
+
+    def record(self, chain, risk, response, latency=None, model=None, source=None, answered_at=None):
+        """Index one completed answer; failed (empty) answers are not indexed."""
+        self.record_many([(chain, risk, response, latency, model, source, answered_at)])
+
+    def record_many(self, answers):
+        """Index several answers, given as (chain, risk, response, latency, model, source, answered_at) tuples, in one transaction."""
+        rows = [self._row(*answer) for answer in answers if answer[2]]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO assessments (chain, risk, is_critical, verdict, answered_at, prompt_hash, latency, model, source) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _filters(self, risks=None, chain_search=None, verdicts=None, critical_only=False, since=None):
+        """WHERE clause and parameters for the dashboard filters, applied to the latest answers."""
+        clauses, params = [], []
+        if risks:
+            clauses.append(f"risk IN ({', '.join('?' * len(risks))})")
+            params.extend(risks)
+        if chain_search:
+            clauses.append("chain LIKE ? ESCAPE '\\'")
+            params.append('%' + re.sub(r'([%_\\])', r'\\\1', chain_search) + '%')
+        if verdicts:
+            clauses.append(f"verdict IN ({', '.join('?' * len(verdicts))})")
+            params.extend(verdicts)
+        if critical_only:
+            clauses.append("is_critical = 1")
+        if since:
+            clauses.append("answered_at >= ?")
+            params.append(since)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _latest(self):
+        """Subquery keeping only the most recent answer of each chain and risk."""
+        return (
+            "(SELECT a.* FROM assessments a "
+            "JOIN (SELECT chain, risk, MAX(answered_at) AS answered_at FROM assessments GROUP BY chain, risk) latest "
+            "USING (chain, risk, answered_at))"
+        )
+
+    def query(self, risks=None, chain_search=None, verdicts=None, critical_only=False, since=None, latest_only=True,
+              limit=DEFAULT_QUERY_LIMIT):
+        """Matching answers, newest first; by default only each chain's latest answer per risk."""
+        where, params = self._filters(risks, chain_search, verdicts, critical_only, since)
+        source = self._latest() if latest_only else "assessments"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT chain, risk, is_critical, verdict, answered_at, prompt_hash, latency, model, source FROM {source}"
+                f"{where} ORDER BY answered_at DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def summary(self, risks=None, chain_search=None, verdicts=None, critical_only=False, since=None, latest_only=True):
+        """Per-risk verdict counts and latency over the matching answers."""
+        where, params = self._filters(risks, chain_search, verdicts, critical_only, since)
+        source = self._latest() if latest_only else "assessments"
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT risk, MAX(is_critical) AS is_critical, COUNT(DISTINCT chain) AS chains, "
+                "SUM(verdict = 'pass') AS pass, SUM(verdict = 'fail') AS fail, SUM(verdict = 'unknown') AS unknown, "
+                f"ROUND(AVG(latency), 2) AS avg_latency_s FROM {source}{where} "
+                "GROUP BY risk ORDER BY fail DESC, risk",
+                params
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def chains(self, risks=None, chain_search=None, verdicts=None, critical_only=False, since=None, latest_only=True):
+        """Names of the chains with matching answers, alphabetically."""
+        where, params = self._filters(risks, chain_search, verdicts, critical_only, since)
+        source = self._latest() if latest_only else "assessments"
+        with self._lock:
+            return [row[0] for row in self._conn.execute(f"SELECT DISTINCT chain FROM {source}{where} ORDER BY chain", params)]
+
+    def risk_names(self):
+        """Every risk with at least one indexed answer."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT risk FROM assessments ORDER BY risk")]
+
+    def stats(self):
+        """Total indexed answers and distinct chains."""
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT chain) FROM assessments").fetchone()
+        return {"answers": row[0], "chains": row[1]}
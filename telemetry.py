@@ -0,0 +1,238 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Constants
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+TELEMETRY_FILE = os.path.join(DATA_DIR, 'telemetry.jsonl')
+METRICS_FILE = os.path.join(DATA_DIR, 'cb_gpt_metrics.prom')
+HISTORY_SIZE = int(os.getenv("CB_GPT_TELEMETRY_HISTORY", "5000"))
+# Once the telemetry file grows past this, it is compacted to the in-memory history
+TELEMETRY_MAX_BYTES = int(os.getenv("CB_GPT_TELEMETRY_MAX_BYTES", str(8 * 2**20)))
+METRICS_FLUSH_INTERVAL_SECONDS = 5.0
+TAIL_READ_BYTES = 64 * 1024
+
+# Prometheus metric families: name -> (type, help)
+METRIC_FAMILIES = {
+    "cb_gpt_requests_total": ("counter", "CB-GPT calls by risk, cache outcome and status"),
+    "cb_gpt_retries_total": ("counter", "Retried CB-GPT attempts by risk"),
+    "cb_gpt_hedges_total": ("counter", "Hedged CB-GPT calls by risk and which attempt answered"),
+    "cb_gpt_coalesced_total": ("counter", "Calls that shared an identical request already in flight, by risk"),
+    "cb_gpt_service_latency_seconds_total": ("counter", "Total CB-GPT service latency by risk"),
+    "cb_gpt_queue_wait_seconds_total": ("counter", "Total time calls waited before being sent, by risk"),
+    "cb_gpt_response_bytes_total": ("counter", "Response bytes received by risk"),
+    "cb_gpt_prompt_tokens_total": ("counter", "Prompt tokens reported by the service, by risk"),
+    "cb_gpt_completion_tokens_total": ("counter", "Completion tokens reported by the service, by risk"),
+}
+
+def _percentile(samples, pct):
+    """Nearest-rank percentile, or 0 for no samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, int(round(pct / 100 * len(ordered))) - 1)]
+
+def _escape_label(value):
+    """Escape a Prometheus label value."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Telemetry:
+    """Per-call CB-GPT telemetry with per-risk aggregates and Prometheus export.
+
+    Each finished call is kept in a bounded in-memory history and appended
+    to a JSONL file, whose tail is reloaded on start so aggregates span
+    runs; the file is compacted to that history once it outgrows max_bytes.
+    The Prometheus counters are cumulative over the calls this process
+    finished, so they never decrease as old records leave the history.
+    Pass path=None to keep telemetry in memory only.
+    """
+
+    def __init__(self, path=TELEMETRY_FILE, metrics_path=METRICS_FILE, history=HISTORY_SIZE, max_bytes=TELEMETRY_MAX_BYTES):
+        self.path = path
+        self.metrics_path = metrics_path
+        self.max_bytes = max_bytes
+        self._records = deque(maxlen=history)
+        self._counters = {name: {} for name in METRIC_FAMILIES}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._file_bytes = 0
+        # Size right after the last compaction; a history larger than max_bytes must not compact on every call
+        self._compacted_bytes = 0
+        if path and os.path.exists(path):
+            self._load_history()
+
+    def _read_tail(self, f):
+        """Read the last lines of the telemetry file, enough to refill the history."""
+        end = f.seek(0, os.SEEK_END)
+        self._file_bytes = end
+        data = b""
+        start = end
+        while start > 0 and data.count(b'\n') <= self._records.maxlen:
+            start = max(0, start - TAIL_READ_BYTES)
+            f.seek(start)
+            data = f.read(end - start)
+        lines = data.split(b'\n')
+        # Unless the whole file was read, the first line is only the end of a record
+        return [line for line in (lines[1:] if start > 0 else lines) if line.strip()]
+
+    def _load_history(self):
+        """Reload the most recent records from the tail of the telemetry file."""
+        try:
+            with open(self.path, 'rb') as f:
+                lines = self._read_tail(f)
+        except OSError as e:
+            logger.error(f"Error loading telemetry history: {str(e)}")
+            return
+        for line in lines[-self._records.maxlen:]:
+            try:
+                self._records.append(json.loads(line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+
+    def _compact(self):
+        """Rewrite the telemetry file with just the in-memory history; called with the lock held."""
+        directory = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            for record in self._records:
+                f.write(json.dumps(record) + '\n')
+            self._file_bytes = self._compacted_bytes = f.tell()
+        os.replace(tmp_path, self.path)
+
+    def begin(self, risk_name=None, queued_at=None):
+        """Start a record for one CB-GPT call."""
+        now = time.time()
+        return {
+            "risk": risk_name or "unknown",
+            "chain": None,
+            "timestamp": now,
+            "queued_at": queued_at if queued_at is not None else now,
+            "queue_wait": 0.0,
+            "service_latency": 0.0,
+            "latency": 0.0,
+            "response_bytes": 0,
+            "prompt_tokens": None,
+            "completion_tokens": None,
+            "cache": "off",
+            "retries": 0,
+            "hedge": "none",
+            "coalesced": False,
+            "model": None,
+            "reasoning_effort": None,
+            "downgraded": False,
+            "ok": False,
+            "error": None,
+        }
+
+    def finish(self, record):
+        """Complete a record and add it to the history."""
+        record["latency"] = time.time() - record["queued_at"]
+        with self._lock:
+            self._records.append(record)
+            self._count(record)
+            if self.path:
+                try:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    line = json.dumps(record) + '\n'
+                    with open(self.path, 'a') as f:
+                        f.write(line)
+                    self._file_bytes += len(line.encode('utf-8'))
+                    if self._file_bytes > max(self.max_bytes, 2 * self._compacted_bytes):
+                        self._compact()
+                except OSError as e:
+                    logger.error(f"Error writing telemetry: {str(e)}")
+            flush_due = self.metrics_path and time.time() - self._last_flush >= METRICS_FLUSH_INTERVAL_SECONDS
+        if flush_due:
+            self.write_metrics_file()
+
+    def records(self):
+        """Snapshot of the recorded calls, oldest first."""
+        with self._lock:
+            return list(self._records)
+
+    def aggregates(self):
+        """Per-risk aggregates over the recorded calls."""
+        by_risk = {}
+        for record in self.records():
+            by_risk.setdefault(record["risk"], []).append(record)
+
+        rows = []
+        for risk, records in sorted(by_risk.items()):
+            service_calls = [r for r in records if r["cache"] != "hit" and not r.get("coalesced")]
+            latencies = [r["service_latency"] for r in service_calls if r["ok"]]
+            rows.append({
+                "risk": risk,
+                "calls": len(records),
+                "errors": sum(1 for r in records if not r["ok"]),
+                "cache_hits": sum(1 for r in records if r["cache"] == "hit"),
+                "retries": sum(r["retries"] for r in records),
+                "hedges": sum(1 for r in records if r.get("hedge", "none") != "none"),
+                "hedge_wins": sum(1 for r in records if r.get("hedge") == "won"),
+                "coalesced": sum(1 for r in records if r.get("coalesced")),
+                "p50_latency_s": round(_percentile(latencies, 50), 3),
+                "p95_latency_s": round(_percentile(latencies, 95), 3),
+                "avg_queue_wait_s": round(sum(r["queue_wait"] for r in service_calls) / len(service_calls), 3) if service_calls else 0.0,
+                "avg_response_bytes": int(sum(r["response_bytes"] for r in records) / len(records)),
+                "prompt_tokens": sum(r["prompt_tokens"] or 0 for r in records),
+                "completion_tokens": sum(r["completion_tokens"] or 0 for r in records),
+            })
+        return rows
+
+    def _count(self, record):
+        """Add a finished call to the cumulative counters; called with the lock held."""
+        samples = self._counters
+        risk = _escape_label(record["risk"])
+        status = "ok" if record["ok"] else "error"
+        key = f'risk="{risk}",cache="{record["cache"]}",status="{status}"'
+        samples["cb_gpt_requests_total"][key] = samples["cb_gpt_requests_total"].get(key, 0) + 1
+        hedge = record.get("hedge", "none")
+        if hedge != "none":
+            key = f'risk="{risk}",winner="{"hedge" if hedge == "won" else "primary"}"'
+            samples["cb_gpt_hedges_total"][key] = samples["cb_gpt_hedges_total"].get(key, 0) + 1
+        key = f'risk="{risk}"'
+        for name, value in (
+            ("cb_gpt_retries_total", record["retries"]),
+            ("cb_gpt_coalesced_total", int(bool(record.get("coalesced")))),
+            ("cb_gpt_service_latency_seconds_total", record["service_latency"]),
+            ("cb_gpt_queue_wait_seconds_total", record["queue_wait"]),
+            ("cb_gpt_response_bytes_total", record["response_bytes"]),
+            ("cb_gpt_prompt_tokens_total", record["prompt_tokens"] or 0),
+            ("cb_gpt_completion_tokens_total", record["completion_tokens"] or 0),
+        ):
+            samples[name][key] = samples[name].get(key, 0) + value
+
+    def to_prometheus(self):
+        """Render the per-risk counters in the Prometheus text exposition format."""
+        with self._lock:
+            samples = {name: dict(values) for name, values in self._counters.items()}
+
+        lines = []
+        for name, (metric_type, help_text) in METRIC_FAMILIES.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in sorted(samples[name].items()):
+                lines.append(f"{name}{{{labels}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_metrics_file(self, path=None):
+        """Atomically write the Prometheus metrics to a file (e.g. for a textfile collector)."""
+        path = path or self.metrics_path
+        if not path:
+            return
+        self._last_flush = time.time()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing metrics file: {str(e)}")
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# The modules under test live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_cb_gpt import FakeCbGptServiceApiClient, make_fake_client  # noqa: E402
+
+@pytest.fixture
+def make_client():
+    """Factory for clients around a fake service that share no cache, single-flight layer or telemetry files.
+
+    Hedging and single-flight are off unless asked for, and the default
+    service answers at once.
+    """
+    def make(service=None, cache=None, single_flight=False, hedging=False):
+        service = service or FakeCbGptServiceApiClient(latency="constant", latency_mean=0.0)
+        return make_fake_client(service, cache, single_flight=single_flight, hedging=hedging)
+    return make
@@ -0,0 +1,36 @@
+"""Fact sheets are gathered once per chain, however many providers ask at once."""
+import threading
+import time
+
+import pytest
+
+from fact_sheet import CbGptFactSheetProvider, FactSheetProvider
+
+class SlowClient:
+    """Stands in for CbGptClient, counting fact sheet calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def analyze_blockchain_security(self, blockchain_name, prompt, block_explorer_url=None, risk_name=None, verdict=True):
+        self.calls += 1
+        time.sleep(0.2)
+        return f"Fact sheet for {blockchain_name}"
+
+def test_fact_sheet_provider_is_abstract():
+    with pytest.raises(TypeError):
+        FactSheetProvider()
+
+def test_concurrent_providers_gather_each_chain_once(tmp_path):
+    client = SlowClient()
+    # e.g. one provider per app session, all sharing the fact sheet directory
+    providers = [CbGptFactSheetProvider(client, directory=str(tmp_path)) for _ in range(4)]
+    results = []
+    threads = [threading.Thread(target=lambda provider=provider: results.append(provider.get("Test Chain"))) for provider in providers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert client.calls == 1
+    assert results == ["Fact sheet for Test Chain"] * 4
@@ -0,0 +1,77 @@
+"""Background analysis jobs against the fake CB-GPT backend."""
+import os
+import time
+
+import pytest
+
+import cb_gpt_client
+from cb_gpt_client import GenerationSettings
+from fake_cb_gpt import FakeCbGptServiceApiClient
+from job_queue import JobQueue, JobWorkerPool
+from response_store import SqliteResponseStore
+
+CHAIN, SESSION = "Test Chain", "test-session"
+RISKS = [{"name": f"Risk {index}", "prompt": f"Is risk {index} mitigated?", "is_critical": True} for index in range(3)]
+
+def run_job(tmp_path, client, risks=RISKS, **options):
+    """Run one job for the risks to completion, returning it and the response store."""
+    store = SqliteResponseStore(os.path.join(tmp_path, 'responses.sqlite3'))
+    pool = JobWorkerPool(JobQueue(os.path.join(tmp_path, 'jobs.sqlite3')), store, client_factory=lambda: client, workers=1).start()
+    try:
+        job_id = pool.jobs.submit(CHAIN, SESSION, risks, **options)
+        deadline = time.monotonic() + 10
+        while pool.jobs.get(job_id)['status'] in ('queued', 'running') and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return pool.jobs.get(job_id), store
+    finally:
+        pool.stop()
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_failed_risks_are_not_stored_as_analyzed(tmp_path, monkeypatch, stream, make_client):
+    monkeypatch.setattr(cb_gpt_client, "MAX_RETRIES", 0)
+    client = make_client(FakeCbGptServiceApiClient(latency="constant", latency_mean=0.0, error_rate=1.0))
+
+    job, store = run_job(tmp_path, client, stream=stream)
+
+    assert job['status'] == 'done' and job['completed'] == 3 and job['failed'] == 3
+    # The UI shows why each risk failed
+    assert sorted(job['risk_errors']) == [risk['name'] for risk in RISKS]
+    assert all("503" in error for error in job['risk_errors'].values())
+    # Nothing is stored under the current fingerprint, so the risks stay pending
+    assert store.load(CHAIN, SESSION) == {}
+    assert store.load_fingerprints(CHAIN, SESSION) == {}
+
+def test_answered_risks_are_stored_with_their_fingerprint(tmp_path, make_client):
+    client = make_client(FakeCbGptServiceApiClient(latency="constant", latency_mean=0.0))
+
+    job, store = run_job(tmp_path, client)
+
+    assert job['status'] == 'done' and job['failed'] == 0
+    answers = store.load(CHAIN, SESSION)
+    fingerprints = store.load_fingerprints(CHAIN, SESSION)
+    for risk in RISKS:
+        assert answers[risk['name']]
+        assert fingerprints[risk['name']] == client.risk_fingerprint(risk['prompt'], None, GenerationSettings.for_risk(risk))
+
+def test_interactive_workers_leave_refreshes_to_their_own_pool(tmp_path):
+    jobs = JobQueue(os.path.join(tmp_path, 'jobs.sqlite3'))
+    refresh_id = jobs.submit(CHAIN, "watchlist", RISKS, refresh=True)
+    session_id = jobs.submit(CHAIN, SESSION, RISKS)
+
+    assert jobs.claim("interactive", exclude_session_id="watchlist")['job_id'] == session_id
+    assert jobs.claim("interactive", exclude_session_id="watchlist") is None
+    assert jobs.claim("refresher", "watchlist")['job_id'] == refresh_id
+
+def test_downgraded_answers_are_stored_as_outdated(tmp_path, make_client):
+    risks = [dict(risk, is_critical=False) for risk in RISKS]
+    client = make_client(FakeCbGptServiceApiClient(latency="constant", latency_mean=0.0))
+    client.load_policy = "always"
+
+    job, store = run_job(tmp_path, client, risks)
+
+    assert job['status'] == 'done' and job['failed'] == 0
+    fingerprints = store.load_fingerprints(CHAIN, SESSION)
+    for risk in risks:
+        generation = GenerationSettings.for_risk(risk)
+        assert fingerprints[risk['name']] == client.downgraded_fingerprint(risk['prompt'], None, generation)
+        assert fingerprints[risk['name']] != client.risk_fingerprint(risk['prompt'], None, generation)
@@ -0,0 +1,184 @@
+"""Token bucket throttling, AIMD concurrency and retry backoff of CB-GPT calls."""
+import threading
+import time
+
+import pytest
+
+import cb_gpt_client
+import rate_limit
+from cb_gpt_client import CbGptError
+from fake_cb_gpt import FakeCbGptServiceApiClient, http_error
+from rate_limit import AdaptiveConcurrencyLimiter, TokenBucket, backoff_delay
+
+CHAIN = "Test Chain"
+PROMPT = "Is the validator set decentralized?"
+
+class ScriptedService(FakeCbGptServiceApiClient):
+    """Fake backend failing its first calls with the given HTTP statuses, then answering."""
+
+    def __init__(self, failures):
+        super().__init__(latency="constant", latency_mean=0.0)
+        self.failures = list(failures)
+
+    def generate_content(self, model_id, request_body, **kwargs):
+        if self.failures:
+            self.calls += 1
+            raise http_error(self.failures.pop(0))
+        return super().generate_content(model_id, request_body, **kwargs)
+
+class FakeClock:
+    """Stands in for the time module: sleeping only moves the clock forward, and every sleep is recorded."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Run the token bucket and retry backoff on a fake clock, so no test waits on them."""
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    monkeypatch.setattr(cb_gpt_client, "time", clock)
+    return clock
+
+@pytest.fixture
+def make_uncached_client(make_client, clock):
+    """Clients sending every call to the service, on the fake clock."""
+    return lambda service: make_client(service, cache=False)
+
+def test_token_bucket_allows_burst_then_throttles_to_rate(clock):
+    bucket = TokenBucket(rate=4, capacity=3)
+    for _ in range(3):
+        assert bucket.acquire(timeout=0)
+    assert clock.sleeps == []
+
+    assert not bucket.acquire(timeout=0)
+    for _ in range(4):
+        assert bucket.acquire()
+    # Four more tokens at 4 per second take a second, one wait of 0.25s each
+    assert clock.sleeps == [0.25] * 4
+
+def test_token_bucket_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+def test_concurrency_limiter_blocks_at_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial=2, maximum=4)
+    assert limiter.acquire(timeout=0) and limiter.acquire(timeout=0)
+    assert not limiter.acquire(timeout=0.01)
+
+    waiter = threading.Thread(target=limiter.acquire)
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while limiter.metrics()["waiting"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert waiter.is_alive() and limiter.saturated()
+    limiter.release()
+    waiter.join(timeout=1)
+    assert not waiter.is_alive()
+    assert limiter.metrics()["in_flight"] == 2
+
+def test_concurrency_limiter_halves_on_overload_and_grows_additively():
+    limiter = AdaptiveConcurrencyLimiter(initial=8, minimum=1, maximum=16)
+
+    limiter.acquire()
+    limiter.release(overloaded=True)
+    assert limiter.limit == 4 and limiter.saturated()
+
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(overloaded=True)
+    assert limiter.limit == 1
+
+    # About one more slot per window of successes: 1 -> 2 after one, 2 -> 3 after three more
+    limiter.acquire()
+    limiter.release()
+    assert limiter.limit == 2
+    for _ in range(2):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 2
+    limiter.acquire()
+    limiter.release()
+    assert limiter.limit == 3
+
+def test_concurrency_limiter_stays_within_bounds():
+    limiter = AdaptiveConcurrencyLimiter(initial=3, minimum=2, maximum=5)
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release(overloaded=True)
+    assert limiter.limit == 2
+    for _ in range(200):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 5
+    assert limiter.metrics()["overloads"] == 10 and limiter.metrics()["successes"] == 200
+
+def test_backoff_delay_is_jittered_and_capped():
+    for attempt, cap in ((1, 1.0), (2, 2.0), (3, 4.0), (10, 30.0)):
+        delays = [backoff_delay(attempt, base_delay=1.0, max_delay=30.0) for _ in range(200)]
+        assert all(0 <= delay <= cap for delay in delays)
+        assert max(delays) > cap / 2
+        assert len(set(delays)) > 1
+
+def test_throttled_request_is_retried_and_cuts_concurrency(make_uncached_client, clock):
+    service = ScriptedService([429, 503])
+    client = make_uncached_client(service)
+    initial_limit = client.concurrency_limiter.limit
+
+    answer = client.analyze_blockchain_security(CHAIN, PROMPT)
+
+    assert answer
+    assert service.calls == 3
+    metrics = client.rate_metrics()
+    assert metrics["requests"] == 3 and metrics["throttled"] == 2 and metrics["retries"] == 2
+    assert metrics["failures"] == 0 and metrics["overloads"] == 2
+    assert metrics["concurrency_limit"] < initial_limit
+    assert client.telemetry.records()[-1]["retries"] == 2
+    # One jittered backoff before each retry
+    assert len(clock.sleeps) == 2
+
+def test_non_retryable_error_is_not_retried(make_uncached_client):
+    service = ScriptedService([400])
+    client = make_uncached_client(service)
+
+    with pytest.raises(CbGptError) as error:
+        client.analyze_blockchain_security(CHAIN, PROMPT)
+    assert error.value.status_code == 400
+    assert client.last_call_record()["error"] == str(error.value)
+    assert service.calls == 1
+    metrics = client.rate_metrics()
+    assert metrics["retries"] == 0 and metrics["failures"] == 1 and metrics["overloads"] == 0
+
+def test_retries_stop_after_max_retries(make_uncached_client):
+    service = ScriptedService([429] * (cb_gpt_client.MAX_RETRIES + 5))
+    client = make_uncached_client(service)
+
+    with pytest.raises(CbGptError) as error:
+        client.analyze_blockchain_security(CHAIN, PROMPT)
+    assert error.value.status_code == 429
+    assert service.calls == cb_gpt_client.MAX_RETRIES + 1
+    assert client.rate_metrics()["retries"] == cb_gpt_client.MAX_RETRIES
+
+def test_retries_stop_at_the_deadline(monkeypatch, make_uncached_client, clock):
+    monkeypatch.setattr(cb_gpt_client, "RETRY_BASE_DELAY_SECONDS", 10.0)
+    monkeypatch.setattr(cb_gpt_client, "REQUEST_DEADLINE_SECONDS", 0.5)
+    monkeypatch.setattr(cb_gpt_client, "backoff_delay", lambda attempt, base_delay: base_delay)
+    service = ScriptedService([503, 503])
+    client = make_uncached_client(service)
+
+    with pytest.raises(CbGptError):
+        client.analyze_blockchain_security(CHAIN, PROMPT)
+    # The first backoff would overshoot the deadline, so the error is returned without sleeping
+    assert clock.sleeps == []
+    assert service.calls == 1
@@ -0,0 +1,79 @@
+"""Verdict extraction and per-call telemetry of indexed answers."""
+import json
+
+import pytest
+
+from fact_sheet import CbGptFactSheetProvider
+from fake_cb_gpt import FakeCbGptServiceApiClient
+from results_index import extract_verdict
+
+RISKS = [
+    {"name": "Risk A", "prompt": "Is A mitigated?", "is_critical": True},
+    {"name": "Risk B", "prompt": "Is B mitigated?", "is_critical": False, "max_tokens": 100},
+    {"name": "Risk C", "prompt": "Is C mitigated?", "is_critical": True},
+]
+
+@pytest.mark.parametrize("response, verdict", [
+    ("The stake is spread out.\n\nVerdict: PASS", "pass"),
+    ("Keys are held by one party.\n**Verdict:** Fail.", "fail"),
+    ("No public data.\n\nVerdict: UNKNOWN", "unknown"),
+    # The prompt's own "PASS if ..., FAIL if ..." wording does not decide it; the verdict line does
+    ("Result: PASS if > $5M, FAIL if ≤ $5M\nAttack cost: $2M\n\nVerdict: FAIL", "fail"),
+    ("Assessment: passed", "pass"),
+    ("It depends.", "unknown"),
+    ("", "unknown"),
+])
+def test_extract_verdict(response, verdict):
+    assert extract_verdict(response) == verdict
+
+def test_fake_answers_end_with_a_verdict_line(make_client):
+    client = make_client()
+    answer = client.analyze_blockchain_security("Test Chain", RISKS[0]['prompt'])
+    assert answer.splitlines()[-1] in ("Verdict: PASS", "Verdict: FAIL", "Verdict: UNKNOWN")
+
+def test_iter_analyze_many_records_each_risks_own_call(make_client):
+    client = make_client()
+    records = {}
+
+    for risk_name, response in client.iter_analyze_many("Test Chain", RISKS, records=records):
+        assert response and records[risk_name]["risk"] == risk_name and records[risk_name]["ok"]
+    assert len({id(record) for record in records.values()}) == len(RISKS)
+
+    # A later call on another chain does not replace the records of this run
+    client.analyze_blockchain_security("Other Chain", RISKS[0]['prompt'], risk_name="Risk A")
+    assert records["Risk A"]["chain"] == "Test Chain"
+
+def test_stream_many_records_each_risks_own_call(make_client):
+    client = make_client()
+    records = {}
+
+    ended = [risk_name for risk_name, delta in client.stream_many("Test Chain", RISKS, records=records) if delta is None]
+
+    assert sorted(ended) == sorted(records) == sorted(risk["name"] for risk in RISKS)
+    assert all(records[name]["risk"] == name and records[name]["ok"] for name in ended)
+
+class RecordingService(FakeCbGptServiceApiClient):
+    """Fake backend remembering the system prompt of every request."""
+
+    def __init__(self):
+        super().__init__(latency="constant", latency_mean=0.0)
+        self.system_prompts = []
+
+    def generate_content(self, model_id, request_body, **kwargs):
+        self.system_prompts.append(json.loads(request_body)['messages'][0]['content'])
+        return super().generate_content(model_id, request_body, **kwargs)
+
+def test_only_risk_prompts_ask_for_a_verdict_line(tmp_path, make_client):
+    service = RecordingService()
+    client = make_client(service)
+
+    client.analyze_blockchain_security("Test Chain", RISKS[0]['prompt'])
+    CbGptFactSheetProvider(client, directory=str(tmp_path)).get("Test Chain")
+    client.analyze_group("Test Chain", RISKS[:2])
+
+    risk_prompt, fact_sheet_prompt, group_prompt = service.system_prompts[:3]
+    assert 'Verdict: PASS' in risk_prompt
+    assert 'Verdict' not in fact_sheet_prompt
+    # Grouped answers carry the verdict inside each JSON value, not after the object
+    assert 'Respond with a single JSON object and nothing else' in group_prompt
+    assert group_prompt.count('Verdict: PASS') == 1 and group_prompt.index('Each answer must end with') > group_prompt.index('JSON')
@@ -0,0 +1,190 @@
+"""Single-flight de-duplication of identical in-flight CB-GPT requests, against a fake slow backend."""
+import threading
+import time
+
+import pytest
+from requests import Response
+from requests.exceptions import HTTPError
+
+from cb_gpt_client import CbGptError, IncompleteStreamError
+from fake_cb_gpt import FakeCbGptServiceApiClient
+from rate_limit import SingleFlight
+from response_cache import ResponseCache
+
+CHAIN = "Test Chain"
+PROMPT = "Is the validator set decentralized?"
+
+@pytest.fixture
+def make_clients(make_client):
+    """One client per session, as separate app sessions would have, sharing one single-flight layer."""
+    def make(service, sessions, cache=False):
+        single_flight = SingleFlight()
+        return [make_client(service, cache, single_flight=single_flight) for _ in range(sessions)], single_flight
+    return make
+
+def run_concurrently(funcs):
+    """Start every function at once on its own thread, returning their results or raised errors in order."""
+    barrier = threading.Barrier(len(funcs))
+    results = [None] * len(funcs)
+
+    def run(index, func):
+        barrier.wait()
+        try:
+            results[index] = func()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=run, args=(index, func)) for index, func in enumerate(funcs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results
+
+class FailingService:
+    """Slow backend failing every call with a non-retryable HTTP error."""
+
+    def __init__(self, status_code=400, latency=0.3):
+        self.status_code = status_code
+        self.latency = latency
+        self.calls = 0
+
+    def generate_content(self, model_id, request_body, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        response = Response()
+        response.status_code = self.status_code
+        raise HTTPError(f"{self.status_code} Error", response=response)
+
+def test_concurrent_identical_requests_make_one_service_call(make_clients):
+    service = FakeCbGptServiceApiClient(latency="constant", latency_mean=0.3)
+    clients, single_flight = make_clients(service, sessions=4)
+
+    answers = run_concurrently([lambda client=client: client.analyze_blockchain_security(CHAIN, PROMPT) for client in clients])
+
+    assert service.calls == 1
+    assert answers[0] and all(answer == answers[0] for answer in answers)
+    assert single_flight.metrics() == {"flights": 1, "coalesced": 3, "in_flight_keys": 0}
+
+def test_concurrent_identical_streams_make_one_service_call(make_clients):
+    service = FakeCbGptServiceApiClient(latency="constant", latency_mean=0.3)
+    clients, _ = make_clients(service, sessions=3)
+
+    answers = run_concurrently([
+        lambda client=client: "".join(client.analyze_blockchain_security_stream(CHAIN, PROMPT)) for client in clients
+    ])
+
+    assert service.calls == 1
+    assert answers[0] and all(answer == answers[0] for answer in answers)
+
+def test_different_requests_are_not_coalesced(make_clients):
+    service = FakeCbGptServiceApiClient(latency="constant", latency_mean=0.3)
+    clients, single_flight = make_clients(service, sessions=2)
+
+    run_concurrently([
+        lambda: clients[0].analyze_blockchain_security(CHAIN, PROMPT),
+        lambda: clients[1].analyze_blockchain_security(CHAIN, "Is the node software open source?"),
+    ])
+
+    assert service.calls == 2
+    assert single_flight.metrics()["coalesced"] == 0
+
+def test_leader_error_reaches_followers():
+    single_flight = SingleFlight()
+    leading = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def lead():
+        calls.append(True)
+        leading.set()
+        release.wait(timeout=5)
+        raise ValueError("service failed")
+
+    def follow():
+        leading.wait(timeout=5)
+        return single_flight.do("key", lead)
+
+    def release_when_joined():
+        while single_flight.metrics()["coalesced"] < 2:
+            time.sleep(0.01)
+        release.set()
+
+    threading.Thread(target=release_when_joined).start()
+    results = run_concurrently([lambda: single_flight.do("key", lead), follow, follow])
+
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    assert single_flight.metrics()["in_flight_keys"] == 0
+
+def test_leader_error_reaches_follower_clients(make_clients):
+    service = FailingService()
+    clients, single_flight = make_clients(service, sessions=3)
+
+    answers = run_concurrently([lambda client=client: client.analyze_blockchain_security(CHAIN, PROMPT) for client in clients])
+
+    assert service.calls == 1
+    assert all(isinstance(answer, CbGptError) and answer.status_code == 400 for answer in answers)
+    assert single_flight.metrics()["coalesced"] == 2
+    assert all(not record["ok"] for client in clients for record in client.telemetry.records())
+
+def test_abandoned_streamed_flight_is_not_cached(make_clients):
+    service = FakeCbGptServiceApiClient(latency="constant", latency_mean=0.3, response_chars=400, stream_chunk_chars=20)
+    cache = ResponseCache(':memory:')
+    (leader, follower), single_flight = make_clients(service, sessions=2, cache=cache)
+    started = threading.Event()
+    follower_result = {}
+
+    def follow():
+        started.wait(timeout=5)
+        deltas = []
+        try:
+            for delta in follower.analyze_blockchain_security_stream(CHAIN, PROMPT):
+                deltas.append(delta)
+        except IncompleteStreamError as e:
+            follower_result["error"] = e
+        follower_result["text"] = "".join(deltas)
+
+    thread = threading.Thread(target=follow)
+    thread.start()
+    stream = leader.analyze_blockchain_security_stream(CHAIN, PROMPT)
+    started.set()
+    first_delta = next(stream)
+    while single_flight.metrics()["coalesced"] < 1:
+        time.sleep(0.01)
+    # The leading session goes away after one delta, e.g. its browser tab was closed
+    stream.close()
+    thread.join(timeout=5)
+
+    assert first_delta
+    assert isinstance(follower_result.get("error"), IncompleteStreamError)
+    assert follower_result["text"].startswith(first_delta)
+    assert not any(record["ok"] for client in (leader, follower) for record in client.telemetry.records())
+
+    # Neither the leader's nor the follower's partial answer was cached
+    complete = leader.analyze_blockchain_security(CHAIN, PROMPT)
+    assert service.calls == 2
+    assert complete and len(complete) > len(follower_result["text"])
+
+def test_dropped_stream_is_not_cached(make_clients):
+    class DroppingService:
+        calls = 0
+
+        def generate_content(self, model_id, request_body, **kwargs):
+            DroppingService.calls += 1
+
+            def events():
+                yield 'data: {"choices": [{"delta": {"content": "partial "}}]}\n\n'
+                raise ConnectionError("connection dropped")
+
+            return events()
+
+    clients, _ = make_clients(DroppingService(), sessions=1, cache=ResponseCache(':memory:'))
+    client = clients[0]
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            list(client.analyze_blockchain_security_stream(CHAIN, PROMPT))
+
+    assert DroppingService.calls == 2
+    assert [record["ok"] for record in client.telemetry.records()] == [False, False]
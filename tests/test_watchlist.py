@@ -0,0 +1,43 @@
+"""Watchlist refreshes queue only what a session is not already asking."""
+import os
+import time
+
+from cb_gpt_client import GenerationSettings
+from job_queue import JobQueue
+from response_store import SqliteResponseStore
+from watchlist import WATCHLIST_SESSION, Watchlist, WatchlistRefresher
+
+SESSION = "test-session"
+RISKS = [{"name": f"Risk {index}", "prompt": f"Is risk {index} mitigated?", "is_critical": True} for index in range(3)]
+
+def make_refresher(tmp_path, client):
+    watchlist = Watchlist(os.path.join(tmp_path, 'watchlist.json'))
+    store = SqliteResponseStore(os.path.join(tmp_path, 'responses.sqlite3'))
+    jobs = JobQueue(os.path.join(tmp_path, 'jobs.sqlite3'))
+    entry = watchlist.add("Test Chain", "TST")
+    for risk in RISKS[:2]:
+        fingerprint = client.risk_fingerprint(risk['prompt'], None, GenerationSettings.for_risk(risk))
+        store.upsert(entry['name'], SESSION, risk['name'], f"Answer to {risk['name']}", fingerprint)
+    return WatchlistRefresher(watchlist, store, jobs, client_factory=lambda: client), entry
+
+def test_watching_a_chain_seeds_its_shared_answers_from_the_session(tmp_path, make_client):
+    refresher, entry = make_refresher(tmp_path, make_client())
+
+    assert refresher.seed(entry, SESSION, RISKS) == 2
+    # The third risk has no session answer, so the session's own job asks it
+    assert refresher.refresh(entry, RISKS, SESSION) == []
+    assert refresher.store.load(entry['name'], WATCHLIST_SESSION) == refresher.store.load(entry['name'], SESSION)
+
+def test_only_aging_answers_bypass_the_cache(tmp_path, make_client):
+    refresher, entry = make_refresher(tmp_path, make_client())
+    refresher.seed(entry, SESSION, RISKS[:1])
+    aged = time.time() - refresher.max_age
+    fingerprints = refresher.fingerprints(entry, RISKS)
+    refresher.store.upsert(entry['name'], WATCHLIST_SESSION, RISKS[0]['name'], "Old answer", fingerprints[RISKS[0]['name']], aged)
+
+    jobs = [refresher.jobs.get(job_id) for job_id in refresher.refresh(entry, RISKS)]
+
+    assert [([risk['name'] for risk in job['risks']], job['options']['bypass_cache']) for job in jobs] == [
+        (["Risk 1", "Risk 2"], False),
+        (["Risk 0"], True),
+    ]
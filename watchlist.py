@@ -0,0 +1,273 @@
+"""Watchlist of chains kept fresh by a background refresher.
+
+Answers for watched chains live in the response store under a shared
+session, so opening a watched chain in the app serves the last good
+answers at once, labelled with their age, while answers nearing expiry
+are re-queried in the background (stale-while-revalidate).
+
+Usage:
+    python watchlist.py add Ethereum --symbol ETH --explorer-url https://etherscan.io
+    python watchlist.py list
+    python watchlist.py run [--interval 300] [--once]
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from cb_gpt_client import GenerationSettings, get_shared_client
+from job_queue import JobQueue, JobWorkerPool
+from response_store import get_response_store
+from results_index import ResultsIndex
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Constants
+WATCHLIST_FILE = os.getenv("WATCHLIST_FILE", os.path.join(os.path.dirname(__file__), 'data', 'watchlist.json'))
+RISKS_FILE = os.path.join(os.path.dirname(__file__), 'risks.json')
+# Session id the shared answers of watched chains are stored under
+WATCHLIST_SESSION = "watchlist"
+# Answers older than this are shown as stale; refreshes start once REFRESH_AHEAD of it has passed
+WATCHLIST_MAX_AGE_SECONDS = int(os.getenv("WATCHLIST_MAX_AGE_SECONDS", str(24 * 3600)))
+REFRESH_AHEAD = float(os.getenv("WATCHLIST_REFRESH_AHEAD", "0.8"))
+# Refreshes run on their own workers so they never hold up an interactive session's analysis
+REFRESH_WORKERS = int(os.getenv("WATCHLIST_REFRESH_WORKERS", "1"))
+REFRESH_INTERVAL_SECONDS = int(os.getenv("WATCHLIST_REFRESH_INTERVAL_SECONDS", "300"))
+
+def format_age(seconds):
+    """Human-readable age such as '5 min ago' or '3 h ago'."""
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min ago"
+    if seconds < 48 * 3600:
+        return f"{int(seconds // 3600)} h ago"
+    return f"{int(seconds // 86400)} days ago"
+
+class Watchlist:
+    """The watched chains, kept in a JSON file keyed by chain name."""
+
+    def __init__(self, path=WATCHLIST_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def entries(self):
+        """Every watched chain, as dicts with name, symbol, explorer_url and framework."""
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f).get('chains', [])
+        except FileNotFoundError:
+            return []
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid JSON in watchlist {self.path}: {str(e)}")
+            return []
+
+    def get(self, name):
+        """The watched chain with this name, or None."""
+        return next((entry for entry in self.entries() if entry['name'] == name), None)
+
+    def add(self, name, symbol='', explorer_url=None, framework=None):
+        """Watch a chain, replacing any earlier entry of the same name."""
+        entry = {"name": name, "symbol": symbol, "explorer_url": explorer_url or None, "framework": framework or None}
+        with self._lock:
+            self._write([other for other in self.entries() if other['name'] != name] + [entry])
+        return entry
+
+    def remove(self, name):
+        """Stop watching a chain; its stored answers are kept."""
+        with self._lock:
+            self._write([entry for entry in self.entries() if entry['name'] != name])
+
+    def _write(self, entries):
+        """Atomically rewrite the watchlist file."""
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"chains": entries}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+class WatchlistRefresher:
+    """Queues refresh jobs for watched chains whose shared answers are missing, outdated or nearing expiry.
+
+    The jobs run on a JobWorkerPool of their own, in this process or in
+    the app's; a failed refresh keeps the last good answer.
+    """
+
+    def __init__(self, watchlist, store, jobs, client_factory=get_shared_client,
+                 max_age=WATCHLIST_MAX_AGE_SECONDS, refresh_ahead=REFRESH_AHEAD):
+        self.watchlist = watchlist
+        self.store = store
+        self.jobs = jobs
+        self.client_factory = client_factory
+        self.max_age = max_age
+        self.refresh_ahead = refresh_ahead
+
+    def fingerprints(self, entry, risks):
+        """Current prompt fingerprint of each risk for a watched chain."""
+        client = self.client_factory()
+        return {
+            risk['name']: client.risk_fingerprint(risk['prompt'], entry.get('explorer_url'), GenerationSettings.for_risk(risk))
+            for risk in risks
+        }
+
+    def due(self, entry, risks, now=None):
+        """The risks of a watched chain whose shared answer should be refreshed."""
+        outdated, aged = self._due(entry, risks, now)
+        return outdated + aged
+
+    def _due(self, entry, risks, now=None):
+        """Split the due risks into those without an answer to the current prompt and those whose answer is aging."""
+        now = now or time.time()
+        fingerprints = self.fingerprints(entry, risks)
+        stored = self.store.load_fingerprints(entry['name'], WATCHLIST_SESSION)
+        updated_at = self.store.load_updated_at(entry['name'], WATCHLIST_SESSION)
+        refresh_before = now - self.max_age * self.refresh_ahead
+        outdated = [risk for risk in risks if stored.get(risk['name']) != fingerprints[risk['name']]]
+        aged = [
+            risk for risk in risks
+            if risk not in outdated and (updated_at.get(risk['name']) or 0) < refresh_before
+        ]
+        return outdated, aged
+
+    def refresh(self, entry, risks, session_id=None):
+        """Queue refresh jobs for a watched chain if any answer is due and none is already running.
+
+        Only aging answers bypass the response cache; a missing or outdated
+        answer may already be cached from a session that asked the same
+        prompt. Risks `session_id` has no current answer for are left out,
+        since that session's own job asks them. Returns the queued job ids.
+        """
+        if self.jobs.active(entry['name'], WATCHLIST_SESSION):
+            return []
+        outdated, aged = self._due(entry, risks)
+        if session_id:
+            fingerprints = self.fingerprints(entry, risks)
+            own = self.store.load(entry['name'], session_id)
+            own_fingerprints = self.store.load_fingerprints(entry['name'], session_id)
+            answered = {
+                risk['name'] for risk in risks
+                if own.get(risk['name']) and own_fingerprints.get(risk['name']) == fingerprints[risk['name']]
+            }
+            outdated = [risk for risk in outdated if risk['name'] in answered]
+            aged = [risk for risk in aged if risk['name'] in answered]
+        job_ids = []
+        for due, bypass_cache in ((outdated, False), (aged, True)):
+            if not due:
+                continue
+            logger.info(f"Refreshing {len(due)} answers for watched chain {entry['name']}")
+            job_ids.append(self.jobs.submit(
+                entry['name'],
+                WATCHLIST_SESSION,
+                due,
+                entry.get('explorer_url'),
+                framework=entry.get('framework'),
+                refresh=True,
+                bypass_cache=bypass_cache
+            ))
+        return job_ids
+
+    def refresh_all(self, risks):
+        """Queue refresh jobs for every watched chain that needs one, returning their ids."""
+        return [job_id for entry in self.watchlist.entries() for job_id in self.refresh(entry, risks)]
+
+    def serve(self, entry, session_id, risks, fingerprints=None):
+        """Copy a watched chain's shared answers into a session, keeping their age.
+
+        Only answers to the current prompts are copied, and never over a
+        newer answer the session already has. Returns the number copied.
+        """
+        return self._copy(entry, WATCHLIST_SESSION, session_id, risks, fingerprints)
+
+    def seed(self, entry, session_id, risks, fingerprints=None):
+        """Copy a session's answers into a newly watched chain's shared answers, keeping their age.
+
+        The same rules as serve apply, so only the risks the session has no
+        current answer for are left for the first refresh. Returns the
+        number copied.
+        """
+        return self._copy(entry, session_id, WATCHLIST_SESSION, risks, fingerprints)
+
+    def _copy(self, entry, source, target, risks, fingerprints=None):
+        """Copy the current answers of one session of a watched chain into another."""
+        fingerprints = fingerprints or self.fingerprints(entry, risks)
+        answers = self.store.load(entry['name'], source)
+        source_fingerprints = self.store.load_fingerprints(entry['name'], source)
+        source_updated_at = self.store.load_updated_at(entry['name'], source)
+        target_fingerprints = self.store.load_fingerprints(entry['name'], target)
+        target_updated_at = self.store.load_updated_at(entry['name'], target)
+        copied = 0
+        for risk in risks:
+            name = risk['name']
+            if not answers.get(name) or source_fingerprints.get(name) != fingerprints[name]:
+                continue
+            if target_fingerprints.get(name) == fingerprints[name] and (target_updated_at.get(name) or 0) >= (source_updated_at[name] or 0):
+                continue
+            self.store.upsert(entry['name'], target, name, answers[name], fingerprints[name], source_updated_at[name])
+            copied += 1
+        return copied
+
+def load_risks():
+    """Load risks from JSON file."""
+    with open(RISKS_FILE, 'r') as f:
+        return json.load(f)['risks']
+
+def run_refresher(interval=REFRESH_INTERVAL_SECONDS, once=False):
+    """Refresh the watchlist every `interval` seconds, running the jobs in this process.
+
+    Only watchlist jobs are run here; analyses queued by app sessions are
+    left to the app, whose workers stream their partial answers.
+    """
+    store = get_response_store()
+    pool = JobWorkerPool(JobQueue(), store, workers=REFRESH_WORKERS, results_index=ResultsIndex(), session_id=WATCHLIST_SESSION).start()
+    refresher = WatchlistRefresher(Watchlist(), store, pool.jobs)
+    try:
+        while True:
+            job_ids = refresher.refresh_all(load_risks())
+            if once:
+                # Wait for this round's jobs before exiting, e.g. when run from cron
+                while any(pool.jobs.get(job_id)['status'] in ('queued', 'running') for job_id in job_ids):
+                    time.sleep(1)
+                return
+            time.sleep(interval)
+    finally:
+        pool.stop()
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Manage the chain watchlist and keep its answers fresh.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_parser = subparsers.add_parser("add", help="Watch a chain")
+    add_parser.add_argument("name")
+    add_parser.add_argument("--symbol", default="")
+    add_parser.add_argument("--explorer-url", default=None)
+    add_parser.add_argument("--framework", default=None)
+    remove_parser = subparsers.add_parser("remove", help="Stop watching a chain")
+    remove_parser.add_argument("name")
+    subparsers.add_parser("list", help="Show the watched chains and the age of their answers")
+    run_parser = subparsers.add_parser("run", help="Refresh answers nearing expiry on a schedule")
+    run_parser.add_argument("--interval", type=int, default=REFRESH_INTERVAL_SECONDS, help="Seconds between refresh rounds")
+    run_parser.add_argument("--once", action="store_true", help="Run one refresh round and wait for it to finish")
+    args = parser.parse_args(argv)
+
+    watchlist = Watchlist()
+    if args.command == "add":
+        watchlist.add(args.name, args.symbol, args.explorer_url, args.framework)
+    elif args.command == "remove":
+        watchlist.remove(args.name)
+    elif args.command == "list":
+        store = get_response_store()
+        now = time.time()
+        for entry in watchlist.entries():
+            updated_at = [t for t in store.load_updated_at(entry['name'], WATCHLIST_SESSION).values() if t]
+            oldest = f"oldest answer {format_age(now - min(updated_at))}" if updated_at else "no answers yet"
+            print(f"{entry['name']:<30} {len(updated_at):3d} answers, {oldest}")
+    else:
+        run_refresher(args.interval, args.once)
+
+if __name__ == "__main__":
+    main()